@@ -3,27 +3,84 @@ from flask import Flask, request, jsonify, render_template, Response, stream_wit
 from config import Config
 from tools.rag_translator import RAGTranslator
 from tools.file_processor import FileProcessor
+from tools.vector_searcher import VectorSearcher
+from tools.embedding_engine import get_embedding_engine
+from tools.translation_cache import TranslationCache
+from tools.single_flight import StreamCoalescer
+from tools.stream_parser import TranslationStreamParser
+from tools.ingestion_queue import IngestionQueue
+from tools.reference_packer import ReferencePacker
+from tools.glossary import Glossary
 import os
 import json
-from werkzeug.utils import secure_filename
+import time
+import tempfile
 
 app = Flask(__name__)
 
+# 初始化共享的向量查询器（进程内只加载一份嵌入模型）
+vector_searcher = VectorSearcher(
+    persist_dir="./document_db",
+    embeddings=get_embedding_engine(
+        backend=Config.EMBEDDING_BACKEND,
+        onnx_dir=Config.EMBEDDING_ONNX_DIR,
+        quantize=Config.EMBEDDING_QUANTIZE,
+        intra_op_threads=Config.EMBEDDING_THREADS
+    ),
+    backend=Config.VECTOR_BACKEND,
+    vector_dtype=Config.VECTOR_DTYPE
+)
+
+# 初始化翻译记忆缓存
+translation_cache = TranslationCache(
+    db_path=Config.TRANSLATION_CACHE_PATH,
+    max_entries=Config.TRANSLATION_CACHE_MAX_ENTRIES,
+    max_age_seconds=Config.TRANSLATION_CACHE_MAX_AGE
+) if Config.TRANSLATION_CACHE_PATH else None
+
+# 术语表：原文中出现的术语及其审定译法会注入提示
+glossary = Glossary()
+
 # 初始化翻译器
 translator = RAGTranslator(
     api_key=Config.API_KEY,
     persist_dir="./document_db",
     base_url=Config.BASE_URL,
     model=Config.MODEL,
-    temperature=Config.TEMPERATURE
+    temperature=Config.TEMPERATURE,
+    vector_searcher=vector_searcher,
+    translation_cache=translation_cache,
+    reuse_collection=Config.REUSE_COLLECTION,
+    reuse_threshold=Config.REUSE_THRESHOLD,
+    edit_threshold=Config.EDIT_THRESHOLD,
+    reference_packer=ReferencePacker(token_budget=Config.REFERENCE_TOKEN_BUDGET) if Config.REFERENCE_TOKEN_BUDGET else None,
+    glossary=glossary,
+    search_timeout=Config.SEARCH_TIMEOUT
 )
 
 # 初始化文件处理器
 file_processor = FileProcessor(
     persist_dir="./document_db",
-    collection_name="translations"
+    collection_name="translations",
+    vector_searcher=vector_searcher
 )
 
+# 加载配置中的术语文件
+for glossary_file in Config.GLOSSARY_FILES:
+    file_processor.load_glossary(
+        glossary_file['path'],
+        glossary,
+        source_lang=glossary_file['source_lang'],
+        target_lang=glossary_file['target_lang'],
+        columns=tuple(glossary_file.get('columns', ('term', 'translation')))
+    )
+
+# 后台入库任务队列，上传请求不再同步执行入库
+ingestion_queue = IngestionQueue(file_processor=file_processor, max_workers=Config.INGESTION_WORKERS)
+
+# 合并相同的并发翻译请求，只向上游发起一次流式调用
+stream_coalescer = StreamCoalescer()
+
 @app.route('/')
 def home():
     """渲染主页"""
@@ -41,76 +98,100 @@ def translate():
         if not text:
             return jsonify({'error': '请输入要翻译的文本'}), 400
         
-        # 更新翻译器的语言设置
-        translator.source_lang = source_lang
-        translator.target_lang = target_lang
+        # 本次请求的不可变参数，不修改共享的翻译器状态
+        options = translator.options(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            collection_names=["translations"],
+            top_k=3,
+            similarity_threshold=0.5
+        )
+        
+        # complete=0 时不发送最终的 complete 事件
+        include_complete = request.args.get('complete', '1') != '0'
+        
+        def sse(payload):
+            """构造 (事件类型, SSE 文本) 元组，事件类型用于订阅端过滤"""
+            return payload['type'], f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        
+        def complete_event(result, cached=False):
+            """紧凑的 complete 事件：思考链已经以增量方式发送过，不再重复"""
+            payload = {
+                'type': 'complete',
+                'data': {
+                    'translation': result.get('translation', ''),
+                    'translation_reasoning': result.get('translation_reasoning') or ''
+                }
+            }
+            if cached:
+                payload['cached'] = True
+            return sse(payload)
+        
+        def replay_cached(result):
+            """命中翻译记忆时直接回放缓存结果"""
+            if result.get('thinking_process'):
+                yield sse({'type': 'thinking', 'content': result['thinking_process']})
+            yield sse({'type': 'translation', 'content': result['translation']})
+            if result.get('translation_reasoning'):
+                yield sse({'type': 'analysis', 'content': result['translation_reasoning']})
+            yield complete_event(result, cached=True)
         
         def generate():
             try:
-                stream = translator.translate_stream(
-                    text=text,
-                    collection_names=["translations"],
-                    top_k=3,
-                    similarity_threshold=0.5
-                )
+                cached = translator.lookup_translation(text, options)
+                if cached is not None:
+                    yield from replay_cached(cached)
+                    return
+                
+                start = time.perf_counter()
+                stream = translator.translate_stream(text=text, options=options)
                 
-                translation_result = ''
-                translation_reasoning = ''
-                thinking_process = ''
-                current_content = ''
+                # 增量解析：每个数据块只解析一次，只发送各分节新增的字符
+                parser = TranslationStreamParser()
+                thinking_parts = []
                 
                 for chunk in stream:
-                    print(f"DEBUG: Chunk received - {chunk}")
+                    delta = chunk.choices[0].delta
                     
                     # 处理思考链内容
-                    if hasattr(chunk.choices[0].delta, 'reasoning_content'):
-                        content = chunk.choices[0].delta.reasoning_content
-                        if content:
-                            thinking_process += content
-                            print(f"DEBUG: Reasoning content - {content}")
-                            yield f"data: {json.dumps({'type': 'thinking', 'content': content})}\n\n"
+                    content = getattr(delta, 'reasoning_content', None)
+                    if content:
+                        thinking_parts.append(content)
+                        yield sse({'type': 'thinking', 'content': content})
                     
                     # 处理翻译内容
-                    if hasattr(chunk.choices[0].delta, 'content'):
-                        content = chunk.choices[0].delta.content
-                        if content:
-                            print(f"DEBUG: Translation content - {content}")
-                            current_content += content
-                            
-                            # 检查是否包含翻译结果标记
-                            if '【翻译结果】' in current_content:
-                                parts = current_content.split('【翻译结果】')
-                                if len(parts) > 1:
-                                    result_text = parts[1]
-                                    if '【' in result_text:
-                                        result_text = result_text.split('【')[0]
-                                    translation_result = result_text.strip()
-                                    yield f"data: {json.dumps({'type': 'translation', 'content': translation_result})}\n\n"
-                            
-                            # 检查是否包含翻译解析标记
-                            if '【翻译解析】' in current_content:
-                                parts = current_content.split('【翻译解析】')
-                                if len(parts) > 1:
-                                    analysis_text = parts[1]
-                                    if '【' in analysis_text:
-                                        analysis_text = analysis_text.split('【')[0]
-                                    translation_reasoning = analysis_text.strip()
-                                    yield f"data: {json.dumps({'type': 'analysis', 'content': translation_reasoning})}\n\n"
+                    content = getattr(delta, 'content', None)
+                    if content:
+                        for section, section_text in parser.feed(content):
+                            yield sse({'type': section, 'content': section_text})
+                
+                for section, section_text in parser.close():
+                    yield sse({'type': section, 'content': section_text})
                 
                 # 发送完整响应
                 result = {
-                    'translation': translation_result,
-                    'translation_reasoning': translation_reasoning,
-                    'thinking_process': thinking_process
+                    'translation': parser.translation,
+                    'translation_reasoning': parser.analysis,
+                    'thinking_process': ''.join(thinking_parts)
                 }
-                yield f"data: {json.dumps({'type': 'complete', 'data': result})}\n\n"
+                translator.record_translation(text, result, elapsed=time.perf_counter() - start, options=options)
+                yield complete_event(result)
                 
             except Exception as e:
-                print(f"DEBUG: Error occurred - {str(e)}")
-                yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+                app.logger.error(f"流式翻译错误: {str(e)}")
+                yield sse({'type': 'error', 'content': str(e)})
+        
+        def events():
+            for event_type, event in stream_coalescer.subscribe(flight_key, generate):
+                if event_type == 'complete' and not include_complete:
+                    continue
+                yield event
+        
+        # 相同文本和语言对的并发请求共享同一次上游流
+        flight_key = (text, source_lang, target_lang)
         
         return Response(
-            generate(),
+            events(),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
@@ -125,7 +206,9 @@ def translate():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """处理文件上传"""
+    """处理文件上传：保存后提交后台入库任务，立即返回任务ID；
+    表单同时提供 source_column 和 target_column 时按平行语料导入；
+    replace=true 时替换同名文件之前上传的版本，否则作为独立文档入库"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': '没有上传文件'}), 400
@@ -134,27 +217,56 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
             
-        # 创建上传目录
-        upload_dir = './uploads'
-        os.makedirs(upload_dir, exist_ok=True)
+        # 平行语料的原文列和译文列
+        source_column = request.form.get('source_column')
+        target_column = request.form.get('target_column')
+        if bool(source_column) != bool(target_column):
+            return jsonify({'error': 'source_column 和 target_column 需要同时提供'}), 400
+        columns = (source_column, target_column) if source_column else None
+        replace = request.form.get('replace', '').lower() in ('1', 'true', 'yes')
         
-        # 保存文件
-        file_path = os.path.join(upload_dir, secure_filename(file.filename))
-        file.save(file_path)
+        # 上传内容暂存在内存（过大时落到私有临时文件），不经过共享的上传目录
+        spool = tempfile.SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_MAX_MEMORY)
+        file.save(spool)
+        spool.seek(0)
         
-        # 处理文件
-        try:
-            file_processor.process_files(upload_dir)
-            return jsonify({'message': '文件处理成功'})
-        except Exception as e:
-            return jsonify({'error': f'文件处理失败: {str(e)}'}), 500
-        finally:
-            # 清理上传文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        # 提交后台任务，任务结束后关闭暂存文件
+        # 文件名只用于判断类型和记录来源，不用作路径，保留原始的非 ASCII 字符
+        job_id = ingestion_queue.submit(
+            spool, filename=os.path.basename(file.filename), columns=columns, replace=replace
+        )
+        return jsonify({'message': '文件已提交处理', 'job_id': job_id}), 202
                 
     except Exception as e:
         return jsonify({'error': f'文件上传失败: {str(e)}'}), 500
 
+@app.route('/glossary', methods=['POST'])
+def upload_glossary():
+    """上传术语文件：同名文件再次上传时增量更新术语表"""
+    try:
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({'error': '没有上传文件'}), 400
+        file = request.files['file']
+        changed = file_processor.load_glossary(
+            file.stream,
+            glossary,
+            source_lang=request.form.get('source_lang', '英语'),
+            target_lang=request.form.get('target_lang', '中文'),
+            columns=(request.form.get('term_column', 'term'), request.form.get('translation_column', 'translation')),
+            filename=os.path.basename(file.filename)
+        )
+        return jsonify({'message': '术语表已更新', 'changed': changed, 'size': glossary.size()})
+    except Exception as e:
+        return jsonify({'error': f'术语表更新失败: {str(e)}'}), 500
+
+@app.route('/upload/<job_id>')
+def upload_status(job_id):
+    """查询入库任务状态和进度"""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5005)
\ No newline at end of file
+    # 翻译器按请求传递参数，可安全地多线程处理并发请求
+    app.run(debug=True, port=5005, threaded=True)
\ No newline at end of file
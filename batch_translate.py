@@ -0,0 +1,95 @@
+import argparse
+import logging
+
+from tqdm import tqdm
+
+from config import Config
+from tools.batch_translator import BatchTranslator
+from tools.embedding_engine import get_embedding_engine
+from tools.file_processor import FileProcessor
+from tools.rag_translator import RAGTranslator
+from tools.reference_packer import ReferencePacker
+from tools.translation_cache import TranslationCache
+from tools.vector_searcher import VectorSearcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量翻译整个文档，支持断点续传")
+    parser.add_argument("input", help="输入文件路径（txt/pdf/docx/xlsx/json）")
+    parser.add_argument("output", help="输出文件路径，.json 输出结构化结果，其余按行输出译文")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件路径，默认为 <output>.checkpoint.jsonl")
+    parser.add_argument("--source-lang", default="英语", help="源语言")
+    parser.add_argument("--target-lang", default="中文", help="目标语言")
+    parser.add_argument("--collections", nargs="*", default=["translations"], help="检索的集合名称")
+    parser.add_argument("--top-k", type=int, default=3, help="每个片段使用的参考数量")
+    parser.add_argument("--threshold", type=float, default=0.5, help="相似度阈值")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的模型请求数上限")
+    parser.add_argument("--batch-size", type=int, default=64, help="每批检索的片段数量")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    vector_searcher = VectorSearcher(
+        persist_dir="./document_db",
+        embeddings=get_embedding_engine(
+            backend=Config.EMBEDDING_BACKEND,
+            onnx_dir=Config.EMBEDDING_ONNX_DIR,
+            quantize=Config.EMBEDDING_QUANTIZE,
+            intra_op_threads=Config.EMBEDDING_THREADS
+        ),
+        backend=Config.VECTOR_BACKEND,
+        vector_dtype=Config.VECTOR_DTYPE
+    )
+    translation_cache = TranslationCache(
+        db_path=Config.TRANSLATION_CACHE_PATH,
+        max_entries=Config.TRANSLATION_CACHE_MAX_ENTRIES,
+        max_age_seconds=Config.TRANSLATION_CACHE_MAX_AGE
+    ) if Config.TRANSLATION_CACHE_PATH else None
+
+    translator = RAGTranslator(
+        api_key=Config.API_KEY,
+        persist_dir="./document_db",
+        base_url=Config.BASE_URL,
+        model=Config.MODEL,
+        temperature=Config.TEMPERATURE,
+        source_lang=args.source_lang,
+        target_lang=args.target_lang,
+        vector_searcher=vector_searcher,
+        translation_cache=translation_cache,
+        reference_packer=ReferencePacker(token_budget=Config.REFERENCE_TOKEN_BUDGET) if Config.REFERENCE_TOKEN_BUDGET else None
+    )
+    file_processor = FileProcessor(
+        persist_dir="./document_db",
+        collection_name="translations",
+        vector_searcher=vector_searcher
+    )
+    batch_translator = BatchTranslator(
+        translator=translator,
+        file_processor=file_processor,
+        max_concurrency=args.concurrency,
+        retrieval_batch_size=args.batch_size
+    )
+
+    progress_bar = tqdm(desc="翻译进度", unit="段")
+
+    def on_progress(done: int, total: int):
+        progress_bar.total = total
+        progress_bar.n = done
+        progress_bar.refresh()
+
+    try:
+        batch_translator.translate_file(
+            input_path=args.input,
+            output_path=args.output,
+            checkpoint_path=args.checkpoint,
+            collection_names=args.collections,
+            top_k=args.top_k,
+            similarity_threshold=args.threshold,
+            progress=on_progress
+        )
+    finally:
+        progress_bar.close()
+
+
+if __name__ == "__main__":
+    main()
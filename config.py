@@ -26,3 +26,63 @@ class Config(object):
     # 腾讯云API端点
     # 如果使用其他服务商需要替换对应地址
     BASE_URL = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+
+    # 翻译记忆缓存（SQLite）文件路径
+    # 相同原文、语言对、模型和温度的请求会直接返回缓存结果，不再调用模型
+    # 设置为 None 可关闭缓存
+    TRANSLATION_CACHE_PATH = './document_db/translation_cache.sqlite3'
+
+    # 翻译记忆缓存最多保留的条目数，超出时淘汰最久未使用的条目
+    TRANSLATION_CACHE_MAX_ENTRIES = 100000
+
+    # 翻译记忆缓存条目最长保留时间（秒），None 表示不过期
+    TRANSLATION_CACHE_MAX_AGE = None
+
+    # 近似复用层使用的向量集合名称，设置为 None 可关闭
+    # 与历史原文仅有标点、空白差异的输入直接复用已有译文，数字等其他差异通过仅编辑提示改写
+    REUSE_COLLECTION = 'translation_reuse'
+
+    # 原文相似度（0-1）不低于此值、且去掉空白和标点后与历史原文完全一致时直接返回历史译文
+    REUSE_THRESHOLD = 0.97
+
+    # 原文相似度不低于此值（但不能直接复用）时使用低成本的仅编辑提示改写历史译文，None 表示关闭
+    EDIT_THRESHOLD = 0.9
+
+    # 向量存储后端：'chroma'（ChromaDB）或 'numpy'（内存映射的 NumPy 矩阵，精确检索，多进程共享页缓存）
+    # 两种后端的数据互不相通，入库清单也按后端分开记录，切换后文件会重新入库
+    VECTOR_BACKEND = 'chroma'
+
+    # numpy 后端新建集合时的向量精度：'float16' 或 'int8'（占用减半，检索更快，相似度略有误差）
+    VECTOR_DTYPE = 'float16'
+
+    # 嵌入模型推理后端：'modelscope'（PyTorch）或 'onnx'（ONNX Runtime，无 GPU 时更快）
+    # onnx 首次启动时导出模型并与 PyTorch 输出对比，依赖缺失、导出失败或对比不通过时自动回退到 modelscope
+    EMBEDDING_BACKEND = 'modelscope'
+
+    # onnx 后端导出模型的存放目录
+    EMBEDDING_ONNX_DIR = './document_db/onnx'
+
+    # onnx 后端是否使用动态 int8 量化（模型约为原来的四分之一，推理更快）
+    EMBEDDING_QUANTIZE = True
+
+    # onnx 后端单个算子使用的线程数，None 表示按物理核数自动设置
+    # 同一台机器运行多个工作进程时建议设置为 核数 / 进程数
+    EMBEDDING_THREADS = None
+
+    # 同时运行的后台入库任务数上限
+    INGESTION_WORKERS = 2
+
+    # 上传文件在内存中暂存的最大字节数，超过后写入临时文件
+    UPLOAD_SPOOL_MAX_MEMORY = 32 * 1024 * 1024
+
+    # 检索参考资料时每个向量集合的时限（秒），超时的集合被跳过；None 表示不限
+    SEARCH_TIMEOUT = 2.0
+
+    # 参考资料写入提示词的 token 预算
+    # 超出预算时去掉重复和重叠的参考，并裁剪到与原文最相关的句子；设置为 None 可关闭
+    REFERENCE_TOKEN_BUDGET = 800
+
+    # 启动时加载的术语文件（xlsx/xls/csv/tsv/json/jsonl），也可以通过 /glossary 接口上传
+    # 示例：[{'path': './documents/glossary.xlsx', 'source_lang': '日语', 'target_lang': '中文',
+    #         'columns': ('term', 'translation')}]
+    GLOSSARY_FILES = []
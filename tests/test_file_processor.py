@@ -0,0 +1,147 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("pandas")
+pytest.importorskip("docx2python")
+pytest.importorskip("numpy")
+
+from tools.file_processor import FileProcessor
+from tools.vector_searcher import VectorSearcher
+
+
+class _FakeEmbeddings:
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class _FakeSearcher:
+    """内存中的向量查询器，只实现入库用到的接口"""
+
+    make_chunk_ids = staticmethod(VectorSearcher.make_chunk_ids)
+
+    def __init__(self, backend="chroma"):
+        self.backend = SimpleNamespace(name=backend)
+        self.embeddings = _FakeEmbeddings()
+        self.docs = {}
+
+    def get_existing_ids(self, collection_name, ids):
+        return {chunk_id for chunk_id in ids if chunk_id in self.docs}
+
+    def add_texts(self, collection_name, texts, metadatas=None, ids=None, embeddings=None, upsert=False):
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            self.docs[chunk_id] = (text, metadata)
+
+    def delete_texts(self, collection_name, ids):
+        for chunk_id in ids:
+            self.docs.pop(chunk_id, None)
+
+    def texts(self):
+        return {text for text, _ in self.docs.values()}
+
+
+@pytest.fixture
+def processor(tmp_path):
+    searcher = _FakeSearcher()
+    fp = FileProcessor(persist_dir=str(tmp_path / "db"), vector_searcher=searcher, chunk_size=200, chunk_overlap=0)
+    return fp, searcher
+
+
+def _upload(fp, text, **kwargs):
+    return fp.process_file(io.BytesIO(text.encode('utf-8')), filename="glossary.txt", **kwargs)
+
+
+def test_same_named_uploads_keep_each_others_chunks(processor):
+    fp, searcher = processor
+    assert _upload(fp, "第一位用户上传的术语说明。")
+    assert _upload(fp, "第二位用户上传的另一份文件。")
+
+    assert searcher.texts() == {"第一位用户上传的术语说明。", "第二位用户上传的另一份文件。"}
+    sources = {metadata['source'] for _, metadata in searcher.docs.values()}
+    assert len(sources) == 2
+    assert all(source.startswith("glossary.txt#") for source in sources)
+
+
+def test_identical_upload_is_skipped(processor):
+    fp, searcher = processor
+    assert _upload(fp, "同一份文件。")
+    assert not _upload(fp, "同一份文件。")
+    assert len(searcher.docs) == 1
+
+
+def test_replace_upload_removes_previous_versions(processor):
+    fp, searcher = processor
+    _upload(fp, "旧版本一。")
+    _upload(fp, "旧版本二。")
+    assert _upload(fp, "新版本。", replace=True)
+
+    assert searcher.texts() == {"新版本。"}
+    statuses = sorted(record['status'] for record in fp.manifest.list_files())
+    assert statuses == ['done', 'superseded', 'superseded']
+
+
+def test_replace_upload_reuses_unchanged_chunks(tmp_path):
+    searcher = _FakeSearcher()
+    fp = FileProcessor(persist_dir=str(tmp_path / "db"), vector_searcher=searcher, chunk_size=20, chunk_overlap=0)
+    paragraphs = [f"第{i}段没有修改的内容。" for i in range(5)]
+    assert _upload(fp, "\n\n".join(paragraphs), replace=True)
+    assert searcher.embeddings.embedded == 5
+
+    paragraphs[2] = "第2段修改后的内容。"
+    assert _upload(fp, "\n\n".join(paragraphs), replace=True)
+    assert searcher.embeddings.embedded == 6
+    assert searcher.texts() == set(paragraphs)
+
+
+def test_changed_file_replaces_only_the_same_path(processor, tmp_path):
+    fp, searcher = processor
+    first = tmp_path / "a" / "glossary.txt"
+    second = tmp_path / "b" / "glossary.txt"
+    for path, text in ((first, "甲目录的旧内容。"), (second, "乙目录的内容。")):
+        path.parent.mkdir()
+        path.write_text(text, encoding='utf-8')
+        assert fp.process_file(str(path))
+
+    first.write_text("甲目录更新后的内容。", encoding='utf-8')
+    assert fp.process_file(str(first))
+
+    assert searcher.texts() == {"甲目录更新后的内容。", "乙目录的内容。"}
+
+
+def test_switching_backend_reingests_files(tmp_path):
+    path = tmp_path / "glossary.txt"
+    path.write_text("两个后端都需要的内容。", encoding='utf-8')
+    persist_dir = str(tmp_path / "db")
+    chroma = FileProcessor(persist_dir=persist_dir, vector_searcher=_FakeSearcher("chroma"))
+    assert chroma.process_file(str(path))
+
+    searcher = _FakeSearcher("numpy")
+    numpy_processor = FileProcessor(persist_dir=persist_dir, vector_searcher=searcher)
+    assert numpy_processor.manifest_path != chroma.manifest_path
+    assert numpy_processor.process_file(str(path))
+    assert searcher.texts() == {"两个后端都需要的内容。"}
+
+
+def test_identical_files_at_different_paths_are_tracked_separately(processor, tmp_path):
+    fp, searcher = processor
+    first = tmp_path / "x" / "q.txt"
+    second = tmp_path / "y" / "q.txt"
+    for path in (first, second):
+        path.parent.mkdir()
+        path.write_text("两个目录相同的内容。", encoding='utf-8')
+        assert fp.process_file(str(path))
+
+    first.write_text("修改后。", encoding='utf-8')
+    assert fp.process_file(str(first))
+    assert searcher.texts() == {"两个目录相同的内容。", "修改后。"}
+
+    first.write_text("两个目录相同的内容。", encoding='utf-8')
+    assert fp.process_file(str(first))
+    assert searcher.texts() == {"两个目录相同的内容。"}
+    assert not fp.process_file(str(second))
@@ -0,0 +1,68 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from tools.embedding_engine import DEFAULT_MODEL_ID
+from tools.onnx_embeddings import PARITY_TEXTS, OnnxEmbeddings
+
+
+class _FakeTokenizer:
+    """每个字符一个 token，token ID 为字符编码"""
+
+    pad_token_id = 0
+
+    def __call__(self, texts, truncation=True, max_length=None):
+        input_ids = [[ord(char) for char in text][:max_length] for text in texts]
+        return {'input_ids': input_ids, 'token_type_ids': [[0] * len(ids) for ids in input_ids]}
+
+
+class _FakeSession:
+    """输出 (有效 token 数, 首个 token ID)，可据此核对每一行对应的输入文本"""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, output_names, feeds):
+        assert set(feeds) == {'input_ids', 'attention_mask'}
+        self.batches.append(feeds['input_ids'].shape)
+        lengths = feeds['attention_mask'].sum(axis=1)
+        return [np.stack([lengths, feeds['input_ids'][:, 0]], axis=1).astype(np.float32)]
+
+
+def test_embed_documents_keeps_input_order_across_buckets():
+    embeddings = OnnxEmbeddings(DEFAULT_MODEL_ID, batch_size=2, max_batch_tokens=12, max_length=64)
+    session = _FakeSession()
+    embeddings._session = session
+    embeddings._tokenizer = _FakeTokenizer()
+    embeddings._input_names = ['input_ids', 'attention_mask']
+
+    texts = ["长" * 9, "a", "中等长度", "bb", "x\ny", "很长的一段文本内容"]
+    vectors = embeddings.embed_documents(texts)
+
+    # 分桶按长度重排并拆成多批，输出仍与输入一一对应
+    assert len(session.batches) > 1
+    assert all(rows * length <= 12 or rows == 1 for rows, length in session.batches)
+    expected = [[float(len(text)), float(ord(text[0]))] for text in texts]
+    assert vectors == expected
+    assert embeddings.embed_query("bb") == [2.0, float(ord("b"))]
+
+
+def test_export_matches_pytorch(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("modelscope")
+    pytest.importorskip("transformers")
+
+    embeddings = OnnxEmbeddings(DEFAULT_MODEL_ID, cache_dir=str(tmp_path))
+    embeddings.export()
+
+    info = embeddings._read_info()
+    assert embeddings._exported(info)
+    report = info['parity']['model.int8.onnx']
+    assert report['max_cosine_distance'] <= embeddings.parity_tolerance
+
+    # 之后的实例直接加载导出结果，输出与导出时一致
+    reloaded = OnnxEmbeddings(DEFAULT_MODEL_ID, cache_dir=str(tmp_path))
+    np.testing.assert_allclose(
+        reloaded.embed_documents(PARITY_TEXTS), embeddings.embed_documents(PARITY_TEXTS), atol=1e-5
+    )
@@ -0,0 +1,142 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tools.vector_backends import NumpyBackend
+
+COLLECTION = "translations"
+# float16/int8 存储引入的相似度误差上限
+TOLERANCE = {"float16": 2e-3, "int8": 2e-2}
+
+
+@pytest.fixture(params=["float16", "int8"])
+def dtype(request):
+    return request.param
+
+
+def _backend(root, dtype):
+    # 小数据段和小查询块，覆盖跨数据段、分块计算的路径
+    return NumpyBackend(str(root), dtype=dtype, min_segment_rows=64, block_rows=50, compact_ratio=1.0)
+
+
+def _vectors(count, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+
+def _fill(backend, vectors):
+    backend.add(
+        COLLECTION,
+        ids=[f"id{i}" for i in range(len(vectors))],
+        embeddings=vectors.tolist(),
+        documents=[f"doc{i}" for i in range(len(vectors))],
+        metadatas=[{"source": f"s{i % 3}", "n": i} for i in range(len(vectors))]
+    )
+
+
+def _brute_force(vectors, query, rows=None):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    rows = list(range(len(vectors))) if rows is None else list(rows)
+    return sorted(rows, key=lambda row: -scores[row]), scores
+
+
+def _assert_matches_brute_force(hits, vectors, query, top_k, dtype, rows=None):
+    order, scores = _brute_force(vectors, query, rows)
+    expected = order[:top_k]
+    assert len(hits) == len(expected)
+    found = [hit['metadata']['n'] for hit in hits]
+    assert found[0] == expected[0]
+    # 量化误差只可能交换相似度几乎相等的结果
+    for hit, row in zip(hits, expected):
+        assert hit['similarity'] == pytest.approx(max(0.0, scores[row]), abs=TOLERANCE[dtype])
+        assert hit['content'] == f"doc{hit['metadata']['n']}"
+    assert [hit['similarity'] for hit in hits] == sorted((hit['similarity'] for hit in hits), reverse=True)
+
+
+def test_top_k_matches_brute_force(tmp_path, dtype):
+    backend = _backend(tmp_path, dtype)
+    vectors = _vectors(300)
+    _fill(backend, vectors)
+    assert backend.count(COLLECTION) == 300
+
+    queries = vectors[[5, 150, 299]] + 0.05 * _vectors(3, seed=1)
+    for query, hits in zip(queries, backend.query(COLLECTION, queries.tolist(), top_k=5)):
+        _assert_matches_brute_force(hits, vectors, query, 5, dtype)
+
+
+def test_where_filter(tmp_path, dtype):
+    backend = _backend(tmp_path, dtype)
+    vectors = _vectors(300)
+    _fill(backend, vectors)
+
+    query = vectors[7]
+    hits = backend.query(COLLECTION, [query.tolist()], top_k=4, where={"source": "s2"})[0]
+    assert all(hit['metadata']['source'] == "s2" for hit in hits)
+    _assert_matches_brute_force(hits, vectors, query, 4, dtype, rows=range(2, 300, 3))
+
+    hits = backend.query(COLLECTION, [query.tolist()], top_k=300, where={"n": {"$lt": 10}})[0]
+    assert sorted(hit['metadata']['n'] for hit in hits) == list(range(10))
+
+
+def test_upsert_replaces_existing_rows(tmp_path, dtype):
+    backend = _backend(tmp_path, dtype)
+    vectors = _vectors(100)
+    _fill(backend, vectors)
+
+    replacement = _vectors(1, seed=2)[0]
+    backend.add(COLLECTION, ["id3"], [replacement.tolist()], ["ignored"], [{"n": 3}])
+    hit = backend.query(COLLECTION, [vectors[3].tolist()], top_k=1)[0][0]
+    assert hit['content'] == "doc3"
+
+    backend.add(COLLECTION, ["id3"], [replacement.tolist()], ["updated"], [{"n": 3}], upsert=True)
+    assert backend.count(COLLECTION) == 100
+    hit = backend.query(COLLECTION, [replacement.tolist()], top_k=1)[0][0]
+    assert hit['content'] == "updated"
+    assert hit['similarity'] == pytest.approx(1.0, abs=TOLERANCE[dtype])
+
+
+def test_delete(tmp_path, dtype):
+    backend = _backend(tmp_path, dtype)
+    vectors = _vectors(100)
+    _fill(backend, vectors)
+
+    backend.delete(COLLECTION, ["id10", "id11", "missing"])
+    assert backend.count(COLLECTION) == 98
+    assert backend.get_existing_ids(COLLECTION, ["id10", "id11", "id12"]) == {"id12"}
+    hits = backend.query(COLLECTION, [vectors[10].tolist()], top_k=100)[0]
+    assert len(hits) == 98
+    assert {10, 11}.isdisjoint(hit['metadata']['n'] for hit in hits)
+
+
+def test_reopen(tmp_path, dtype):
+    backend = _backend(tmp_path, dtype)
+    vectors = _vectors(200)
+    _fill(backend, vectors)
+    backend.delete(COLLECTION, ["id0"])
+
+    reopened = _backend(tmp_path, dtype)
+    assert reopened.list_collections() == [COLLECTION]
+    assert reopened.count(COLLECTION) == 199
+    assert reopened.get_existing_ids(COLLECTION, ["id0", "id1"]) == {"id1"}
+    query = vectors[42]
+    hits = reopened.query(COLLECTION, [query.tolist()], top_k=3)[0]
+    _assert_matches_brute_force(hits, vectors, query, 3, dtype, rows=range(1, 200))
+
+
+def test_compact_keeps_live_rows(tmp_path, dtype):
+    backend = _backend(tmp_path, dtype)
+    vectors = _vectors(200)
+    _fill(backend, vectors)
+    query = vectors[101]
+    before = backend.query(COLLECTION, [query.tolist()], top_k=10, where={"n": {"$gte": 100}})[0]
+
+    backend.delete(COLLECTION, [f"id{i}" for i in range(100)])
+    backend.compact(COLLECTION)
+    assert backend.count(COLLECTION) == 100
+    assert backend.get_existing_ids(COLLECTION, ["id0", "id100"]) == {"id100"}
+
+    # 压缩原样复制存储的编码，结果与压缩前完全一致
+    after = backend.query(COLLECTION, [query.tolist()], top_k=10)[0]
+    assert after == before
+    reopened = _backend(tmp_path, dtype)
+    assert reopened.query(COLLECTION, [query.tolist()], top_k=10)[0] == before
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from tools.rag_translator import RAGTranslator, TranslationOptions
+
+
+class AsyncRAGTranslator(RAGTranslator):
+    def __init__(
+        self,
+        api_key: str,
+        persist_dir: str,
+        base_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        max_concurrency: int = 64,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+        keepalive_expiry: float = 30.0,
+        request_timeout: float = 600.0,
+        retrieval_workers: int = 8,
+        **kwargs
+    ):
+        """
+        初始化异步RAG翻译器
+
+        模型请求使用共享连接池的 AsyncOpenAI 客户端，检索、缓存等阻塞操作放到线程池执行，
+        单个进程即可同时驱动数百个翻译请求。
+
+        Args:
+            api_key: API密钥
+            persist_dir: 向量存储目录
+            base_url: API基础URL
+            max_concurrency: 同时进行的模型请求数上限
+            max_connections: HTTP 连接池最大连接数
+            max_keepalive_connections: 保持活跃的空闲连接数
+            keepalive_expiry: 空闲连接保活时间（秒）
+            request_timeout: 单次模型请求超时时间（秒）
+            retrieval_workers: 执行检索等阻塞操作的线程数
+            **kwargs: 其余参数传给 RAGTranslator
+        """
+        super().__init__(api_key=api_key, persist_dir=persist_dir, base_url=base_url, **kwargs)
+
+        # 共享的 HTTP 连接池，复用 keep-alive 连接
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(request_timeout, connect=10.0)
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client
+        )
+
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="rag-retrieval")
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """在首次使用时创建并发信号量，使其绑定到当前事件循环"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """在线程池中执行阻塞操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def _aretrieve(self, text: str, options: TranslationOptions) -> List[dict]:
+        """在线程池中检索相似文本"""
+        return await self._run_blocking(self._retrieve, text, options)
+
+    async def atranslate_with_explanation(
+        self,
+        text: str,
+        collection_names: Optional[List[str]] = None,
+        top_k: int = 3,
+        similarity_threshold: float = 0.5,
+        similar_results: Optional[List[dict]] = None,
+        options: Optional[TranslationOptions] = None
+    ) -> Dict[str, Any]:
+        """异步翻译文本并提供详细解析，options 为本次请求的不可变参数"""
+        try:
+            options = self._resolve_options(options, collection_names, top_k, similarity_threshold)
+            cached = await self._run_blocking(self.lookup_translation, text, options)
+            if cached is not None:
+                return cached
+            start = time.perf_counter()
+
+            if similar_results is None:
+                similar_results = await self._aretrieve(text, options)
+
+            async with self.semaphore:
+                completion = await self.async_client.chat.completions.create(
+                    model=options.model,
+                    temperature=options.temperature,
+                    messages=self._build_messages(text, similar_results, options)
+                )
+
+            message = completion.choices[0].message
+            result = self._parse_translation(message.content, getattr(message, 'reasoning_content', None))
+            await self._run_blocking(self.record_translation, text, result, time.perf_counter() - start, options)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"异步翻译和解析失败: {str(e)}")
+            raise
+
+    async def atranslate_stream(
+        self,
+        text: str,
+        collection_names: Optional[List[str]] = None,
+        top_k: int = 3,
+        similarity_threshold: float = 0.5,
+        options: Optional[TranslationOptions] = None
+    ) -> AsyncIterator[Any]:
+        """异步流式翻译，逐个产出模型返回的数据块"""
+        try:
+            options = self._resolve_options(options, collection_names, top_k, similarity_threshold)
+            similar_results = await self._aretrieve(text, options)
+
+            # 整个流式响应期间占用一个并发名额
+            async with self.semaphore:
+                stream = await self.async_client.chat.completions.create(
+                    model=options.model,
+                    temperature=options.temperature,
+                    messages=self._build_messages(text, similar_results, options),
+                    stream=True
+                )
+                async for chunk in stream:
+                    yield chunk
+
+        except Exception as e:
+            self.logger.error(f"异步流式翻译失败: {str(e)}")
+            raise
+
+    async def atranslate_many(self, texts: List[str], **kwargs) -> List[Dict[str, Any]]:
+        """并发翻译多段文本，结果与输入顺序一致"""
+        return await asyncio.gather(*(self.atranslate_with_explanation(text, **kwargs) for text in texts))
+
+    async def aclose(self):
+        """关闭连接池和线程池"""
+        await self.async_client.close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tools.file_processor import FileProcessor
+from tools.rag_translator import RAGTranslator
+
+# 句末标点（中日文句号、问号、叹号，及其后的引号括号）；英文句点后须跟空白，避免切开小数和缩写
+_SENTENCE = re.compile(r'.+?(?:[。！？!?]+[」』”"’）)]*|\.(?=\s)|$)', re.S)
+# 行末为句末标点时视为段落结束
+_LINE_END = re.compile(r'[。！？!?.:：;；」』”"’）)]$')
+
+
+class BatchTranslator:
+    def __init__(self,
+                 translator: RAGTranslator,
+                 file_processor: FileProcessor,
+                 max_concurrency: int = 8,
+                 retrieval_batch_size: int = 64):
+        """
+        初始化批量文档翻译器
+
+        Args:
+            translator: RAG翻译器
+            file_processor: 文件处理器，复用其各文件类型的文本加载逻辑
+            max_concurrency: 同时进行的模型请求数上限
+            retrieval_batch_size: 每批检索的片段数量
+        """
+        self.translator = translator
+        self.file_processor = file_processor
+        self.max_concurrency = max_concurrency
+        self.retrieval_batch_size = retrieval_batch_size
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _join_lines(lines: List[str]) -> str:
+        """拼接被版面折行的文本：两侧都是拉丁字母或数字时补一个空格"""
+        text = ""
+        for line in lines:
+            if text and text[-1].isascii() and text[-1].isalnum() and line[0].isascii() and line[0].isalnum():
+                text += " "
+            text += line
+        return text
+
+    @classmethod
+    def segment(cls, text: str, reflow: bool = False, max_chars: int = 500) -> List[str]:
+        """
+        按段落和句子把文本切分为翻译片段
+
+        Args:
+            text: 提取出的文本
+            reflow: 是否合并版面折行（PDF 每行只是排版行，行末不是句末标点时与下一行属于同一段落）；
+                否则每行视为一个段落（docx 段落、表格行等）
+            max_chars: 超过此长度的段落在句子边界处拆成多个片段，每个片段尽量接近此长度
+
+        Returns:
+            List[str]: 翻译片段，忽略空段落
+        """
+        paragraphs: List[str] = []
+        pending: List[str] = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                if pending:
+                    paragraphs.append(cls._join_lines(pending))
+                    pending = []
+                continue
+            pending.append(line)
+            if not reflow or _LINE_END.search(line):
+                paragraphs.append(cls._join_lines(pending))
+                pending = []
+        if pending:
+            paragraphs.append(cls._join_lines(pending))
+
+        segments: List[str] = []
+        for paragraph in paragraphs:
+            if len(paragraph) <= max_chars:
+                segments.append(paragraph)
+                continue
+            current = ""
+            for sentence in _SENTENCE.findall(paragraph):
+                if current and len(current) + len(sentence) > max_chars:
+                    segments.append(current.strip())
+                    current = ""
+                current += sentence
+            if current.strip():
+                segments.append(current.strip())
+        return segments
+
+    @staticmethod
+    def _segments_digest(segments: List[str]) -> str:
+        """计算片段列表的摘要，用于校验检查点是否属于同一份输入"""
+        digest = hashlib.sha256()
+        for segment in segments:
+            digest.update(segment.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _load_checkpoint(self, checkpoint_path: str, digest: str) -> Tuple[Dict[int, Dict[str, Any]], int]:
+        """
+        读取检查点中已完成的片段，输入不一致时忽略检查点
+
+        Returns:
+            (已完成的片段, 最后一个完整行的结束偏移)：续写前需截断到该偏移，
+            避免新记录接在崩溃时写了一半的行后面
+        """
+        if not os.path.exists(checkpoint_path):
+            return {}, 0
+        done = {}
+        valid_end = 0
+        with open(checkpoint_path, 'rb') as f:
+            header = f.readline()
+            try:
+                header_digest = json.loads(header).get('digest') if header.endswith(b"\n") else None
+            except ValueError:
+                header_digest = None
+            if header_digest != digest:
+                self.logger.warning(f"检查点与输入不一致，重新开始: {checkpoint_path}")
+                return {}, 0
+            valid_end = len(header)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # 崩溃时最后一行可能写入不完整
+                    break
+                valid_end += len(line)
+                try:
+                    record = json.loads(line)
+                    done[record['index']] = record['result']
+                except (ValueError, KeyError, TypeError):
+                    self.logger.warning(f"跳过检查点中损坏的记录: {checkpoint_path}")
+        return done, valid_end
+
+    def translate_file(self,
+                       input_path: str,
+                       output_path: str,
+                       checkpoint_path: Optional[str] = None,
+                       collection_names: Optional[List[str]] = None,
+                       top_k: int = 3,
+                       similarity_threshold: float = 0.5,
+                       progress: Optional[Callable[[int, int], None]] = None) -> List[Dict[str, Any]]:
+        """
+        翻译整个文件，支持断点续传
+
+        Args:
+            input_path: 输入文件路径（txt/pdf/docx/xlsx/json）
+            output_path: 输出文件路径，.json 输出结构化结果，其余按行输出译文
+            checkpoint_path: 检查点文件路径，默认为 output_path + '.checkpoint.jsonl'
+            collection_names: 检索的集合名称
+            top_k: 每个片段使用的参考数量
+            similarity_threshold: 相似度阈值
+            progress: 进度回调，参数为 (已完成数, 总数)
+
+        Returns:
+            List[Dict[str, Any]]: 与输入顺序一致的翻译结果
+        """
+        checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.jsonl"
+        # PDF 提取出的是版面行，需要合并折行后再按句子切分
+        segments = self.segment(
+            self.file_processor.load_text(input_path),
+            reflow=input_path.lower().endswith('.pdf')
+        )
+        digest = self._segments_digest(segments)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(segments)
+        done, valid_end = self._load_checkpoint(checkpoint_path, digest)
+        for index, result in done.items():
+            if index < len(results):
+                results[index] = result
+        pending = [i for i, result in enumerate(results) if result is None]
+        completed = len(segments) - len(pending)
+        self.logger.info(f"共 {len(segments)} 个片段，已完成 {completed} 个，待翻译 {len(pending)} 个")
+
+        resume = valid_end > 0
+        if resume:
+            # 去掉崩溃时写了一半的最后一行
+            os.truncate(checkpoint_path, valid_end)
+        checkpoint = open(checkpoint_path, 'a' if resume else 'w', encoding='utf-8')
+        if not resume:
+            checkpoint.write(json.dumps({'input': input_path, 'digest': digest, 'segments': len(segments)}) + "\n")
+            checkpoint.flush()
+
+        lock = threading.Lock()
+        # 限制在途请求数，避免检索远远跑在模型请求前面
+        in_flight = threading.BoundedSemaphore(self.max_concurrency * 2)
+
+        def run(index: int, references: List[Dict]):
+            nonlocal completed
+            try:
+                result = self.translator.translate_with_explanation(
+                    segments[index], similar_results=references
+                )
+                with lock:
+                    results[index] = result
+                    checkpoint.write(json.dumps({'index': index, 'result': result}, ensure_ascii=False) + "\n")
+                    checkpoint.flush()
+                    completed += 1
+                    if progress:
+                        progress(completed, len(segments))
+            except Exception as e:
+                self.logger.error(f"片段 {index} 翻译失败: {str(e)}")
+            finally:
+                in_flight.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                for start in range(0, len(pending), self.retrieval_batch_size):
+                    batch = pending[start:start + self.retrieval_batch_size]
+                    search_results = self.translator.vector_searcher.search_many(
+                        [segments[i] for i in batch],
+                        collection_names=collection_names,
+                        top_k=top_k,
+                        threshold=similarity_threshold,
+                        batch_size=self.retrieval_batch_size
+                    )
+                    for index, per_query in zip(batch, search_results):
+                        in_flight.acquire()
+                        executor.submit(run, index, self.translator.vector_searcher.merge_top_k(per_query, top_k))
+        finally:
+            checkpoint.close()
+
+        failed = sum(1 for result in results if result is None)
+        if failed:
+            raise RuntimeError(f"{failed} 个片段翻译失败，重新运行即可从检查点继续")
+
+        self._write_output(output_path, segments, results)
+        self.logger.info(f"翻译完成: {input_path} -> {output_path}")
+        return results
+
+    @staticmethod
+    def _write_output(output_path: str, segments: List[str], results: List[Dict[str, Any]]):
+        """按输入顺序写出翻译结果"""
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            if output_path.lower().endswith('.json'):
+                json.dump(
+                    [
+                        {
+                            'source': segment,
+                            'translation': result['translation'],
+                            'translation_reasoning': result.get('translation_reasoning')
+                        }
+                        for segment, result in zip(segments, results)
+                    ],
+                    f,
+                    ensure_ascii=False,
+                    indent=2
+                )
+            else:
+                for result in results:
+                    f.write(result['translation'].replace("\n", " ") + "\n")
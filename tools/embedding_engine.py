@@ -0,0 +1,197 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from tools.onnx_embeddings import OnnxEmbeddings
+
+DEFAULT_MODEL_ID = "damo/nlp_corom_sentence-embedding_chinese-base"
+
+
+class _EmbeddingRequest:
+    """一次嵌入请求，由工作线程填充结果后唤醒调用方"""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.result: Optional[List[List[float]]] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class EmbeddingEngine(Embeddings):
+    def __init__(self,
+                 model_id: str = DEFAULT_MODEL_ID,
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0,
+                 backend: str = "modelscope",
+                 onnx_dir: str = "./document_db/onnx",
+                 quantize: bool = True,
+                 intra_op_threads: Optional[int] = None):
+        """
+        初始化共享嵌入引擎
+
+        模型在第一次调用时才加载；并发调用方提交的文本会被后台线程合并成
+        一次前向计算（微批处理），结果再按请求拆分返回。
+
+        Args:
+            model_id: ModelScope 模型ID
+            max_batch_size: 单次前向计算的最大文本数
+            max_wait_ms: 收集同批请求的最长等待时间（毫秒）
+            backend: 推理后端：modelscope（PyTorch）或 onnx（ONNX Runtime，CPU 上更快），
+                onnx 导出或加载失败时回退到 modelscope
+            onnx_dir: onnx 后端导出模型的存放目录
+            quantize: onnx 后端是否使用动态 int8 量化
+            intra_op_threads: onnx 后端单个算子的线程数，None 表示自动
+        """
+        if backend not in ("modelscope", "onnx"):
+            raise ValueError(f"不支持的嵌入后端: {backend}")
+        self.model_id = model_id
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        self.quantize = quantize
+        self.intra_op_threads = intra_op_threads
+
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._queue: "queue.Queue[_EmbeddingRequest]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+
+    def _get_model(self):
+        """延迟加载嵌入模型（线程安全，只加载一次）"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    if self.backend == "onnx":
+                        self._model = self._load_onnx()
+                    if self._model is None:
+                        from langchain_community.embeddings import ModelScopeEmbeddings
+
+                        start = time.perf_counter()
+                        self._model = ModelScopeEmbeddings(model_id=self.model_id)
+                        self.logger.info(
+                            f"已加载嵌入模型 {self.model_id}，耗时 {time.perf_counter() - start:.2f}s"
+                        )
+        return self._model
+
+    def _load_onnx(self) -> Optional[OnnxEmbeddings]:
+        """加载 ONNX 后端，缺少依赖、导出失败或与 PyTorch 输出不一致时返回 None"""
+        try:
+            model = OnnxEmbeddings(
+                model_id=self.model_id,
+                cache_dir=self.onnx_dir,
+                quantize=self.quantize,
+                intra_op_threads=self.intra_op_threads,
+                batch_size=self.max_batch_size
+            )
+            model.load()
+            return model
+        except Exception as e:
+            self.logger.warning(f"ONNX 嵌入后端不可用，回退到 PyTorch: {str(e)}")
+            return None
+
+    def _ensure_worker(self):
+        """确保微批处理工作线程已启动"""
+        if self._worker is None or not self._worker.is_alive():
+            with self._worker_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(
+                        target=self._run, name="embedding-engine", daemon=True
+                    )
+                    self._worker.start()
+
+    def _collect_batch(self) -> List[_EmbeddingRequest]:
+        """阻塞获取第一个请求，然后在等待窗口内尽量合并更多请求"""
+        batch = [self._queue.get()]
+        total = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while total < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            total += len(request.texts)
+        return batch
+
+    def _forward(self, texts: List[str]) -> List[List[float]]:
+        """按最大批大小切分后执行前向计算"""
+        model = self._get_model()
+        if isinstance(model, OnnxEmbeddings):
+            # ONNX 后端按长度分桶，整批交给它排序切分
+            return model.embed_documents(texts)
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.max_batch_size):
+            vectors.extend(model.embed_documents(texts[i:i + self.max_batch_size]))
+        return vectors
+
+    def _run(self):
+        """工作线程主循环"""
+        while True:
+            batch = self._collect_batch()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = self._forward(texts)
+                offset = 0
+                for request in batch:
+                    request.result = vectors[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except BaseException as e:
+                self.logger.error(f"嵌入计算失败: {str(e)}")
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """计算文本列表的嵌入向量"""
+        if not texts:
+            return []
+        self._ensure_worker()
+        request = _EmbeddingRequest([str(text) for text in texts])
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def embed_query(self, text: str) -> List[float]:
+        """计算单条查询文本的嵌入向量"""
+        return self.embed_documents([text])[0]
+
+
+_engines: Dict[Tuple[str, str], EmbeddingEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_embedding_engine(model_id: str = DEFAULT_MODEL_ID, backend: str = "modelscope", **options) -> EmbeddingEngine:
+    """
+    获取进程内共享的嵌入引擎
+
+    同一进程中相同 model_id 和 backend 只会创建一个引擎，VectorSearcher、FileProcessor
+    和 RAGTranslator 共用同一份模型权重。
+
+    Args:
+        model_id: ModelScope 模型ID
+        backend: 推理后端：modelscope 或 onnx
+        options: 首次创建引擎时传给 EmbeddingEngine 的其他参数（如 intra_op_threads）
+
+    Returns:
+        EmbeddingEngine: 共享的嵌入引擎
+    """
+    with _engines_lock:
+        key = (model_id, backend)
+        if key not in _engines:
+            _engines[key] = EmbeddingEngine(model_id=model_id, backend=backend, **options)
+        return _engines[key]
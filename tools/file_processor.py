@@ -1,22 +1,25 @@
 import os
 from pathlib import Path
 import hashlib
-from concurrent.futures import ThreadPoolExecutor
-import json
-from typing import List, Set, Dict, Any
-from langchain_community.document_loaders import (
-    TextLoader,
-    PDFMinerLoader,
-    UnstructuredWordDocumentLoader
-)
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import ModelScopeEmbeddings
+import shutil
+import tempfile
+import threading
+from itertools import islice
+from typing import List, Set, Dict, Any, Iterable, Optional, Callable, BinaryIO, Tuple, Union
 import logging
-import torch
-from docx2python import docx2python
-import pandas as pd
 from tools.vector_searcher import VectorSearcher
+from tools.ingestion_manifest import IngestionManifest
+from tools.ingestion_pipeline import IngestionPipeline
+from tools.glossary import Glossary, GlossaryEntry
+from tools import text_extractors
+
+try:
+    import xxhash
+except ImportError:  # 可选依赖，未安装时不能使用 xxh3_128
+    xxhash = None
+
+# 流式哈希每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
 
 class FileProcessor:
     def __init__(self, 
@@ -24,287 +27,437 @@ class FileProcessor:
                  collection_name: str = "translations",
                  max_workers: int = 4,
                  chunk_size: int = 500,
-                 chunk_overlap: int = 50):
+                 chunk_overlap: int = 50,
+                 vector_searcher: Optional[VectorSearcher] = None,
+                 embed_batch_size: int = 64,
+                 hash_algorithm: str = "md5",
+                 write_batch_size: int = 1024,
+                 stream_threshold: int = 64 * 1024 * 1024):
         """
         初始化文件处理器
         
         Args:
             persist_dir: 向量存储持久化目录
             collection_name: 向量存储集合名称
-            max_workers: 最大并发工作线程数
+            max_workers: 目录入库时的解析子进程数
             chunk_size: 文本分块大小
             chunk_overlap: 文本分块重叠大小
+            vector_searcher: 共享的向量查询器，默认新建一个（嵌入模型在进程内共享）
+            embed_batch_size: 每批嵌入和写入的文本块数量
+            hash_algorithm: 文件哈希算法，md5/sha1/blake2b 等 hashlib 算法，
+                安装 xxhash 后可用更快的 xxh3_128；更换算法后已处理文件会被重新识别
+            write_batch_size: 目录入库时每批写入向量存储的文本块数量
+            stream_threshold: 目录入库时超过该大小（字节）的文件按窗口流式读取，不在子进程中整体解析
         """
         self.persist_dir = persist_dir
         self.collection_name = collection_name
         self.max_workers = max_workers
-        self.processed_files_path = os.path.join(persist_dir, f"{collection_name}_processed_files.json")
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.stream_threshold = stream_threshold
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
         
-        # 使用 ModelScope 中文嵌入模型
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.embeddings = ModelScopeEmbeddings(
-            model_id="damo/nlp_corom_sentence-embedding_chinese-base",
-        )
+        if hash_algorithm == "xxh3_128" and xxhash is None:
+            raise ValueError("使用 xxh3_128 需要安装 xxhash")
+        self.hash_algorithm = hash_algorithm
         
-        # 初始化向量存储
-        self.vector_searcher = VectorSearcher(persist_dir=persist_dir)
+        # 初始化向量存储，嵌入模型与向量查询器共用
+        self.vector_searcher = vector_searcher or VectorSearcher(persist_dir=persist_dir)
+        self.embeddings = self.vector_searcher.embeddings
+        
+        # 各向量存储后端的数据互不相通，入库清单按后端分开保存，切换后端后文件会重新入库；
+        # chroma 沿用原来的文件名，已有的入库记录继续有效
+        backend_name = self.vector_searcher.backend.name
+        manifest_name = collection_name if backend_name == "chroma" else f"{collection_name}_{backend_name}"
+        self.manifest_path = os.path.join(persist_dir, f"{manifest_name}_manifest.sqlite3")
         
         # 初始化文本分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", "。", ".", "!", "?", "！", "？", " ", ""]
-        )
+        self.text_splitter = text_extractors.make_text_splitter(chunk_size, chunk_overlap)
         
         # 设置日志
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(f"{__name__}.{collection_name}")
         
-        # 加载已处理文件记录
-        self.processed_files = self._load_processed_files()
+        # 入库清单（SQLite WAL）：记录每个文件的哈希、文本块、耗时和状态，
+        # 以及路径的 stat 签名，未变化的文件只需一次 stat()
+        self.manifest = IngestionManifest(self.manifest_path)
+        if backend_name == "chroma":
+            # 旧版 JSON 记录只对应 chroma 中的数据
+            self.manifest.import_legacy(
+                os.path.join(persist_dir, f"{collection_name}_processed_files.json"),
+                os.path.join(persist_dir, f"{collection_name}_file_manifest.json")
+            )
+        
+        # 正在处理中的 (记录路径, 文件哈希)，避免并发提交的同一文件被重复处理
+        self._in_flight: Set[Tuple[str, str]] = set()
+        self._processed_lock = threading.Lock()
         
         # 支持的文件类型及其加载器
-        self.file_loaders = {
-            '.txt': TextLoader,
-            '.pdf': PDFMinerLoader,
-            '.doc': UnstructuredWordDocumentLoader,
-            '.docx': UnstructuredWordDocumentLoader
-        }
+        self.file_loaders = text_extractors.FILE_LOADERS
+        
+        # 目录入库的分阶段流水线统计（最近一次）
+        self.last_pipeline_stats: Dict[str, Any] = {}
         
         self.logger.info(f"初始化文件处理器: 集合名称={collection_name}, 存储目录={persist_dir}")
     
-    def _load_processed_files(self) -> Set[str]:
-        """加载已处理文件的记录"""
-        if os.path.exists(self.processed_files_path):
-            with open(self.processed_files_path, 'r', encoding='utf-8') as f:
-                return set(json.load(f))
-        return set()
-    
-    def _save_processed_files(self):
-        """保存已处理文件的记录"""
-        with open(self.processed_files_path, 'w', encoding='utf-8') as f:
-            json.dump(list(self.processed_files), f)
-    
     def _get_file_hash(self, file_path: str) -> str:
-        """计算文件的MD5哈希值"""
+        """分块流式计算文件哈希，内存占用与文件大小无关"""
+        hasher = xxhash.xxh3_128() if self.hash_algorithm == "xxh3_128" else hashlib.new(self.hash_algorithm)
         with open(file_path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+            for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
     
-    def _process_single_file(self, file_path: str) -> bool:
-        """处理单个文件"""
-        try:
-            file_path = str(file_path)
-            file_hash = self._get_file_hash(file_path)
+    def _get_cached_file_hash(self, file_path: str) -> str:
+        """大小、mtime_ns 和 inode 均未变化时直接返回清单中的哈希，否则重新计算"""
+        key = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino, self.hash_algorithm]
+        entry = self.manifest.get_file_stat(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        
+        file_hash = self._get_file_hash(file_path)
+        self.manifest.put_file_stat(key, signature, file_hash)
+        return file_hash
+    
+    def load_text(self, file_path: str) -> str:
+        """
+        按文件类型提取纯文本（不写入向量存储）
+        
+        Args:
+            file_path: 文件路径，支持 txt/pdf/doc/docx/xlsx/xls/json
             
-            # 检查文件是否已处理
-            if file_hash in self.processed_files:
-                self.logger.info(f"文件已处理，跳过: {file_path}")
+        Returns:
+            str: 提取出的文本
+        """
+        return text_extractors.load_text(file_path)
+    
+    def _is_supported(self, file_path: str, columns: Optional[Tuple[str, str]] = None) -> bool:
+        """判断文件类型是否支持，columns 不为空时按平行语料判断"""
+        if columns is not None:
+            return os.path.splitext(file_path)[1].lower() in text_extractors.PAIR_EXTENSIONS
+        return text_extractors.is_supported(file_path)
+    
+    def claim(self, file_hash: str, path: str) -> bool:
+        """登记记录路径上的这一内容为处理中；该路径已处理或正在处理这一内容时返回 False"""
+        with self._processed_lock:
+            if (path, file_hash) in self._in_flight or self.manifest.is_processed(file_hash, path):
                 return False
+            self._in_flight.add((path, file_hash))
+            return True
+    
+    def release(self, file_hash: str, path: str):
+        """取消文件的处理中登记"""
+        with self._processed_lock:
+            self._in_flight.discard((path, file_hash))
+    
+    def _new_chunks(self,
+                    source: str,
+                    batch: List[Union[str, Tuple[str, str]]],
+                    occurrences: Dict[bytes, int]) -> Tuple[List[str], List[Tuple[str, Union[str, Tuple[str, str]]]]]:
+        """
+        生成一批文本块的ID，并找出集合中尚不存在、需要计算嵌入的文本块
+        
+        Args:
+            source: 文本来源，参与文本块ID计算
+            batch: 一批文本块；平行语料为 (原文, 译文)
+            occurrences: 出现次数计数表，同一来源的各批传入同一个字典
             
-            # 获取文件扩展名
-            ext = os.path.splitext(file_path)[1].lower()
+        Returns:
+            (这一批的全部文本块ID, 需要写入的 (ID, 文本块) 列表)
+        """
+        # 语料对的ID同时由原文和译文决定，译文修改后重新写入
+        batch_ids = self.vector_searcher.make_chunk_ids(
+            source, [chunk if isinstance(chunk, str) else "\x00".join(chunk) for chunk in batch], occurrences
+        )
+        existing = self.vector_searcher.get_existing_ids(self.collection_name, batch_ids)
+        pending = [(chunk_id, chunk) for chunk_id, chunk in zip(batch_ids, batch) if chunk_id not in existing]
+        return batch_ids, pending
+    
+    def _commit_chunks(self,
+                       file_hash: str,
+                       record_path: str,
+                       chunk_ids: List[str],
+                       previous_ids: List[str],
+                       superseded: Optional[List[Tuple[str, str]]] = None):
+        """
+        文件的全部文本块写入后，删除旧版本中已不存在的文本块并在清单中提交（单个事务）
+        
+        Args:
+            file_hash: 文件哈希
+            record_path: 清单中的记录路径
+            chunk_ids: 当前版本的全部文本块ID
+            previous_ids: 被替换的旧版本的文本块ID
+            superseded: 同时被替换的其他 (记录路径, 文件哈希)
+        """
+        stale = sorted(set(previous_ids) - set(chunk_ids))
+        self.vector_searcher.delete_texts(self.collection_name, stale)
+        self.manifest.finish(file_hash, record_path, chunk_ids, superseded)
+        if stale:
+            self.logger.info(f"{record_path}: 删除旧版本的 {len(stale)} 个文本块")
+    
+    def _index_chunks(self,
+                      source: str,
+                      chunks: Iterable[Union[str, Tuple[str, str]]],
+                      progress: Optional[Callable[[str, int], None]] = None) -> List[str]:
+        """
+        增量写入文本块：ID 由来源和内容确定，集合中已有的文本块不再计算嵌入；
+        文本块按批消费，每批完成后通过 progress(阶段, 数量) 汇报进度
+        
+        Args:
+            source: 文本来源，参与文本块ID计算
+            chunks: 分割后的文本块，可以是流式产出的迭代器；平行语料为 (原文, 译文)，
+                只嵌入原文，译文保存在元数据 translation 中
+            progress: 可选的进度回调 (阶段, 数量)
             
-            # 根据文件类型选择处理方法
-            if ext == '.docx':
-                self._process_docx(file_path)
-            elif ext in ('.xlsx', '.xls'):
-                self._process_excel(file_path)
-            elif ext == '.json':
-                self._process_json(file_path)
-            elif ext in self.file_loaders:
-                # 使用通用加载器处理其他支持的文件类型
-                loader = self.file_loaders[ext](file_path)
-                documents = loader.load()
-                texts = self.text_splitter.split_documents(documents)
+        Returns:
+            List[str]: 当前版本的全部文本块ID
+        """
+        chunk_ids: List[str] = []
+        occurrences: Dict[bytes, int] = {}
+        embedded = 0
+        iterator = iter(chunks)
+        while True:
+            batch = list(islice(iterator, self.embed_batch_size))
+            if not batch:
+                break
+            if progress:
+                progress('parsed', len(batch))
+            batch_ids, pending = self._new_chunks(source, batch, occurrences)
+            chunk_ids.extend(batch_ids)
+            if pending:
+                texts = [chunk if isinstance(chunk, str) else chunk[0] for _, chunk in pending]
+                metadatas = [
+                    {"source": source} if isinstance(chunk, str) else {"source": source, "translation": chunk[1]}
+                    for _, chunk in pending
+                ]
+                vectors = self.embeddings.embed_documents(texts)
                 self.vector_searcher.add_texts(
                     collection_name=self.collection_name,
                     texts=texts,
-                    metadatas=[{"source": file_path} for _ in texts]
+                    metadatas=metadatas,
+                    ids=[chunk_id for chunk_id, _ in pending],
+                    embeddings=vectors,
+                    upsert=True
                 )
-            else:
-                self.logger.warning(f"不支持的文件类型: {file_path}")
-                return False
-            
-            # 记录已处理文件
-            self.processed_files.add(file_hash)
-            self._save_processed_files()
-            
-            self.logger.info(f"成功处理文件: {file_path}")
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"处理文件失败 {file_path}: {str(e)}")
-            return False
+                embedded += len(pending)
+            if progress:
+                progress('embedded', len(batch))
+                progress('written', len(batch))
+        
+        if not chunk_ids:
+            self.logger.warning(f"文本分割后没有内容: {source}")
+        
+        self.logger.info(
+            f"{source}: 共 {len(chunk_ids)} 个文本块，新增 {embedded} 个，复用 {len(chunk_ids) - embedded} 个"
+        )
+        return chunk_ids
     
-    def process_files(self, directory: str):
-        """并发处理目录下的所有文件"""
+    def _ingest(self,
+                file_path: str,
+                source: str,
+                progress: Optional[Callable[[str, int], None]] = None,
+                columns: Optional[Tuple[str, str]] = None,
+                file_hash: Optional[str] = None,
+                replaces: Optional[str] = None) -> bool:
+        """
+        提取、分割并写入单个文件；已处理或正在处理的相同内容直接跳过
+
+        Args:
+            file_path: 文件路径
+            source: 文本来源，同时作为清单中的记录路径；同一记录路径的新版本替换旧版本
+            progress: 可选的进度回调 (阶段, 数量)
+            columns: 平行语料的 (原文列, 译文列)
+            file_hash: 已计算的内容哈希，None 时按路径计算（使用 stat 缓存）
+            replaces: 上传文件名；提供时同时替换该文件名之前上传的各个版本
+
+        Returns:
+            bool: 是否实际处理
+        """
+        if file_hash is None:
+            file_hash = self._get_cached_file_hash(file_path)
+        # 清单中的记录路径；同一文件按不同列映射导入视为不同的入库记录，互不替换
+        suffix = f"#{columns[0]}->{columns[1]}" if columns is not None else ''
+        record_path = f"{source}{suffix}"
+        if columns is not None:
+            file_hash = f"{file_hash}:{columns[0]}:{columns[1]}"
+        
+        # 检查文件是否已处理或正在处理
+        if not self.claim(file_hash, record_path):
+            self.logger.info(f"文件已处理，跳过: {source}")
+            return False
+        
         try:
-            # 获取所有支持的文件
-            files_to_process = []
-            for ext in self.file_loaders.keys():
-                files_to_process.extend(Path(directory).rglob(f"*{ext}"))
-            
-            if not files_to_process:
-                self.logger.warning(f"目录中没有找到支持的文件: {directory}")
-                return
-            
-            # 使用线程池并发处理文件
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                results = list(executor.map(self._process_single_file, files_to_process))
-            
-            # 统计处理结果
-            processed = sum(1 for r in results if r)
-            self.logger.info(f"处理完成: 成功 {processed} 个文件, 总计 {len(files_to_process)} 个文件")
-            
+            if columns is not None:
+                # 平行语料按行整体写入，不再分割
+                self.manifest.start(file_hash, record_path, 'parallel_corpus')
+                chunks = text_extractors.iter_pairs(file_path, *columns)
+            else:
+                self.manifest.start(file_hash, record_path, text_extractors.parser_name(file_path))
+                # 流式提取、分割并增量写入向量存储（只嵌入新增的文本块，删除消失的文本块）
+                chunks = text_extractors.iter_chunks(file_path, self.chunk_size, self.chunk_overlap)
+            previous_ids = self.manifest.get_previous_chunk_ids(record_path, file_hash)
+            superseded = []
+            if replaces is not None:
+                for old_path, old_hash, old_ids in self.manifest.get_upload_versions(replaces, suffix):
+                    if (old_path, old_hash) != (record_path, file_hash):
+                        superseded.append((old_path, old_hash))
+                        previous_ids.extend(old_ids)
+            chunk_ids = self._index_chunks(source, chunks, progress)
+            self._commit_chunks(file_hash, record_path, chunk_ids, previous_ids, superseded)
         except Exception as e:
-            self.logger.error(f"处理目录失败 {directory}: {str(e)}")
+            self.manifest.fail(file_hash, record_path, str(e))
             raise
+        finally:
+            self.release(file_hash, record_path)
+        
+        self.logger.info(f"成功处理文件: {source}")
+        return True
     
-    def _process_docx(self, file_path: str) -> None:
-        """处理Word文档"""
-        try:
-            # 使用 docx2python 提取文本
-            with docx2python(file_path) as doc:
-                text_content = []
-                # 提取所有文本内容
-                for paragraph in doc.text.split('\n'):
-                    if paragraph.strip():
-                        text_content.append(paragraph.strip())
-            
-            # 分割文本
-            chunks = self.text_splitter.split_text("\n".join(text_content))
-            
-            # 添加到向量存储
-            self.vector_searcher.add_texts(
-                collection_name=self.collection_name,
-                texts=chunks,
-                metadatas=[{"source": file_path} for _ in chunks]
-            )
-            
-            self.logger.info(f"成功处理Word文档: {file_path}")
+    def process_file(self,
+                     path_or_stream: Union[str, os.PathLike, BinaryIO],
+                     filename: Optional[str] = None,
+                     progress: Optional[Callable[[str, int], None]] = None,
+                     columns: Optional[Tuple[str, str]] = None,
+                     replace: bool = False) -> bool:
+        """
+        处理单个文件，不扫描任何目录
+        
+        Args:
+            path_or_stream: 文件路径，或以二进制方式读取的文件对象（如上传的文件流）
+            filename: 原始文件名，用于判断文件类型并记录来源；传入文件对象时必须提供，
+                传入文件路径时以路径作为来源（只有同一路径的新版本才替换旧版本）
+            progress: 可选的进度回调 (阶段, 数量)
+            columns: 按平行语料导入时的 (原文列, 译文列)；每行作为一个语料对写入，
+                只嵌入原文，支持 xlsx/xls/csv/tsv/json/jsonl
+            replace: 传入文件对象时是否替换同名文件之前上传的版本（来源为文件名，未修改的文本块不重新嵌入）；
+                默认每次上传的内容都是独立的文档（来源为 "文件名#内容哈希前缀"），同名上传互不删除
             
-        except Exception as e:
-            self.logger.error(f"处理Word文档失败 {file_path}: {str(e)}")
-            raise
-    
-    def _process_excel(self, file_path: str) -> None:
-        """处理Excel文件"""
+        Returns:
+            bool: 是否实际处理（已处理过的文件返回 False）
+        """
+        if isinstance(path_or_stream, (str, os.PathLike)):
+            file_path = str(path_or_stream)
+            if not self._is_supported(file_path, columns):
+                raise ValueError(f"不支持的文件类型: {file_path}")
+            # 与目录入库一致，以磁盘路径作为来源，不同目录下的同名文件互不替换
+            return self._ingest(file_path, file_path, progress, columns=columns)
+        
+        if not filename:
+            raise ValueError("处理文件流时必须提供 filename")
+        if not self._is_supported(filename, columns):
+            raise ValueError(f"不支持的文件类型: {filename}")
+        
+        tmp_path = self._spool_to_file(path_or_stream, filename)
         try:
-            # 读取所有sheet
-            df = pd.read_excel(file_path, sheet_name=None)
-            
-            all_texts = []
-            # 处理每个sheet
-            for sheet_name, sheet_df in df.items():
-                # 将每行转换为文本
-                for _, row in sheet_df.iterrows():
-                    row_text = " ".join(str(cell) for cell in row if pd.notna(cell))
-                    if row_text.strip():
-                        all_texts.append(row_text)
-            
-            # 分割文本
-            chunks = self.text_splitter.split_text("\n".join(all_texts))
-            
-            # 添加到向量存储
-            self.vector_searcher.add_texts(
-                collection_name=self.collection_name,
-                texts=chunks,
-                metadatas=[{"source": file_path} for _ in chunks]
-            )
-            
-            self.logger.info(f"成功处理Excel文件: {file_path}")
+            # 临时文件每次路径都不同，不写入 stat 缓存
+            file_hash = self._get_file_hash(tmp_path)
+            if replace:
+                # 替换同名上传：来源固定为文件名，未修改的文本块ID不变，直接复用已有向量
+                return self._ingest(
+                    tmp_path, filename, progress, columns=columns, file_hash=file_hash, replaces=filename
+                )
+            # 独立上传：来源带上内容哈希，不同用户上传的同名文件互不替换
+            return self._ingest(tmp_path, f"{filename}#{file_hash[:12]}", progress, columns=columns, file_hash=file_hash)
+        finally:
+            os.remove(tmp_path)
+    
+    @staticmethod
+    def _spool_to_file(stream: BinaryIO, filename: str) -> str:
+        """文件流写入独立的临时文件（保留扩展名），供按路径读取的加载器使用，调用方负责删除"""
+        ext = os.path.splitext(filename)[1].lower()
+        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+            shutil.copyfileobj(stream, tmp)
+            return tmp.name
+    
+    def load_glossary(self,
+                      path_or_stream: Union[str, os.PathLike, BinaryIO],
+                      glossary: Glossary,
+                      source_lang: str,
+                      target_lang: str,
+                      columns: Tuple[str, str] = ("term", "translation"),
+                      filename: Optional[str] = None) -> int:
+        """
+        从术语文件导入术语表；同一文件再次导入时只增量更新新增、修改和删除的术语
+        
+        Args:
+            path_or_stream: 文件路径或以二进制方式读取的文件对象
+            glossary: 要更新的术语表
+            source_lang: 源语言
+            target_lang: 目标语言
+            columns: (术语列, 译法列)，支持 xlsx/xls/csv/tsv/json/jsonl
+            filename: 原始文件名，作为术语来源；传入文件对象时必须提供
             
-        except Exception as e:
-            self.logger.error(f"处理Excel文件失败 {file_path}: {str(e)}")
-            raise
+        Returns:
+            int: 变更的术语数量
+        """
+        if isinstance(path_or_stream, (str, os.PathLike)):
+            file_path, tmp_path = str(path_or_stream), None
+        else:
+            if not filename:
+                raise ValueError("处理文件流时必须提供 filename")
+            file_path = tmp_path = self._spool_to_file(path_or_stream, filename)
+        source = filename or file_path
+        if not self._is_supported(source, columns):
+            raise ValueError(f"不支持的术语文件类型: {source}")
+        try:
+            entries = [GlossaryEntry(term, translation) for term, translation in text_extractors.iter_pairs(file_path, *columns)]
+            return glossary.update(entries, source_lang, target_lang, source=source)
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
     
-    def _process_json(self, file_path: str) -> None:
-        """处理JSON文件"""
+    def _process_single_file(self,
+                             file_path: str,
+                             progress: Optional[Callable[[str, int], None]] = None) -> bool:
+        """处理单个文件，progress 为可选的进度回调 (阶段, 数量)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 将JSON数据转换为文本
-            texts = self._json_to_texts(data)
-            
-            # 分割文本
-            chunks = self.text_splitter.split_text("\n".join(texts))
-            
-            # 添加到向量存储
-            self.vector_searcher.add_texts(
-                collection_name=self.collection_name,
-                texts=chunks,
-                metadatas=[{"source": file_path} for _ in chunks]
-            )
-            
-            self.logger.info(f"成功处理JSON文件: {file_path}")
+            file_path = str(file_path)
+            if not self._is_supported(file_path):
+                self.logger.warning(f"不支持的文件类型: {file_path}")
+                return False
+            return self._ingest(file_path, file_path, progress)
             
         except Exception as e:
-            self.logger.error(f"处理JSON文件失败 {file_path}: {str(e)}")
-            raise
+            self.logger.error(f"处理文件失败 {file_path}: {str(e)}")
+            return False
     
-    def _json_to_texts(self, data: Any) -> List[str]:
-        """将JSON数据转换为文本列表"""
-        texts = []
-        
-        if isinstance(data, dict):
-            for key, value in data.items():
-                if isinstance(value, (dict, list)):
-                    texts.extend(self._json_to_texts(value))
-                else:
-                    texts.append(f"{key}: {value}")
-        elif isinstance(data, list):
-            for item in data:
-                texts.extend(self._json_to_texts(item))
-        else:
-            texts.append(str(data))
+    def process_files(self, directory: str, progress: Optional[Callable[[str, int], None]] = None) -> int:
+        """
+        通过分阶段流水线处理目录下的所有文件：子进程解析、跨文件批量嵌入、批量写入
         
-        return texts
-
-    def _process_pdf(self, file_path: str) -> None:
-        """处理PDF文件"""
-        try:
-            loader = PDFMinerLoader(file_path)
-            pages = loader.load()
-            
-            # 提取文本
-            text_content = []
-            for page in pages:
-                if isinstance(page, str):
-                    text_content.append(page)
-                elif hasattr(page, 'page_content'):
-                    text_content.append(page.page_content)
+        Args:
+            directory: 目录路径
+            progress: 可选的进度回调 (阶段, 数量)
             
-            if not text_content:
-                self.logger.warning(f"PDF文件没有提取到文本: {file_path}")
-                return
+        Returns:
+            int: 成功处理的文件数；各阶段吞吐统计保存在 last_pipeline_stats
+        """
+        try:
+            # 获取所有支持的文件
+            files_to_process = sorted(
+                str(path) for path in Path(directory).rglob("*")
+                if path.is_file() and self._is_supported(str(path))
+            )
             
-            # 分割文本
-            chunks = self.text_splitter.split_text("\n".join(text_content))
+            if not files_to_process:
+                self.logger.warning(f"目录中没有找到支持的文件: {directory}")
+                return 0
             
-            if not chunks:
-                self.logger.warning(f"文本分割后没有内容: {file_path}")
-                return
+            pipeline = IngestionPipeline(
+                self,
+                parse_workers=self.max_workers,
+                embed_batch_size=self.embed_batch_size,
+                write_batch_size=self.write_batch_size,
+                stream_threshold=self.stream_threshold
+            )
+            processed, self.last_pipeline_stats = pipeline.run(files_to_process, progress)
             
-            # 添加到向量存储
-            try:
-                self.vector_searcher.add_texts(
-                    collection_name=self.collection_name,
-                    texts=chunks,
-                    metadatas=[{"source": file_path} for _ in chunks]
-                )
-                self.logger.info(f"成功处理PDF文件: {file_path}")
-                
-                # 记录已处理文件
-                file_hash = self._get_file_hash(file_path)
-                self.processed_files.add(file_hash)
-                self._save_processed_files()
-                
-            except Exception as e:
-                self.logger.error(f"添加文本到向量存储失败: {str(e)}")
-                raise
+            self.logger.info(f"处理完成: 成功 {processed} 个文件, 总计 {len(files_to_process)} 个文件")
+            return processed
             
         except Exception as e:
-            self.logger.error(f"处理PDF文件失败 {file_path}: {str(e)}")
-            raise 
\ No newline at end of file
+            self.logger.error(f"处理目录失败 {directory}: {str(e)}")
+            raise
@@ -0,0 +1,275 @@
+import hashlib
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# 码位低于此值的字母和数字（拉丁、希腊、西里尔等）属于以空格分词的文字；中日韩文字不分词，不检查词边界
+_CJK_START = '\u2e80'
+
+
+def _is_word_char(char: str) -> bool:
+    """是否为以空格分词的文字中的字母或数字"""
+    return char.isalnum() and char < _CJK_START
+
+
+def _needs_boundary(char: str) -> bool:
+    """术语首尾为 ASCII 字母或数字时，该侧需要词边界"""
+    return char.isascii() and char.isalnum()
+
+
+@dataclass(frozen=True)
+class GlossaryEntry:
+    """一条术语：原文术语、审定译法和可选备注"""
+    term: str
+    translation: str
+    note: str = ""
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Iterable[str]):
+        """
+        构建 Aho-Corasick 多模式匹配自动机
+
+        构建后只读，可在多个线程中同时匹配；扫描文本的时间与文本长度成线性关系，与模式数量无关。
+        转移表存放在一个以 (状态, 字符) 为键的字典中，十万级模式也不必为每个状态创建字典。
+        以 ASCII 字母或数字开头（结尾）的模式只在左侧（右侧）是词边界时匹配，
+        避免 "she" 匹配 "ushers"；中日韩模式仍按子串匹配。
+
+        Args:
+            patterns: 模式串（应已统一大小写）
+        """
+        self.patterns: List[str] = []
+        # 每个模式 (左侧, 右侧) 是否需要词边界
+        self._bounds: List[Tuple[bool, bool]] = []
+        self._goto: Dict[Tuple[int, str], int] = {}
+        children: List[List[Tuple[str, int]]] = [[]]
+        # 每个状态的输出（以该状态结尾的模式编号，含失败链上的模式）
+        self._output: List[Tuple[int, ...]] = [()]
+
+        for pattern in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto.get((state, char))
+                if next_state is None:
+                    next_state = len(children)
+                    self._goto[(state, char)] = next_state
+                    children[state].append((char, next_state))
+                    children.append([])
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (len(self.patterns),)
+            self.patterns.append(pattern)
+            self._bounds.append((_needs_boundary(pattern[0]), _needs_boundary(pattern[-1])))
+
+        # 按层次遍历计算失败指针，并合并失败链上的输出
+        self._fail: List[int] = [0] * len(children)
+        queue = deque(next_state for _, next_state in children[0])
+        while queue:
+            state = queue.popleft()
+            for char, next_state in children[state]:
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and (fallback, char) not in self._goto:
+                    fallback = self._fail[fallback]
+                fail_state = self._goto.get((fallback, char), 0)
+                if fail_state == next_state:
+                    fail_state = 0
+                self._fail[next_state] = fail_state
+                if self._output[fail_state]:
+                    self._output[next_state] += self._output[fail_state]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        查找所有（可能重叠的）匹配，拉丁字母和数字术语要求词边界
+
+        Args:
+            text: 待扫描的文本（应已统一大小写）
+
+        Returns:
+            List[Tuple[int, int, int]]: (起始位置, 结束位置, 模式编号)
+        """
+        if not self.patterns:
+            return []
+        matches = []
+        goto, fail, output, patterns, bounds = self._goto, self._fail, self._output, self.patterns, self._bounds
+        state = 0
+        for position, char in enumerate(text):
+            next_state = goto.get((state, char))
+            while next_state is None and state:
+                state = fail[state]
+                next_state = goto.get((state, char))
+            state = next_state or 0
+            for index in output[state]:
+                start, end = position + 1 - len(patterns[index]), position + 1
+                left, right = bounds[index]
+                if left and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if right and end < len(text) and _is_word_char(text[end]):
+                    continue
+                matches.append((start, end, index))
+        return matches
+
+
+def _select_longest(matches: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """从重叠匹配中选出最左最长且互不重叠的匹配"""
+    selected = []
+    end = 0
+    for match in sorted(matches, key=lambda m: (m[0], m[0] - m[1])):
+        if match[0] >= end:
+            selected.append(match)
+            end = match[1]
+    return selected
+
+
+class _PairIndex:
+    """单个语言对的术语及其自动机"""
+
+    def __init__(self):
+        self.entries: Dict[str, GlossaryEntry] = {}
+        self.sources: Dict[str, Dict[str, GlossaryEntry]] = {}
+        # (主自动机, 增量自动机, 主自动机构建后删除或修改过的术语)，整体替换，匹配时无需加锁
+        self.automata: Tuple[AhoCorasick, AhoCorasick, FrozenSet[str]] = (AhoCorasick([]), AhoCorasick([]), frozenset())
+
+
+class Glossary:
+    def __init__(self, rebuild_threshold: int = 1000):
+        """
+        初始化术语表
+
+        每个语言对维护一个主自动机和一个增量自动机：新增或修改的术语先进入增量自动机，
+        累计超过 rebuild_threshold 条后才重建主自动机，避免每次修改都重建十万级的自动机。
+        匹配不区分大小写，多个术语重叠时取最左最长的匹配。
+
+        Args:
+            rebuild_threshold: 增量自动机中的术语数超过此值时重建主自动机
+        """
+        self.rebuild_threshold = rebuild_threshold
+        self._pairs: Dict[Tuple[str, str], _PairIndex] = {}
+        self._lock = threading.Lock()
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return text.lower()
+
+    def _pair(self, source_lang: str, target_lang: str) -> _PairIndex:
+        pair = self._pairs.get((source_lang, target_lang))
+        if pair is None:
+            pair = self._pairs.setdefault((source_lang, target_lang), _PairIndex())
+        return pair
+
+    def _refresh(self, pair: _PairIndex, changed: Set[str]):
+        """术语变更后更新自动机（需在持有锁时调用）"""
+        main, _, stale = pair.automata
+        stale = stale | changed
+        if len(stale) > self.rebuild_threshold:
+            pair.automata = (AhoCorasick(pair.entries), AhoCorasick([]), frozenset())
+            self.logger.info(f"已重建术语自动机: {len(pair.entries)} 条术语")
+        else:
+            pair.automata = (main, AhoCorasick(key for key in stale if key in pair.entries), stale)
+
+    def update(self,
+               entries: Iterable[GlossaryEntry],
+               source_lang: str,
+               target_lang: str,
+               source: str = "default") -> int:
+        """
+        用一个来源（如术语文件）的完整内容替换该来源之前的术语，只有新增、修改和删除的术语触发增量更新
+
+        Args:
+            entries: 该来源的全部术语
+            source_lang: 源语言
+            target_lang: 目标语言
+            source: 术语来源名称，同一来源再次导入时替换旧内容
+
+        Returns:
+            int: 新增、修改或删除的术语数量
+        """
+        new_entries = {self._normalize(entry.term): entry for entry in entries if entry.term.strip()}
+        with self._lock:
+            pair = self._pair(source_lang, target_lang)
+            old_entries = pair.sources.get(source, {})
+            changed = {key for key in old_entries if key not in new_entries}
+            changed |= {key for key, entry in new_entries.items() if old_entries.get(key) != entry}
+            pair.sources[source] = new_entries
+            for key in changed:
+                if key in new_entries:
+                    pair.entries[key] = new_entries[key]
+                    continue
+                # 被删除的术语若在其他来源中仍然存在，则沿用其他来源的译法
+                fallback = next((entries[key] for entries in pair.sources.values() if key in entries), None)
+                if fallback is not None:
+                    pair.entries[key] = fallback
+                else:
+                    pair.entries.pop(key, None)
+            if changed:
+                self._refresh(pair, changed)
+        self.logger.info(f"术语表 {source} ({source_lang}->{target_lang}): {len(new_entries)} 条，变更 {len(changed)} 条")
+        return len(changed)
+
+    def match(self, text: str, source_lang: str, target_lang: str) -> List[GlossaryEntry]:
+        """
+        扫描原文，返回出现的术语（按首次出现顺序去重）
+
+        Args:
+            text: 原文
+            source_lang: 源语言
+            target_lang: 目标语言
+
+        Returns:
+            List[GlossaryEntry]: 命中的术语
+        """
+        pair = self._pairs.get((source_lang, target_lang))
+        if pair is None:
+            return []
+        # 读取当前的自动机快照，构建新自动机时只替换引用
+        main, delta, stale = pair.automata
+        entries = pair.entries
+        normalized = self._normalize(text)
+        matches = [m for m in main.find_all(normalized) if main.patterns[m[2]] not in stale]
+        matches += [(start, end, -1 - index) for start, end, index in delta.find_all(normalized)]
+
+        found: List[GlossaryEntry] = []
+        seen = set()
+        for start, end, index in _select_longest(matches):
+            key = main.patterns[index] if index >= 0 else delta.patterns[-1 - index]
+            entry = entries.get(key)
+            if entry is not None and key not in seen:
+                seen.add(key)
+                found.append(entry)
+        return found
+
+    def size(self, source_lang: Optional[str] = None, target_lang: Optional[str] = None) -> int:
+        """术语数量，不指定语言对时返回全部语言对的总数"""
+        if source_lang is not None and target_lang is not None:
+            pair = self._pairs.get((source_lang, target_lang))
+            return len(pair.entries) if pair is not None else 0
+        return sum(len(pair.entries) for pair in self._pairs.values())
+
+    @staticmethod
+    def format_entries(entries: List[GlossaryEntry]) -> str:
+        """把命中的术语格式化为提示中的术语表，没有命中时返回空字符串"""
+        if not entries:
+            return ""
+        lines = ["术语表（以下术语必须使用给定译法）："]
+        for entry in entries:
+            line = f"- {entry.term} → {entry.translation}"
+            if entry.note:
+                line += f"（{entry.note}）"
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def digest(entries: List[GlossaryEntry]) -> str:
+        """命中术语的摘要，用于区分翻译缓存"""
+        payload = "\x00".join(f"{entry.term}\x01{entry.translation}\x01{entry.note}" for entry in entries)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IngestionManifest:
+    # 入库记录表；旧版记录没有路径时 path 为空字符串
+    _FILES_SCHEMA = """CREATE TABLE IF NOT EXISTS {table} (
+        file_hash TEXT NOT NULL,
+        path TEXT NOT NULL DEFAULT '',
+        status TEXT NOT NULL,
+        parser TEXT,
+        chunk_count INTEGER NOT NULL DEFAULT 0,
+        chunk_ids TEXT NOT NULL DEFAULT '[]',
+        started_at REAL,
+        finished_at REAL,
+        duration REAL,
+        error TEXT,
+        PRIMARY KEY (path, file_hash)
+    )"""
+
+    def __init__(self, db_path: str):
+        """
+        初始化入库清单（SQLite，WAL 模式）
+
+        按 (记录路径, 文件哈希) 记录文本块ID、文本块数量、解析器、耗时和状态，
+        同一内容出现在不同路径时各自入库、各自替换；
+        每个文件的状态更新都是一个独立事务，多个工作线程并发写入也不会丢失记录。
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        self.logger = logging.getLogger(__name__)
+
+        with self._connection() as conn:
+            conn.execute(self._FILES_SCHEMA.format(table='files'))
+            self._migrate_files_table(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_path ON files(path)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_status ON files(status)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS file_stats (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    file_hash TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _migrate_files_table(self, conn: sqlite3.Connection):
+        """旧版 files 表以文件哈希为主键，迁移为 (路径, 文件哈希) 主键"""
+        primary_key = [row[1] for row in sorted(conn.execute("PRAGMA table_info(files)"), key=lambda row: row[5])
+                       if row[5]]
+        if primary_key != ['file_hash']:
+            return
+        conn.execute("DROP INDEX IF EXISTS idx_files_path")
+        conn.execute("DROP INDEX IF EXISTS idx_files_status")
+        conn.execute("ALTER TABLE files RENAME TO files_v1")
+        conn.execute(self._FILES_SCHEMA.format(table='files'))
+        conn.execute(
+            """INSERT OR IGNORE INTO files
+               SELECT file_hash, COALESCE(path, ''), status, parser, chunk_count, chunk_ids,
+                      started_at, finished_at, duration, error
+               FROM files_v1"""
+        )
+        conn.execute("DROP TABLE files_v1")
+        self.logger.info(f"入库清单已迁移为按路径和文件哈希记录: {self.db_path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def import_legacy(self, processed_files_path: str, file_manifest_path: Optional[str] = None):
+        """
+        导入旧版 JSON 记录（*_processed_files.json 与 *_file_manifest.json）
+
+        旧文件保持不变（可能被版本库跟踪），按文件大小和修改时间记录已导入的版本，未变化时不再重复导入。
+        旧版记录没有文本块ID（旧版使用随机ID），能从 stat 记录中找回路径的按路径记录；
+        这些文件修改后旧文本块不会被自动删除，需要删除集合后重新入库一次。
+
+        Args:
+            processed_files_path: 已处理文件哈希列表的 JSON 路径
+            file_manifest_path: 路径 -> (大小, mtime_ns, inode, 算法, 哈希) 的 JSON 路径
+        """
+        sources = [path for path in (processed_files_path, file_manifest_path) if path and os.path.exists(path)]
+        if not sources:
+            return
+        signature = json.dumps([[os.path.abspath(path), os.path.getsize(path), os.stat(path).st_mtime_ns]
+                                for path in sources])
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'legacy_import'").fetchone()
+        if row is not None and row[0] == signature:
+            return
+
+        now = time.time()
+        stats: Dict[str, List[Any]] = {}
+        if file_manifest_path and os.path.exists(file_manifest_path):
+            with open(file_manifest_path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+        # 旧版 stat 记录中的 哈希 -> 路径
+        paths = {entry[4]: path for path, entry in stats.items()}
+        with conn:
+            if os.path.exists(processed_files_path):
+                with open(processed_files_path, 'r', encoding='utf-8') as f:
+                    hashes = json.load(f)
+                conn.executemany(
+                    """INSERT OR IGNORE INTO files (file_hash, path, status, parser, finished_at)
+                       VALUES (?, ?, 'done', 'legacy', ?)""",
+                    [(file_hash, paths.get(file_hash, ''), now) for file_hash in hashes]
+                )
+                recovered = sum(1 for file_hash in hashes if file_hash in paths)
+                self.logger.info(
+                    f"已从 {processed_files_path} 导入 {len(hashes)} 条已处理记录，其中 {recovered} 条找回了路径"
+                )
+                if hashes:
+                    self.logger.warning(
+                        "旧版入库记录没有文本块ID，这些文件修改后旧的文本块不会被删除；"
+                        "如需清理，请删除向量集合后重新入库一次"
+                    )
+            conn.executemany(
+                "INSERT OR IGNORE INTO file_stats VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, *entry) for path, entry in stats.items()]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_import', ?)", (signature,))
+
+    def get_file_stat(self, path: str) -> Optional[Tuple[List[Any], str]]:
+        """读取路径的 stat 签名 [大小, mtime_ns, inode, 算法] 和哈希"""
+        row = self._connection().execute(
+            "SELECT size, mtime_ns, inode, algorithm, file_hash FROM file_stats WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        return list(row[:4]), row[4]
+
+    def put_file_stat(self, path: str, signature: List[Any], file_hash: str):
+        """写入路径的 stat 签名和哈希"""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_stats VALUES (?, ?, ?, ?, ?, ?)",
+                (path, *signature, file_hash)
+            )
+
+    def is_processed(self, file_hash: str, path: str) -> bool:
+        """该路径的这一内容是否已成功入库；旧版导入的无路径记录按内容哈希判断"""
+        row = self._connection().execute(
+            "SELECT 1 FROM files WHERE file_hash = ? AND path IN (?, '') AND status = 'done' LIMIT 1",
+            (file_hash, path)
+        ).fetchone()
+        return row is not None
+
+    def start(self, file_hash: str, path: str, parser: str):
+        """标记文件开始处理"""
+        with self._connection() as conn:
+            conn.execute(
+                """INSERT INTO files (file_hash, path, status, parser, started_at)
+                   VALUES (?, ?, 'processing', ?, ?)
+                   ON CONFLICT(path, file_hash) DO UPDATE SET status = 'processing',
+                       parser = excluded.parser, started_at = excluded.started_at,
+                       finished_at = NULL, duration = NULL, error = NULL""",
+                (file_hash, path, parser, time.time())
+            )
+
+    def get_previous_chunk_ids(self, path: str, file_hash: str) -> List[str]:
+        """同一路径上一个已入库版本（内容哈希不同）的文本块ID，没有时返回空列表"""
+        row = self._connection().execute(
+            """SELECT chunk_ids FROM files WHERE path = ? AND file_hash != ? AND status = 'done'
+               ORDER BY finished_at DESC LIMIT 1""",
+            (path, file_hash)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else []
+
+    def get_upload_versions(self, filename: str, suffix: str = '') -> List[Tuple[str, str, List[str]]]:
+        """
+        同名上传文件已入库的各个版本
+
+        Args:
+            filename: 上传文件名；记录路径为 "文件名#内容哈希前缀"（替换上传直接使用文件名）加 suffix
+            suffix: 记录路径后缀，平行语料为 "#原文列->译文列"
+
+        Returns:
+            List[Tuple[str, str, List[str]]]: (记录路径, 文件哈希, 文本块ID) 列表
+        """
+        pattern = re.compile(re.escape(filename) + r'(?:#[0-9a-f]+)?' + re.escape(suffix))
+        rows = self._connection().execute(
+            "SELECT path, file_hash, chunk_ids FROM files WHERE status = 'done' AND substr(path, 1, ?) = ?",
+            (len(filename), filename)
+        ).fetchall()
+        return [
+            (path, file_hash, json.loads(chunk_ids))
+            for path, file_hash, chunk_ids in rows if pattern.fullmatch(path)
+        ]
+
+    def finish(self,
+               file_hash: str,
+               path: str,
+               chunk_ids: List[str],
+               superseded: Optional[List[Tuple[str, str]]] = None):
+        """
+        标记文件处理成功，记录文本块ID和耗时；同一路径的旧版本和 superseded 中的 (记录路径, 文件哈希)
+        在同一事务中标记为 superseded
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                """UPDATE files SET status = 'done', chunk_ids = ?, chunk_count = ?,
+                       finished_at = ?, duration = ? - started_at, error = NULL
+                   WHERE path = ? AND file_hash = ?""",
+                (json.dumps(chunk_ids), len(chunk_ids), now, now, path, file_hash)
+            )
+            # 旧版本的文本块已被替换，内容改回旧版本时需要重新入库
+            conn.execute(
+                "UPDATE files SET status = 'superseded' WHERE status = 'done' AND path = ? AND file_hash != ?",
+                (path, file_hash)
+            )
+            if superseded:
+                conn.executemany(
+                    "UPDATE files SET status = 'superseded' WHERE status = 'done' AND path = ? AND file_hash = ?",
+                    [key for key in superseded if key != (path, file_hash)]
+                )
+
+    def fail(self, file_hash: str, path: str, error: str):
+        """标记文件处理失败"""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                """UPDATE files SET status = 'failed', error = ?, finished_at = ?, duration = ? - started_at
+                   WHERE path = ? AND file_hash = ?""",
+                (error, now, now, path, file_hash)
+            )
+
+    def get_file(self, file_hash: str, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """按文件哈希（及记录路径）查询最近的记录"""
+        conn = self._connection()
+        query = "SELECT * FROM files WHERE file_hash = ?"
+        params: Tuple[Any, ...] = (file_hash,)
+        if path is not None:
+            query += " AND path = ?"
+            params += (path,)
+        cursor = conn.execute(query + " ORDER BY COALESCE(finished_at, started_at) DESC LIMIT 1", params)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        record = dict(zip([column[0] for column in cursor.description], row))
+        record['chunk_ids'] = json.loads(record['chunk_ids'])
+        return record
+
+    def list_files(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """列出最近处理的文件记录（不含文本块ID）"""
+        query = ("SELECT file_hash, path, status, parser, chunk_count, started_at, finished_at, duration, error "
+                 "FROM files")
+        params: Tuple[Any, ...] = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY COALESCE(finished_at, started_at) DESC LIMIT ?"
+        cursor = self._connection().execute(query, params + (limit,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def summary(self) -> Dict[str, Any]:
+        """按状态汇总文件数、文本块数和总耗时"""
+        rows = self._connection().execute(
+            "SELECT status, COUNT(*), SUM(chunk_count), SUM(duration) FROM files GROUP BY status"
+        ).fetchall()
+        return {
+            status: {'files': files, 'chunks': chunks or 0, 'seconds': seconds or 0.0}
+            for status, files, chunks, seconds in rows
+        }
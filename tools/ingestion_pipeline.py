@@ -0,0 +1,334 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tools.text_extractors import iter_chunks, parser_name, split_file
+
+# 阶段之间传递的结束标记
+_DONE = object()
+
+
+def _parse_worker(file_path: str, chunk_size: int, chunk_overlap: int) -> Tuple[List[str], float]:
+    """在子进程中提取并分割文件，返回文本块和耗时"""
+    start = time.perf_counter()
+    chunks = split_file(file_path, chunk_size, chunk_overlap)
+    return chunks, time.perf_counter() - start
+
+
+class StageStats:
+    """单个流水线阶段的吞吐统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+
+    def record(self, items: int, chunks: int, seconds: float):
+        self.items += items
+        self.chunks += chunks
+        self.busy_seconds += seconds
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, float]:
+        return {
+            'items': self.items,
+            'chunks': self.chunks,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'chunks_per_second': round(self.chunks / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+            'utilization': round(self.busy_seconds / wall_seconds, 3) if wall_seconds > 0 else 0.0
+        }
+
+
+class _FileTask:
+    """流水线中的单个文件"""
+
+    def __init__(self, file_hash: str, source: str):
+        self.file_hash = file_hash
+        self.source = source
+        self.chunk_ids: List[str] = []
+        self.previous_ids: List[str] = []
+        self.remaining = 0
+        self.parsed_all = False
+        self.streamed = False
+        self.failed = False
+
+
+class IngestionPipeline:
+    def __init__(self,
+                 file_processor,
+                 parse_workers: int = 4,
+                 embed_batch_size: int = 64,
+                 write_batch_size: int = 1024,
+                 queue_size: int = 8,
+                 stream_threshold: int = 64 * 1024 * 1024):
+        """
+        初始化分阶段入库流水线
+
+        解析阶段：子进程池提取并分割文件，绕开 PDFMiner/docx2python 的 GIL 争用；
+        嵌入阶段：单线程跨文件攒批，每次以 embed_batch_size 计算嵌入；
+        写入阶段：单线程攒够 write_batch_size 条后一次写入向量存储。
+        阶段之间用有界队列连接，下游处理不过来时上游自动等待。
+        超过 stream_threshold 的大文件不整体解析，而是由嵌入阶段按窗口流式读取，内存占用与文件大小无关。
+
+        Args:
+            file_processor: 文件处理器，提供向量存储、入库清单和分块参数
+            parse_workers: 解析子进程数
+            embed_batch_size: 每批嵌入的文本块数量
+            write_batch_size: 每批写入向量存储的文本块数量
+            queue_size: 阶段之间队列的容量（解析结果按文件计，嵌入结果按批计）
+            stream_threshold: 流式读取的文件大小阈值（字节）
+        """
+        self.file_processor = file_processor
+        self.parse_workers = parse_workers
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.queue_size = queue_size
+        self.stream_threshold = stream_threshold
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    def run(self,
+            file_paths: List[str],
+            progress: Optional[Callable[[str, int], None]] = None) -> Tuple[int, Dict[str, Any]]:
+        """
+        处理一组文件
+
+        Args:
+            file_paths: 文件路径列表
+            progress: 可选的进度回调 (阶段, 数量)
+
+        Returns:
+            (成功处理的文件数, 各阶段统计)
+        """
+        fp = self.file_processor
+        parsed_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        embedded_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        stats = {name: StageStats(name) for name in ('parse', 'embed', 'write')}
+        succeeded: List[_FileTask] = []
+        lock = threading.Lock()
+        started = time.perf_counter()
+
+        def report(stage: str, count: int):
+            if progress and count:
+                progress(stage, count)
+
+        def fail(task: _FileTask, error: Exception):
+            with lock:
+                if task.failed:
+                    return
+                task.failed = True
+            self.logger.error(f"处理文件失败 {task.source}: {str(error)}")
+            fp.manifest.fail(task.file_hash, task.source, str(error))
+            fp.release(task.file_hash, task.source)
+
+        def finalize(task: _FileTask):
+            """文件的全部文本块写入后删除旧版本的文本块并提交清单"""
+            try:
+                fp._commit_chunks(task.file_hash, task.source, task.chunk_ids, task.previous_ids)
+                fp.release(task.file_hash, task.source)
+                succeeded.append(task)
+                self.logger.info(f"成功处理文件: {task.source}")
+            except Exception as e:
+                fail(task, e)
+
+        def embed_stage():
+            buffer: List[Tuple[_FileTask, str, str]] = []
+
+            def flush():
+                rows = [row for row in buffer if not row[0].failed]
+                buffer.clear()
+                if not rows:
+                    return
+                start = time.perf_counter()
+                try:
+                    vectors = fp.embeddings.embed_documents([text for _, _, text in rows])
+                except Exception as e:
+                    for task in {row[0] for row in rows}:
+                        fail(task, e)
+                    return
+                stats['embed'].record(1, len(rows), time.perf_counter() - start)
+                report('embedded', len(rows))
+                embedded_queue.put([(task, chunk_id, text, vector) for (task, chunk_id, text), vector in zip(rows, vectors)])
+
+            def windows(task: _FileTask, chunks: Iterable[str]) -> Iterator[List[str]]:
+                """按 write_batch_size 分批消费文本块；流式文件的读取耗时计入解析阶段"""
+                iterator = iter(chunks)
+                while True:
+                    start = time.perf_counter()
+                    window = list(islice(iterator, self.write_batch_size))
+                    if task.streamed:
+                        stats['parse'].record(0, len(window), time.perf_counter() - start)
+                        report('parsed', len(window))
+                    if not window:
+                        return
+                    yield window
+
+            while True:
+                item = parsed_queue.get()
+                if item is _DONE:
+                    flush()
+                    embedded_queue.put(_DONE)
+                    return
+                task, chunks = item
+                occurrences: Dict[bytes, int] = {}
+                try:
+                    task.previous_ids = fp.manifest.get_previous_chunk_ids(task.source, task.file_hash)
+                    for window in windows(task, chunks):
+                        # 已写入的文本块（ID 相同）不再计算嵌入
+                        window_ids, pending = fp._new_chunks(task.source, window, occurrences)
+                        task.chunk_ids.extend(window_ids)
+                        report('embedded', len(window) - len(pending))
+                        report('written', len(window) - len(pending))
+                        with lock:
+                            task.remaining += len(pending)
+                        for chunk_id, text in pending:
+                            buffer.append((task, chunk_id, text))
+                            if len(buffer) >= self.embed_batch_size:
+                                flush()
+                except Exception as e:
+                    fail(task, e)
+                    continue
+                if task.streamed and not task.chunk_ids:
+                    self.logger.warning(f"文本分割后没有内容: {task.source}")
+                with lock:
+                    task.parsed_all = True
+                    ready = task.remaining == 0 and not task.failed
+                if ready:
+                    finalize(task)
+
+        def write_stage():
+            buffer: List[Tuple[_FileTask, str, str, List[float]]] = []
+
+            def flush():
+                rows = [row for row in buffer if not row[0].failed]
+                buffer.clear()
+                if not rows:
+                    return
+                start = time.perf_counter()
+                try:
+                    fp.vector_searcher.add_texts(
+                        collection_name=fp.collection_name,
+                        texts=[text for _, _, text, _ in rows],
+                        metadatas=[{"source": task.source} for task, _, _, _ in rows],
+                        ids=[chunk_id for _, chunk_id, _, _ in rows],
+                        embeddings=[vector for _, _, _, vector in rows],
+                        upsert=True
+                    )
+                except Exception as e:
+                    for task in {row[0] for row in rows}:
+                        fail(task, e)
+                    return
+                stats['write'].record(1, len(rows), time.perf_counter() - start)
+                report('written', len(rows))
+                ready = []
+                with lock:
+                    for task, _, _, _ in rows:
+                        task.remaining -= 1
+                        if task.remaining == 0 and task.parsed_all and not task.failed:
+                            ready.append(task)
+                for task in ready:
+                    finalize(task)
+
+            while True:
+                item = embedded_queue.get()
+                if item is _DONE:
+                    flush()
+                    return
+                buffer.extend(item)
+                if len(buffer) >= self.write_batch_size:
+                    flush()
+
+        embedder = threading.Thread(target=embed_stage, name="ingestion-embed", daemon=True)
+        writer = threading.Thread(target=write_stage, name="ingestion-write", daemon=True)
+        embedder.start()
+        writer.start()
+
+        try:
+            # 解析阶段：最多 parse_workers * 2 个文件同时在子进程中解析
+            # 使用 spawn 避免 fork 时复制父进程中嵌入线程持有的锁
+            with ProcessPoolExecutor(max_workers=self.parse_workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = {}
+                paths = iter(file_paths)
+                exhausted = False
+                while futures or not exhausted:
+                    while not exhausted and len(futures) < self.parse_workers * 2:
+                        file_path = next(paths, None)
+                        if file_path is None:
+                            exhausted = True
+                            break
+                        task = self._claim(str(file_path))
+                        if task is None:
+                            continue
+                        try:
+                            size = os.path.getsize(file_path)
+                        except Exception as e:
+                            fail(task, e)
+                            continue
+                        if size > self.stream_threshold:
+                            # 大文件交给嵌入阶段流式读取
+                            task.streamed = True
+                            stats['parse'].record(1, 0, 0.0)
+                            parsed_queue.put((task, iter_chunks(str(file_path), fp.chunk_size, fp.chunk_overlap)))
+                            continue
+                        future = executor.submit(
+                            _parse_worker, str(file_path), fp.chunk_size, fp.chunk_overlap
+                        )
+                        futures[future] = task
+                    if not futures:
+                        continue
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = futures.pop(future)
+                        try:
+                            chunks, seconds = future.result()
+                        except Exception as e:
+                            fail(task, e)
+                            continue
+                        stats['parse'].record(1, len(chunks), seconds)
+                        report('parsed', len(chunks))
+                        if not chunks:
+                            self.logger.warning(f"文本分割后没有内容: {task.source}")
+                        # 队列已满时阻塞，形成背压
+                        parsed_queue.put((task, chunks))
+        finally:
+            parsed_queue.put(_DONE)
+            embedder.join()
+            writer.join()
+
+        wall_seconds = time.perf_counter() - started
+        summary = {name: stage.to_dict(wall_seconds) for name, stage in stats.items()}
+        summary['wall_seconds'] = round(wall_seconds, 3)
+        self.logger.info(
+            "流水线统计: " + ", ".join(
+                f"{name} {summary[name]['chunks_per_second']} 块/秒 (利用率 {summary[name]['utilization']:.0%})"
+                for name in stats
+            )
+        )
+        return len(succeeded), summary
+
+    def _claim(self, file_path: str) -> Optional[_FileTask]:
+        """计算文件哈希并登记为处理中，已处理或正在处理的文件返回 None"""
+        fp = self.file_processor
+        try:
+            file_hash = fp._get_cached_file_hash(file_path)
+        except Exception as e:
+            self.logger.error(f"处理文件失败 {file_path}: {str(e)}")
+            return None
+        if not fp.claim(file_hash, file_path):
+            self.logger.info(f"文件已处理，跳过: {file_path}")
+            return None
+        try:
+            fp.manifest.start(file_hash, file_path, parser_name(file_path))
+        except Exception as e:
+            fp.release(file_hash, file_path)
+            self.logger.error(f"处理文件失败 {file_path}: {str(e)}")
+            return None
+        return _FileTask(file_hash, file_path)
@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+from tools.file_processor import FileProcessor
+
+
+class IngestionJob:
+    """一次后台入库任务及其进度"""
+
+    def __init__(self, job_id: str, filename: str):
+        self.job_id = job_id
+        self.filename = filename
+        self.status = 'queued'
+        self.chunks_parsed = 0
+        self.chunks_embedded = 0
+        self.chunks_written = 0
+        self.skipped = False
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, count: int):
+        """进度回调：累加某个阶段完成的文本块数量"""
+        with self._lock:
+            setattr(self, f"chunks_{stage}", getattr(self, f"chunks_{stage}") + count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的状态字典"""
+        with self._lock:
+            return {
+                'job_id': self.job_id,
+                'filename': self.filename,
+                'status': self.status,
+                'chunks_parsed': self.chunks_parsed,
+                'chunks_embedded': self.chunks_embedded,
+                'chunks_written': self.chunks_written,
+                'skipped': self.skipped,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+
+
+class IngestionQueue:
+    def __init__(self,
+                 file_processor: FileProcessor,
+                 max_workers: int = 2,
+                 max_retained_jobs: int = 1000):
+        """
+        初始化后台入库任务队列
+
+        Args:
+            file_processor: 文件处理器
+            max_workers: 同时运行的入库任务数上限
+            max_retained_jobs: 保留状态的历史任务数量，超出时淘汰最早的已结束任务
+        """
+        self.file_processor = file_processor
+        self.max_retained_jobs = max_retained_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self,
+               source: Union[str, BinaryIO],
+               filename: str,
+               columns: Optional[Tuple[str, str]] = None,
+               replace: bool = False) -> str:
+        """
+        提交单个文件的入库任务，立即返回任务ID
+
+        Args:
+            source: 文件路径或文件对象；文件对象在任务结束后关闭
+            filename: 原始文件名，用于判断文件类型并记录来源
+            columns: 按平行语料导入时的 (原文列, 译文列)
+            replace: 是否替换同名文件之前上传的版本，默认作为独立文档入库
+
+        Returns:
+            str: 任务ID
+        """
+        job = IngestionJob(uuid.uuid4().hex, filename)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim()
+        self._executor.submit(self._run, job, source, columns, replace)
+        self.logger.info(f"已提交入库任务 {job.job_id}: {filename}")
+        return job.job_id
+
+    def _trim(self):
+        """淘汰最早的已结束任务（需在持有锁时调用）"""
+        while len(self._jobs) > self.max_retained_jobs:
+            for job_id, job in self._jobs.items():
+                if job.status in ('done', 'failed'):
+                    del self._jobs[job_id]
+                    break
+            else:
+                break
+
+    def _run(self,
+             job: IngestionJob,
+             source: Union[str, BinaryIO],
+             columns: Optional[Tuple[str, str]] = None,
+             replace: bool = False):
+        """在工作线程中执行入库任务"""
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            processed = self.file_processor.process_file(
+                source, filename=job.filename, progress=job.update, columns=columns, replace=replace
+            )
+            job.skipped = not processed
+            job.status = 'done'
+        except Exception as e:
+            self.logger.error(f"入库任务失败 {job.job_id}: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            if hasattr(source, 'close'):
+                source.close()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态，不存在时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else None
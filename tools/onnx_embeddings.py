@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows 上不加文件锁，导出结果仍整体替换
+    fcntl = None
+
+# 导出后与 PyTorch 输出对比的样例文本（覆盖中文、日文、英文和不同长度）
+PARITY_TEXTS = [
+    "翻译记忆库中的句子",
+    "本製品の取扱説明書をよくお読みください。",
+    "The quick brown fox jumps over the lazy dog.",
+    "在使用本产品之前，请仔细阅读说明书，并按照说明书中的步骤进行安装和调试，以免造成不必要的损失。",
+    "OK"
+]
+
+
+def _make_encoder(model):
+    """把 ModelScope 句向量模型包装成以张量为输入的模块，便于导出 ONNX"""
+    import torch
+
+    class _SentenceEncoder(torch.nn.Module):
+        def __init__(self, sentence_model):
+            super().__init__()
+            self.sentence_model = sentence_model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            query = {
+                'input_ids': input_ids,
+                'attention_mask': attention_mask,
+                'token_type_ids': token_type_ids
+            }
+            return self.sentence_model(query=query)['query_embeddings']
+
+    return _SentenceEncoder(model).eval()
+
+
+class OnnxEmbeddings(Embeddings):
+    def __init__(self,
+                 model_id: str,
+                 cache_dir: str = "./document_db/onnx",
+                 quantize: bool = True,
+                 intra_op_threads: Optional[int] = None,
+                 batch_size: int = 32,
+                 max_batch_tokens: int = 8192,
+                 max_length: Optional[int] = None,
+                 parity_tolerance: float = 0.01):
+        """
+        初始化 ONNX Runtime 句向量后端
+
+        首次加载时把 ModelScope 的 PyTorch 模型导出为 ONNX，按需做动态 int8 量化，
+        并与 PyTorch 输出对比；对比通过后写入 export.json，之后直接加载导出结果，不再导入 PyTorch。
+        导出在文件锁内写入临时目录，完成后整体替换导出目录，多个进程同时启动时只导出一次。
+        推理时按 token 数排序分桶，同一批的文本长度相近，减少填充带来的无效计算。
+
+        Args:
+            model_id: ModelScope 模型ID
+            cache_dir: 导出模型的存放目录
+            quantize: 是否使用动态 int8 量化模型
+            intra_op_threads: 单个算子使用的线程数，None 表示由 ONNX Runtime 按物理核数决定
+            batch_size: 每批最多的文本数
+            max_batch_tokens: 每批最多的 token 数（文本数 × 批内最长长度），长文本自动使用更小的批
+            max_length: 最大 token 数，None 表示沿用 ModelScope 预处理器的设置
+            parity_tolerance: 与 PyTorch 输出的余弦距离上限，超出时导出视为失败
+        """
+        self.model_id = model_id
+        self.cache_dir = cache_dir
+        self.export_dir = os.path.join(cache_dir, model_id.replace('/', '__'))
+        self.quantize = quantize
+        self.intra_op_threads = intra_op_threads
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+        self.parity_tolerance = parity_tolerance
+
+        self._session = None
+        self._input_names: List[str] = []
+        self._tokenizer = None
+        self._pad_token_id = 0
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.export_dir, "model.int8.onnx" if self.quantize else "model.onnx")
+
+    @property
+    def info_path(self) -> str:
+        return os.path.join(self.export_dir, "export.json")
+
+    def _read_info(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.info_path):
+            return None
+        with open(self.info_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _exported(self, info: Optional[Dict[str, Any]]) -> bool:
+        """导出结果是否存在且当前使用的模型已通过对比"""
+        return info is not None and bool(info.get('parity', {}).get(os.path.basename(self.model_path)))
+
+    @contextmanager
+    def _export_lock(self) -> Iterator[None]:
+        """导出时加文件锁，同一模型同一时间只有一个进程导出"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.export_dir}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        """加载导出的模型，未导出或导出结果未通过对比时先导出（导出后会话已打开）"""
+        info = self._read_info()
+        if not self._exported(info):
+            with self._export_lock():
+                # 等待锁期间其他进程可能已完成导出
+                info = self._read_info()
+                if not self._exported(info):
+                    self._export()
+                    return
+        self._open(info)
+
+    def _open(self, info: Dict[str, Any], directory: Optional[str] = None):
+        """创建 ONNX Runtime 会话和分词器，directory 默认为导出目录"""
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+
+        directory = directory or self.export_dir
+        start = time.perf_counter()
+        self._session = ort.InferenceSession(
+            os.path.join(directory, os.path.basename(self.model_path)), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [item.name for item in self._session.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(directory)
+        self._pad_token_id = self._tokenizer.pad_token_id or 0
+        self.max_length = self.max_length or info['max_length']
+        self.logger.info(
+            f"已加载 ONNX 嵌入模型 {os.path.basename(self.model_path)}，"
+            f"线程数 {self.intra_op_threads or '自动'}，耗时 {time.perf_counter() - start:.2f}s"
+        )
+
+    def export(self):
+        """
+        导出 ONNX 模型（及 int8 量化模型），与 PyTorch 输出对比通过后写入 export.json
+
+        需要 modelscope、torch、transformers、onnx 和 onnxruntime；任一步骤失败都会抛出异常，由调用方回退到 PyTorch。
+        """
+        with self._export_lock():
+            self._export()
+
+    def _export(self):
+        """在临时目录中完成导出和对比，再整体替换导出目录（需持有导出锁）"""
+        build_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(self.export_dir)}.", suffix=".tmp", dir=self.cache_dir)
+        try:
+            self._build(build_dir)
+            # 其他进程只会看到旧的导出目录或完整的新导出目录
+            shutil.rmtree(self.export_dir, ignore_errors=True)
+            os.replace(build_dir, self.export_dir)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    def _build(self, build_dir: str):
+        """导出到 build_dir 并与 PyTorch 输出对比，通过后写入 export.json，会话保持打开"""
+        import torch
+        from modelscope.pipelines import pipeline
+        from modelscope.utils.constant import Tasks
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from transformers import AutoTokenizer
+
+        start = time.perf_counter()
+        # 与 ModelScopeEmbeddings 相同的推理管线，作为对比基准
+        torch_pipeline = pipeline(Tasks.sentence_embedding, model=self.model_id)
+        # 分词器随导出结果保存，之后加载时不再需要 ModelScope
+        tokenizer = AutoTokenizer.from_pretrained(torch_pipeline.model.model_dir)
+        tokenizer.save_pretrained(build_dir)
+        # BERT 的位置编码最多 512 个 token
+        max_length = min(
+            self.max_length or getattr(torch_pipeline.preprocessor, 'max_length', None) or tokenizer.model_max_length,
+            512
+        )
+
+        fp32_path = os.path.join(build_dir, "model.onnx")
+        sample = tokenizer(PARITY_TEXTS[:2], padding=True, return_tensors='pt')
+        token_type_ids = sample.get('token_type_ids', torch.zeros_like(sample['input_ids']))
+        with torch.no_grad():
+            torch.onnx.export(
+                _make_encoder(torch_pipeline.model),
+                (sample['input_ids'], sample['attention_mask'], token_type_ids),
+                fp32_path,
+                input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+                output_names=['embeddings'],
+                dynamic_axes={
+                    'input_ids': {0: 'batch', 1: 'sequence'},
+                    'attention_mask': {0: 'batch', 1: 'sequence'},
+                    'token_type_ids': {0: 'batch', 1: 'sequence'},
+                    'embeddings': {0: 'batch'}
+                },
+                opset_version=14,
+                do_constant_folding=True
+            )
+        if self.quantize:
+            quantize_dynamic(
+                fp32_path, os.path.join(build_dir, os.path.basename(self.model_path)), weight_type=QuantType.QInt8
+            )
+
+        info = {'model_id': self.model_id, 'max_length': max_length, 'parity': {}}
+        # 会话和分词器已把模型读入内存，之后替换目录不影响使用
+        self._open(info, build_dir)
+        reference = torch_pipeline(input={"source_sentence": PARITY_TEXTS})["text_embedding"]
+        report = self.check_parity(reference)
+        self.logger.info(
+            f"ONNX 导出完成，耗时 {time.perf_counter() - start:.1f}s，"
+            f"与 PyTorch 的最大余弦距离 {report['max_cosine_distance']:.5f}"
+        )
+        if report['max_cosine_distance'] > self.parity_tolerance:
+            self._session = None
+            raise RuntimeError(
+                f"ONNX 输出与 PyTorch 不一致：最大余弦距离 {report['max_cosine_distance']:.5f} "
+                f"超过 {self.parity_tolerance}"
+            )
+        info['parity'][os.path.basename(self.model_path)] = report
+        with open(os.path.join(build_dir, "export.json"), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+
+    def check_parity(self, reference: Any, texts: Optional[List[str]] = None) -> Dict[str, float]:
+        """
+        与 PyTorch 输出对比
+
+        Args:
+            reference: PyTorch 管线对 texts 输出的句向量
+            texts: 对比用的文本，默认 PARITY_TEXTS
+
+        Returns:
+            Dict[str, float]: max_cosine_distance（最大余弦距离）和 max_abs_diff（最大逐元素误差）
+        """
+        expected = np.asarray(reference, dtype=np.float32)
+        actual = np.asarray(self.embed_documents(texts or PARITY_TEXTS), dtype=np.float32)
+        cosine = (expected * actual).sum(axis=1) / np.maximum(
+            np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1), 1e-12
+        )
+        return {
+            'max_cosine_distance': float(1.0 - cosine.min()),
+            'max_abs_diff': float(np.abs(expected - actual).max())
+        }
+
+    def _buckets(self, lengths: List[int]) -> List[List[int]]:
+        """按长度排序后分批，每批不超过 batch_size 条和 max_batch_tokens 个 token"""
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        for index in order:
+            # 排序后批内最长的就是当前文本
+            if batch and (len(batch) >= self.batch_size or (len(batch) + 1) * lengths[index] > self.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(index)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """计算文本列表的嵌入向量，输出顺序与输入一致"""
+        if not texts:
+            return []
+        if self._session is None:
+            self.load()
+        # 与 ModelScopeEmbeddings 一致，换行替换为空格
+        texts = [text.replace("\n", " ") for text in texts]
+        encoded = self._tokenizer(texts, truncation=True, max_length=self.max_length)
+        input_ids = encoded['input_ids']
+        token_type_ids = encoded.get('token_type_ids')
+
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for batch in self._buckets([len(ids) for ids in input_ids]):
+            length = max(len(input_ids[i]) for i in batch)
+            feeds = {
+                'input_ids': np.full((len(batch), length), self._pad_token_id, dtype=np.int64),
+                'attention_mask': np.zeros((len(batch), length), dtype=np.int64),
+                'token_type_ids': np.zeros((len(batch), length), dtype=np.int64)
+            }
+            for row, index in enumerate(batch):
+                size = len(input_ids[index])
+                feeds['input_ids'][row, :size] = input_ids[index]
+                feeds['attention_mask'][row, :size] = 1
+                if token_type_ids is not None:
+                    feeds['token_type_ids'][row, :size] = token_type_ids[index]
+            outputs = self._session.run(None, {name: feeds[name] for name in self._input_names})[0]
+            for index, vector in zip(batch, outputs):
+                vectors[index] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """计算单条查询文本的嵌入向量"""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：去除首尾空白并合并连续空白"""
+    return " ".join(str(text).split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_size: int = 4096, ttl: Optional[float] = None):
+        """
+        初始化查询向量LRU缓存
+
+        Args:
+            max_size: 最多缓存的查询向量数量
+            ttl: 缓存有效期（秒），None 表示永不过期
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_id: str, text: str) -> Tuple[str, str]:
+        """生成缓存键：(模型ID, 规范化文本)"""
+        return (model_id, normalize_query(text))
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[float]]:
+        """读取缓存，命中时将条目移到最近使用位置"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, str], vector: List[float]):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存与计数"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
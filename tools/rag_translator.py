@@ -1,11 +1,52 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass, replace
 import os
+import re
+from collections import OrderedDict
 from openai import OpenAI
 from tools.vector_searcher import VectorSearcher
+from tools.translation_cache import TranslationCache
+from tools.reference_packer import ReferencePacker
+from tools.glossary import Glossary, GlossaryEntry
 import logging
 import json
+import threading
+import time
+import unicodedata
+
+@dataclass(frozen=True)
+class TranslationOptions:
+    """单次翻译请求的不可变参数"""
+    source_lang: str = "英语"
+    target_lang: str = "中文"
+    model: str = "deepseek-r1"
+    temperature: float = 0.7
+    collection_names: Optional[Tuple[str, ...]] = None
+    top_k: int = 3
+    similarity_threshold: float = 0.5
+    # 每个集合的检索时限（秒），超时的集合被跳过，None 表示不限
+    search_timeout: Optional[float] = None
+
+
+# 提示模板中按请求填充的占位符
+_PROMPT_FIELDS = re.compile(r"(\{text\}|\{similar_translations\}|\{glossary\})")
+
+# 预编译提示模板的缓存上限（语言来自请求参数，不能无限增长）
+_MAX_COMPILED_PROMPTS = 256
+
+
+def _reuse_key(text: str) -> str:
+    """直接复用的比较键：全角半角统一、忽略大小写、空白和标点，数字和文字必须完全一致"""
+    return "".join(
+        char for char in unicodedata.normalize('NFKC', text).casefold()
+        if not char.isspace() and not unicodedata.category(char).startswith('P')
+    )
+
 
 class RAGTranslator:
+    # 提示词版本，修改系统提示模板时需要同步更新以使翻译缓存失效
+    PROMPT_VERSION = "v2"
+    
     def __init__(
         self,
         api_key: str,
@@ -14,7 +55,16 @@ class RAGTranslator:
         model: str = "deepseek-r1",
         temperature: float = 0.7,
         source_lang: str = "英语",
-        target_lang: str = "中文"
+        target_lang: str = "中文",
+        vector_searcher: Optional[VectorSearcher] = None,
+        translation_cache: Optional[TranslationCache] = None,
+        reuse_collection: Optional[str] = None,
+        reuse_threshold: float = 0.97,
+        edit_threshold: Optional[float] = None,
+        edit_model: Optional[str] = None,
+        reference_packer: Optional[ReferencePacker] = None,
+        glossary: Optional[Glossary] = None,
+        search_timeout: Optional[float] = None
     ):
         """
         初始化RAG翻译器
@@ -23,10 +73,19 @@ class RAGTranslator:
             api_key: API密钥
             persist_dir: 向量存储目录
             base_url: API基础URL
-            model: 模型名称
-            temperature: 温度参数
-            source_lang: 源语言
-            target_lang: 目标语言
+            model: 默认模型名称
+            temperature: 默认温度参数
+            source_lang: 默认源语言
+            target_lang: 默认目标语言
+            vector_searcher: 共享的向量查询器，默认新建一个（嵌入模型在进程内共享）
+            translation_cache: 翻译记忆缓存，命中时直接返回结果而不调用模型
+            reuse_collection: 近似复用层使用的集合名称，None 表示关闭近似复用
+            reuse_threshold: 原文相似度不低于此值、且与历史原文只有空白和标点差异时直接复用历史译文
+            edit_threshold: 原文相似度不低于此值时使用仅编辑提示改写历史译文，None 表示关闭
+            edit_model: 仅编辑提示使用的模型，默认与 model 相同
+            reference_packer: 参考资料打包器，在 token 预算内去重、挑选并裁剪参考资料，None 表示原样使用
+            glossary: 术语表，原文中出现的术语及其审定译法会注入提示
+            search_timeout: 默认的每个集合检索时限（秒），超时的集合被跳过，None 表示不限
         """
         # 初始化日志
         logging.basicConfig(level=logging.INFO)
@@ -42,12 +101,49 @@ class RAGTranslator:
         self.temperature = temperature
         
         # 初始化向量搜索器
-        self.vector_searcher = VectorSearcher(persist_dir=persist_dir)
+        self.vector_searcher = vector_searcher or VectorSearcher(persist_dir=persist_dir)
+        
+        # 翻译记忆缓存（可选）
+        self.translation_cache = translation_cache
+        
+        # 近似复用层（可选）
+        self.reuse_collection = reuse_collection
+        self.reuse_threshold = reuse_threshold
+        self.edit_threshold = edit_threshold
+        self.edit_model = edit_model or model
+        self._reuse_lock = threading.Lock()
+        self._reuse_stats = {
+            'direct_hits': 0,
+            'edit_hits': 0,
+            'misses': 0,
+            'saved_seconds': 0.0
+        }
+        # 完整翻译的平均耗时（指数滑动平均），用于估算复用节省的时间
+        self._full_latency: Optional[float] = None
+        
+        # 参考资料打包器（可选）
+        self.reference_packer = reference_packer
+        
+        # 术语表（可选）
+        self.glossary = glossary
         
         # 设置语言
         self.source_lang = source_lang
         self.target_lang = target_lang
         
+        # 默认请求参数，每次请求基于它生成不可变的 TranslationOptions，不修改实例状态
+        self.default_options = TranslationOptions(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            model=model,
+            temperature=temperature,
+            search_timeout=search_timeout
+        )
+        
+        # 按语言对预编译的提示模板（LRU，最多 _MAX_COMPILED_PROMPTS 个）
+        self._compiled_prompts: "OrderedDict[Tuple[str, str, str], List[str]]" = OrderedDict()
+        self._prompts_lock = threading.Lock()
+        
         # 修改系统提示模板，确保格式更清晰
         self.system_prompt = """你是一个专业的翻译专家。请将{source_lang}翻译成{target_lang}。
 
@@ -64,15 +160,22 @@ class RAGTranslator:
 
 参考资料：
 {similar_translations}
-
+{glossary}
 重要提示：
 - 必须按照上述格式输出
 - 翻译结果要准确、地道
 - 翻译解析要专业、详细
-- 可参考资料，但不要完全依赖"""
+- 可参考资料，但不要完全依赖
+- 术语表中的术语必须使用给定译法"""
+        
+        # 近似复用层的仅编辑提示模板
+        self.edit_prompt = """你是一个专业的翻译编辑。下面给出一段{source_lang}原文及其已审定的{target_lang}译文，以及一段与之高度相似的新原文。
+
+请只对译文做最小改动，使其准确对应新原文（例如数字、标点或个别词语的差异），不要重新翻译。
+只输出修改后的{target_lang}译文，不要添加任何解释。"""
     
     def _format_similar_translations(self, similar_results: List[dict]) -> str:
-        """格式化相似翻译结果"""
+        """格式化相似翻译结果，平行语料的语料对按 原文/译文 紧凑输出"""
         if not similar_results:
             return "没有找到相似的翻译参考。"
         
@@ -80,56 +183,384 @@ class RAGTranslator:
         for i, result in enumerate(similar_results, 1):
             content = result['content']
             similarity = result['similarity']
-            formatted.append(f"参考 {i} (相似度: {similarity:.2f}):\n{content}\n")
+            translation = result.get('metadata', {}).get('translation')
+            if translation:
+                formatted.append(f"参考 {i} (相似度: {similarity:.2f}):\n原文: {content}\n译文: {translation}\n")
+            else:
+                formatted.append(f"参考 {i} (相似度: {similarity:.2f}):\n{content}\n")
         
         return "\n".join(formatted)
     
+    def options(self, **overrides) -> TranslationOptions:
+        """
+        基于默认参数生成单次请求的不可变参数
+        
+        Args:
+            **overrides: 要覆盖的字段（source_lang、target_lang、model、temperature、
+                collection_names、top_k、similarity_threshold、search_timeout），值为 None 的字段保持默认
+                
+        Returns:
+            TranslationOptions: 本次请求的参数
+        """
+        overrides = {key: value for key, value in overrides.items() if value is not None}
+        if isinstance(overrides.get('collection_names'), (list, str)):
+            names = overrides['collection_names']
+            overrides['collection_names'] = (names,) if isinstance(names, str) else tuple(names)
+        return replace(self.default_options, **overrides)
+    
+    def _compile_prompt(self, name: str, source_lang: str, target_lang: str) -> List[str]:
+        """按语言对预编译提示模板：先填充语言，再拆分出按请求填充的占位符"""
+        key = (name, source_lang, target_lang)
+        with self._prompts_lock:
+            compiled = self._compiled_prompts.get(key)
+            if compiled is not None:
+                self._compiled_prompts.move_to_end(key)
+                return compiled
+        template = getattr(self, name)
+        template = template.replace("{source_lang}", source_lang).replace("{target_lang}", target_lang)
+        compiled = _PROMPT_FIELDS.split(template)
+        with self._prompts_lock:
+            self._compiled_prompts[key] = compiled
+            while len(self._compiled_prompts) > _MAX_COMPILED_PROMPTS:
+                self._compiled_prompts.popitem(last=False)
+        return compiled
+    
+    def _render_prompt(self, name: str, options: TranslationOptions, **fields: str) -> str:
+        """用预编译模板渲染提示"""
+        parts = self._compile_prompt(name, options.source_lang, options.target_lang)
+        return "".join(
+            fields[part[1:-1]] if _PROMPT_FIELDS.fullmatch(part) else part
+            for part in parts
+        )
+    
+    def _resolve_options(self,
+                         options: Optional[TranslationOptions],
+                         collection_names: Optional[List[str]] = None,
+                         top_k: Optional[int] = None,
+                         similarity_threshold: Optional[float] = None) -> TranslationOptions:
+        """未显式传入参数对象时，用默认参数和检索参数生成"""
+        if options is not None:
+            return options
+        return self.options(
+            collection_names=collection_names,
+            top_k=top_k,
+            similarity_threshold=similarity_threshold
+        )
+    
+    def _retrieve(self, text: str, options: TranslationOptions) -> List[dict]:
+        """按请求参数检索相似文本：并发搜索所有集合并合并为全局 top_k；启用打包器时多取一倍候选供其挑选"""
+        return self.vector_searcher.search_merged(
+            query=text,
+            collection_names=list(options.collection_names) if options.collection_names else None,
+            top_k=options.top_k * 2 if self.reference_packer is not None else options.top_k,
+            threshold=options.similarity_threshold,
+            timeout=options.search_timeout
+        )
+    
+    def _build_messages(self,
+                        text: str,
+                        similar_results: List[dict],
+                        options: TranslationOptions) -> List[Dict[str, str]]:
+        """根据参考资料构造对话消息"""
+        if self.reference_packer is not None and similar_results:
+            similar_results, report = self.reference_packer.pack(text, similar_results, max_references=options.top_k)
+            self.logger.info(
+                f"参考资料打包: {report['tokens_before']} -> {report['tokens_after']} tokens，"
+                f"节省 {report['tokens_saved']} tokens，丢弃 {report['dropped']} 条"
+            )
+        formatted_prompt = self._render_prompt(
+            'system_prompt',
+            options,
+            text=text,
+            similar_translations=self._format_similar_translations(similar_results),
+            glossary=Glossary.format_entries(self._match_glossary(text, options))
+        )
+        self.logger.debug(f"系统提示: {formatted_prompt}")
+        return [
+            {"role": "system", "content": formatted_prompt},
+            {"role": "user", "content": text}
+        ]
+    
+    def _match_glossary(self, text: str, options: TranslationOptions) -> List[GlossaryEntry]:
+        """扫描原文中出现的术语，未配置术语表时返回空列表"""
+        if self.glossary is None:
+            return []
+        return self.glossary.match(text, options.source_lang, options.target_lang)
+    
+    def _cache_key(self, text: str, options: TranslationOptions) -> str:
+        """生成语言对、模型、提示词版本和命中术语下的缓存键；术语译法修改后相关缓存自动失效"""
+        prompt_version = self.PROMPT_VERSION
+        terms = self._match_glossary(text, options)
+        if terms:
+            prompt_version = f"{prompt_version}:{Glossary.digest(terms)}"
+        return TranslationCache.make_key(
+            text=text,
+            source_lang=options.source_lang,
+            target_lang=options.target_lang,
+            model=options.model,
+            temperature=options.temperature,
+            prompt_version=prompt_version
+        )
+    
+    def get_cached_translation(self,
+                               text: str,
+                               options: Optional[TranslationOptions] = None) -> Optional[Dict[str, Any]]:
+        """查询翻译记忆缓存，未启用缓存或未命中时返回 None"""
+        if self.translation_cache is None:
+            return None
+        return self.translation_cache.get(self._cache_key(text, options or self.default_options))
+    
+    def cache_translation(self,
+                          text: str,
+                          result: Dict[str, Any],
+                          options: Optional[TranslationOptions] = None):
+        """将翻译结果写入翻译记忆缓存，翻译结果为空时不写入"""
+        if self.translation_cache is None or not result.get('translation'):
+            return
+        self.translation_cache.put(self._cache_key(text, options or self.default_options), result)
+    
+    def _find_reusable(self, text: str, options: TranslationOptions) -> Optional[Dict[str, Any]]:
+        """在近似复用集合中查找当前语言对下最相似的历史翻译"""
+        thresholds = [t for t in (self.reuse_threshold, self.edit_threshold) if t is not None]
+        results = self.vector_searcher.search(
+            query=text,
+            collection_names=[self.reuse_collection],
+            top_k=1,
+            threshold=min(thresholds),
+            timeout=options.search_timeout,
+            where={"$and": [
+                {"source_lang": options.source_lang},
+                {"target_lang": options.target_lang}
+            ]}
+        ).get(self.reuse_collection)
+        if not results:
+            return None
+        match = results[0]
+        return {
+            'similarity': match['similarity'],
+            'source': match['content'],
+            'metadata': match['metadata']
+        }
+    
+    def _edit_translation(self,
+                          text: str,
+                          match: Dict[str, Any],
+                          options: TranslationOptions) -> Optional[Dict[str, Any]]:
+        """用仅编辑提示把相似原文的历史译文改写为新原文的译文，模型没有返回译文时返回 None"""
+        completion = self.client.chat.completions.create(
+            model=self.edit_model,
+            temperature=0.0,
+            messages=[
+                {"role": "system", "content": self._render_prompt('edit_prompt', options)},
+                {"role": "user", "content": (
+                    f"参考原文：{match['source']}\n"
+                    f"参考译文：{match['metadata']['translation']}\n"
+                    f"新原文：{text}"
+                )}
+            ]
+        )
+        message = completion.choices[0].message
+        # deepseek-r1 只返回推理内容或空回复时 content 为 None
+        if not message.content or not message.content.strip():
+            self.logger.warning("仅编辑提示没有返回译文，改用完整翻译")
+            return None
+        return {
+            'translation': message.content.strip(),
+            'translation_reasoning': f"基于相似度 {match['similarity']:.2f} 的历史译文编辑得到",
+            'thinking_process': getattr(message, 'reasoning_content', None)
+        }
+    
+    def _record_reuse(self, tier: str, elapsed: float):
+        """记录复用命中并估算节省的时间"""
+        with self._reuse_lock:
+            self._reuse_stats[tier] += 1
+            if self._full_latency is not None:
+                self._reuse_stats['saved_seconds'] += max(self._full_latency - elapsed, 0.0)
+    
+    def reuse_translation(self,
+                          text: str,
+                          options: Optional[TranslationOptions] = None) -> Optional[Dict[str, Any]]:
+        """
+        近似复用层：相似度足够高且原文只有空白、标点差异时直接复用历史译文，
+        其余（如数字不同）相似度足够高时用仅编辑提示改写
+        
+        Args:
+            text: 要翻译的文本
+            options: 本次请求的参数，默认使用 default_options
+            
+        Returns:
+            Optional[Dict[str, Any]]: 复用得到的翻译结果，未命中时返回 None
+        """
+        if self.reuse_collection is None:
+            return None
+        options = options or self.default_options
+        start = time.perf_counter()
+        try:
+            match = self._find_reusable(text, options)
+        except Exception as e:
+            self.logger.warning(f"近似复用查询失败: {str(e)}")
+            return None
+        
+        # 向量相似度无法区分只差一个数字的原文，直接复用前再核对规范化后的原文
+        if (match is not None and match['similarity'] >= self.reuse_threshold
+                and _reuse_key(text) == _reuse_key(match['source'])):
+            metadata = match['metadata']
+            result = {
+                'translation': metadata['translation'],
+                'translation_reasoning': metadata.get('translation_reasoning') or None,
+                'thinking_process': None
+            }
+            tier = 'direct_hits'
+        elif (match is not None and self.edit_threshold is not None
+              and match['similarity'] >= self.edit_threshold):
+            try:
+                result = self._edit_translation(text, match, options)
+            except Exception as e:
+                self.logger.warning(f"仅编辑提示调用失败，改用完整翻译: {str(e)}")
+                result = None
+            tier = 'edit_hits'
+        else:
+            result = None
+        
+        if result is None:
+            with self._reuse_lock:
+                self._reuse_stats['misses'] += 1
+            return None
+        
+        result['reuse'] = {'tier': tier, 'similarity': match['similarity']}
+        elapsed = time.perf_counter() - start
+        self._record_reuse(tier, elapsed)
+        self.logger.info(f"近似复用命中 ({tier}), 相似度 {match['similarity']:.3f}, 耗时 {elapsed:.2f}s")
+        return result
+    
+    def get_reuse_stats(self) -> Dict[str, float]:
+        """获取近似复用层的命中率和节省时间统计"""
+        with self._reuse_lock:
+            stats = dict(self._reuse_stats)
+            stats['avg_full_latency'] = self._full_latency
+        total = stats['direct_hits'] + stats['edit_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['direct_hits'] + stats['edit_hits']) / total if total else 0.0
+        return stats
+    
+    def get_packing_stats(self) -> Dict[str, float]:
+        """获取参考资料打包节省的 token 统计，未启用打包器时返回空字典"""
+        return self.reference_packer.stats() if self.reference_packer is not None else {}
+    
+    def lookup_translation(self,
+                           text: str,
+                           options: Optional[TranslationOptions] = None) -> Optional[Dict[str, Any]]:
+        """依次查询翻译记忆缓存和近似复用层，均未命中时返回 None；含术语的原文不走近似复用，以免沿用旧译法"""
+        options = options or self.default_options
+        cached = self.get_cached_translation(text, options)
+        if cached is not None:
+            return cached
+        if self._match_glossary(text, options):
+            return None
+        reused = self.reuse_translation(text, options)
+        if reused is not None:
+            self.cache_translation(text, reused, options)
+        return reused
+    
+    def record_translation(self,
+                           text: str,
+                           result: Dict[str, Any],
+                           elapsed: Optional[float] = None,
+                           options: Optional[TranslationOptions] = None):
+        """
+        记录一次完整翻译：写入翻译记忆缓存和近似复用集合
+        
+        Args:
+            text: 原文
+            result: 翻译结果
+            elapsed: 完整翻译耗时（秒），用于估算复用节省的时间
+            options: 本次请求的参数，默认使用 default_options
+        """
+        options = options or self.default_options
+        self.cache_translation(text, result, options)
+        if elapsed is not None:
+            with self._reuse_lock:
+                self._full_latency = elapsed if self._full_latency is None else 0.9 * self._full_latency + 0.1 * elapsed
+        if self.reuse_collection is None or result.get('reuse') or not result.get('translation'):
+            return
+        try:
+            self.vector_searcher.add_texts(
+                collection_name=self.reuse_collection,
+                texts=[text],
+                metadatas=[{
+                    'source_lang': options.source_lang,
+                    'target_lang': options.target_lang,
+                    'model': options.model,
+                    'translation': result['translation'],
+                    'translation_reasoning': result.get('translation_reasoning') or ''
+                }],
+                # 同一语言对的相同原文只保留一条（最新）译文
+                ids=self.vector_searcher.make_chunk_ids(f"{options.source_lang}->{options.target_lang}", [text]),
+                collection_metadata={"hnsw:space": "cosine"},
+                upsert=True
+            )
+        except Exception as e:
+            self.logger.warning(f"写入近似复用集合失败: {str(e)}")
+    
+    @staticmethod
+    def _parse_translation(translation_content: str, thinking_process: Optional[str]) -> Dict[str, Any]:
+        """从模型回复中解析翻译结果和翻译解析"""
+        sections = translation_content.split('【')
+        result = {
+            'translation': '',
+            'translation_reasoning': None,  # 初始化为 None
+            'thinking_process': thinking_process  # 思考链内容
+        }
+        
+        # 解析翻译结果和翻译解析
+        for section in sections:
+            if '翻译结果】' in section:
+                result['translation'] = section.split('】', 1)[1].strip()
+            elif '翻译解析】' in section:
+                # 保存模型回复中的翻译解析
+                analysis = section.split('】', 1)[1].strip()
+                if analysis and analysis != thinking_process:  # 确保不是思考链内容
+                    result['translation_reasoning'] = analysis
+        
+        return result
+    
     def translate_with_explanation(
         self,
         text: str,
         collection_names: Optional[List[str]] = None,
         top_k: int = 3,
-        similarity_threshold: float = 0.5
+        similarity_threshold: float = 0.5,
+        similar_results: Optional[List[dict]] = None,
+        options: Optional[TranslationOptions] = None
     ) -> Dict[str, Any]:
-        """翻译文本并提供详细解析"""
+        """
+        翻译文本并提供详细解析
+        
+        Args:
+            text: 要翻译的文本
+            collection_names: 检索的集合名称（未传 options 时生效）
+            top_k: 参考数量（未传 options 时生效）
+            similarity_threshold: 相似度阈值（未传 options 时生效）
+            similar_results: 预先检索好的参考，不为 None 时跳过检索
+            options: 本次请求的不可变参数（语言对、模型、温度、检索设置）
+        """
         try:
-            # 获取相似文本
-            search_results = self.vector_searcher.search(
-                query=text,
-                collection_names=collection_names,
-                top_k=top_k,
-                threshold=similarity_threshold
-            )
+            options = self._resolve_options(options, collection_names, top_k, similarity_threshold)
             
-            # 整合所有集合的结果
-            all_similar_results = []
-            for collection_results in search_results.values():
-                all_similar_results.extend(collection_results)
+            # 命中翻译记忆或近似复用时直接返回，不调用推理模型
+            cached = self.lookup_translation(text, options)
+            if cached is not None:
+                return cached
+            start = time.perf_counter()
             
-            # 按相似度排序
-            all_similar_results.sort(key=lambda x: x['similarity'], reverse=True)
+            # 获取相似文本
+            if similar_results is None:
+                similar_results = self._retrieve(text, options)
 
-            # 格式化相似翻译
-            similar_translations = self._format_similar_translations(all_similar_results[:top_k])
-            # print("=======================================参考内容=========================================")
-            # print(similar_translations)
-            # print("=========================================================================================")
-            # 在使用时才进行格式化
-            formatted_prompt = self.system_prompt.format(
-                source_lang=self.source_lang,
-                target_lang=self.target_lang,
-                text=text,
-                similar_translations=similar_translations
-            )
-            
             # 创建聊天完成
             completion = self.client.chat.completions.create(
-                model=self.model,
-                temperature=self.temperature,
-                messages=[
-                    {"role": "system", "content": formatted_prompt},
-                    {"role": "user", "content": text}
-                ]
+                model=options.model,
+                temperature=options.temperature,
+                messages=self._build_messages(text, similar_results, options)
             )
             
             # 获取思考链内容
@@ -137,22 +568,8 @@ class RAGTranslator:
             translation_content = completion.choices[0].message.content
             
             # 解析翻译内容
-            sections = translation_content.split('【')
-            result = {
-                'translation': '',
-                'translation_reasoning': None,  # 初始化为 None
-                'thinking_process': thinking_process  # 思考链内容
-            }
-            
-            # 解析翻译结果和翻译解析
-            for section in sections:
-                if '翻译结果】' in section:
-                    result['translation'] = section.split('】', 1)[1].strip()
-                elif '翻译解析】' in section:
-                    # 保存模型回复中的翻译解析
-                    analysis = section.split('】', 1)[1].strip()
-                    if analysis and analysis != thinking_process:  # 确保不是思考链内容
-                        result['translation_reasoning'] = analysis
+            result = self._parse_translation(translation_content, thinking_process)
+            self.record_translation(text, result, elapsed=time.perf_counter() - start, options=options)
             
             return result
             
@@ -165,44 +582,21 @@ class RAGTranslator:
         text: str,
         collection_names: Optional[List[str]] = None,
         top_k: int = 3,
-        similarity_threshold: float = 0.5
+        similarity_threshold: float = 0.5,
+        options: Optional[TranslationOptions] = None
     ):
-        """流式翻译并提供实时输出"""
+        """流式翻译并提供实时输出，options 为本次请求的不可变参数"""
         try:
-            # 获取相似文本
-            search_results = self.vector_searcher.search(
-                query=text,
-                collection_names=collection_names,
-                top_k=top_k,
-                threshold=similarity_threshold
-            )
+            options = self._resolve_options(options, collection_names, top_k, similarity_threshold)
             
-            all_similar_results = []
-            for collection_results in search_results.values():
-                all_similar_results.extend(collection_results)
-            
-            all_similar_results.sort(key=lambda x: x['similarity'], reverse=True)
-            similar_translations = self._format_similar_translations(all_similar_results[:top_k])
-            
-            # 在使用时才进行格式化
-            formatted_prompt = self.system_prompt.format(
-                source_lang=self.source_lang,
-                target_lang=self.target_lang,
-                text=text,
-                similar_translations=similar_translations
-            )
-            
-            # 记录日志
-            self.logger.info(f"系统提示: {formatted_prompt}")
+            # 获取相似文本
+            similar_results = self._retrieve(text, options)
             
             # 创建流式聊天完成
             stream = self.client.chat.completions.create(
-                model=self.model,
-                temperature=self.temperature,
-                messages=[
-                    {"role": "system", "content": formatted_prompt},
-                    {"role": "user", "content": text}
-                ],
+                model=options.model,
+                temperature=options.temperature,
+                messages=self._build_messages(text, similar_results, options),
                 stream=True
             )
             
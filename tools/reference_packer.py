@@ -0,0 +1,176 @@
+import math
+import re
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# 中日韩字符，每个字符约计一个 token
+_CJK = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+# 拉丁字母、数字组成的词
+_WORD = re.compile(r'[A-Za-z0-9]+')
+# 句子：以句末标点或换行结尾
+_SENTENCE = re.compile(r'[^。！？!?.\n]+[。！？!?.\n]*|[。！？!?.\n]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符每字约 1 个，其余字符每 4 个约 1 个"""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _features(text: str) -> FrozenSet[str]:
+    """文本特征：中日韩字符二元组加小写单词，用于估算文本之间的重合度"""
+    chars = _CJK.findall(text)
+    bigrams = {a + b for a, b in zip(chars, chars[1:])}
+    return frozenset(bigrams | {word.lower() for word in _WORD.findall(text)})
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ReferencePacker:
+    def __init__(self,
+                 token_budget: int = 800,
+                 mmr_lambda: float = 0.7,
+                 duplicate_threshold: float = 0.8,
+                 context_sentences: int = 1,
+                 min_overlap: int = 10):
+        """
+        初始化参考资料打包器
+
+        在 token 预算内挑选参考资料：去掉近似重复的文本块和相邻文本块之间的重叠部分，
+        按 MMR 兼顾相关性与多样性，并把每条参考裁剪到与原文最相关的句子及其上下文。
+
+        Args:
+            token_budget: 参考资料的 token 预算
+            mmr_lambda: MMR 中相关性的权重（0-1），越小越偏向多样性
+            duplicate_threshold: 特征重合度不低于此值的文本块视为重复，只保留相似度最高的一条
+            context_sentences: 裁剪时保留最相关句子前后各多少句
+            min_overlap: 同一来源的两条参考首尾重合至少多少个字符时去掉重叠部分
+        """
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.context_sentences = context_sentences
+        self.min_overlap = min_overlap
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'tokens_before': 0,
+            'tokens_after': 0
+        }
+
+    @staticmethod
+    def _reference_tokens(result: Dict[str, Any]) -> int:
+        """单条参考的 token 数（平行语料包含译文）"""
+        return estimate_tokens(result['content']) + estimate_tokens(result.get('metadata', {}).get('translation') or '')
+
+    def _trim(self, query_features: FrozenSet[str], content: str) -> str:
+        """保留与原文特征重合最多的句子及其前后 context_sentences 句"""
+        sentences = _SENTENCE.findall(content)
+        window = 2 * self.context_sentences + 1
+        if len(sentences) <= window:
+            return content
+        scores = [len(_features(sentence) & query_features) for sentence in sentences]
+        best = max(range(len(sentences)), key=scores.__getitem__)
+        if scores[best] == 0:
+            return content
+        start = max(0, min(best - self.context_sentences, len(sentences) - window))
+        return "".join(sentences[start:start + window]).strip()
+
+    def _strip_overlap(self, content: str, source: Any, selected: List[Dict[str, Any]]) -> str:
+        """去掉与已选中的同一来源文本块首尾重叠的部分"""
+        for chosen in selected:
+            if chosen.get('metadata', {}).get('source') != source:
+                continue
+            other = chosen['content']
+            for size in range(min(len(content), len(other)) - 1, self.min_overlap - 1, -1):
+                if other.endswith(content[:size]):
+                    content = content[size:]
+                    break
+                if content.endswith(other[:size]):
+                    content = content[:-size]
+                    break
+        return content.strip()
+
+    def pack(self,
+             query: str,
+             results: List[Dict[str, Any]],
+             max_references: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        在 token 预算内挑选并裁剪参考资料
+
+        Args:
+            query: 待翻译的原文
+            results: 按相似度排序的检索结果
+            max_references: 最多保留的参考条数，None 表示只受预算限制
+
+        Returns:
+            (参考资料列表, 统计)：统计包含 tokens_before、tokens_after、tokens_saved、dropped；
+            tokens_before 只计相似度最高的 max_references 条，即不打包时提示实际使用的参考
+        """
+        ranked = sorted(results, key=lambda item: item['similarity'], reverse=True)
+        tokens_before = sum(self._reference_tokens(result) for result in ranked[:max_references])
+        query_features = _features(query)
+
+        # 裁剪到相关句子，并去掉近似重复的文本块（保留相似度更高的一条）
+        candidates: List[Tuple[Dict[str, Any], FrozenSet[str]]] = []
+        for result in ranked:
+            metadata = result.get('metadata', {})
+            content = result['content'] if metadata.get('translation') else self._trim(query_features, result['content'])
+            features = _features(content)
+            if any(_jaccard(features, kept) >= self.duplicate_threshold for _, kept in candidates):
+                continue
+            candidates.append(({**result, 'content': content}, features))
+
+        # MMR：相关性减去与已选参考的最大重合度，贪心装入预算
+        selected: List[Dict[str, Any]] = []
+        selected_features: List[FrozenSet[str]] = []
+        tokens_after = 0
+        if candidates:
+            scores = [candidate['similarity'] for candidate, _ in candidates]
+            low, high = min(scores), max(scores)
+            relevance = [(score - low) / (high - low) if high > low else 1.0 for score in scores]
+        limit = max_references if max_references is not None else len(candidates)
+        while candidates and len(selected) < limit:
+            best = max(
+                range(len(candidates)),
+                key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * max(
+                    (_jaccard(candidates[i][1], chosen) for chosen in selected_features), default=0.0
+                )
+            )
+            candidate, features = candidates.pop(best)
+            relevance.pop(best)
+            candidate['content'] = self._strip_overlap(
+                candidate['content'], candidate.get('metadata', {}).get('source'), selected
+            )
+            if not candidate['content']:
+                continue
+            tokens = self._reference_tokens(candidate)
+            if tokens_after + tokens > self.token_budget:
+                continue
+            selected.append(candidate)
+            selected_features.append(features)
+            tokens_after += tokens
+
+        report = {
+            'tokens_before': tokens_before,
+            'tokens_after': tokens_after,
+            'tokens_saved': tokens_before - tokens_after,
+            'dropped': len(results) - len(selected)
+        }
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['tokens_before'] += tokens_before
+            self._stats['tokens_after'] += tokens_after
+        return selected, report
+
+    def stats(self) -> Dict[str, float]:
+        """累计的打包统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['tokens_saved'] = stats['tokens_before'] - stats['tokens_after']
+        stats['avg_tokens_saved'] = stats['tokens_saved'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
@@ -0,0 +1,95 @@
+import logging
+import threading
+from typing import Callable, Dict, Hashable, Iterator, List
+
+
+class _Flight:
+    """一次正在进行的上游流，记录已产生的事件供后加入的订阅者回放"""
+
+    def __init__(self):
+        self.events: List[str] = []
+        self.done = False
+        self.cond = threading.Condition()
+
+
+class StreamCoalescer:
+    def __init__(self):
+        """
+        初始化流式请求合并器
+
+        相同键的并发请求只会启动一次上游流：第一个请求负责启动，之后的请求订阅同一份
+        事件序列，并先回放已经产生的事件。上游流在后台线程中运行，即使发起者断开，
+        其他订阅者仍能收到完整结果。
+        """
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _run(self, key: Hashable, flight: _Flight, producer: Callable[[], Iterator[str]]):
+        """在后台线程中消费上游流并广播事件"""
+        try:
+            for event in producer():
+                with flight.cond:
+                    flight.events.append(event)
+                    flight.cond.notify_all()
+        except Exception as e:
+            self.logger.error(f"上游流执行失败: {str(e)}")
+        finally:
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def subscribe(self, key: Hashable, producer: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        订阅键对应的事件流，不存在时用 producer 启动上游流
+
+        Args:
+            key: 请求合并键，相同键的并发请求共享一次上游流
+            producer: 产生事件的生成器函数，只会被调用一次
+
+        Returns:
+            Iterator[str]: 完整的事件序列（含已产生事件的回放）
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.started += 1
+                threading.Thread(
+                    target=self._run, args=(key, flight, producer), name="single-flight", daemon=True
+                ).start()
+            else:
+                self.coalesced += 1
+                self.logger.info("合并相同的并发请求，订阅已有的上游流")
+        return self._iterate(flight)
+
+    @staticmethod
+    def _iterate(flight: _Flight) -> Iterator[str]:
+        """从头回放事件并等待新事件，直到上游流结束"""
+        index = 0
+        while True:
+            with flight.cond:
+                while index >= len(flight.events) and not flight.done:
+                    flight.cond.wait()
+                pending = flight.events[index:]
+                finished = flight.done
+            index += len(pending)
+            for event in pending:
+                yield event
+            if finished and index >= len(flight.events):
+                return
+
+    def stats(self) -> Dict[str, int]:
+        """返回上游流启动次数和被合并的请求数"""
+        with self._lock:
+            return {
+                'started': self.started,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights)
+            }
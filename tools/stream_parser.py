@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional, Tuple
+
+# 模型回复中的分节标记及其对应的事件类型
+SECTION_MARKERS: Dict[str, str] = {
+    '【翻译结果】': 'translation',
+    '【翻译解析】': 'analysis',
+}
+
+_MARKER_START = '【'
+
+
+class TranslationStreamParser:
+    def __init__(self):
+        """
+        初始化流式翻译解析器
+
+        逐个消费模型返回的增量文本，只解析一次，按分节输出新增的字符。
+        分节从 【翻译结果】/【翻译解析】 标记开始，遇到下一个 【 标记结束；
+        跨数据块被截断的标记会暂存到下一个数据块再判断。
+        """
+        self.section: Optional[str] = None
+        self._pending = ''
+        self._at_section_start = False
+        self._parts: Dict[str, List[str]] = {name: [] for name in SECTION_MARKERS.values()}
+
+    def _match_marker(self) -> Tuple[Optional[str], int]:
+        """
+        判断暂存区开头的 【 是否为已知标记
+
+        Returns:
+            (分节名, 消费长度)：已知标记返回分节名；未知标记返回 (None, 1)；
+            尚无法判断时返回 (None, 0)
+        """
+        for marker, section in SECTION_MARKERS.items():
+            if self._pending.startswith(marker):
+                return section, len(marker)
+            if marker.startswith(self._pending):
+                return None, 0
+        return None, 1
+
+    def _emit(self, text: str, events: List[Tuple[str, str]]):
+        """向当前分节输出文本，分节开头的空白被忽略"""
+        if self.section not in self._parts or not text:
+            return
+        if self._at_section_start:
+            text = text.lstrip()
+            if not text:
+                return
+            self._at_section_start = False
+        self._parts[self.section].append(text)
+        events.append((self.section, text))
+
+    def feed(self, delta: str) -> List[Tuple[str, str]]:
+        """
+        消费一段增量文本
+
+        Args:
+            delta: 模型返回的增量内容
+
+        Returns:
+            List[Tuple[str, str]]: 新增的 (分节名, 文本) 列表
+        """
+        events: List[Tuple[str, str]] = []
+        self._pending += delta
+        while self._pending:
+            index = self._pending.find(_MARKER_START)
+            if index < 0:
+                self._emit(self._pending, events)
+                self._pending = ''
+                break
+            if index > 0:
+                self._emit(self._pending[:index], events)
+                self._pending = self._pending[index:]
+
+            section, consumed = self._match_marker()
+            if consumed == 0:
+                # 标记可能被截断，等待下一个数据块
+                break
+            # 任何 【 都会结束当前分节；已知标记开始新的分节
+            self.section = section
+            self._at_section_start = True
+            self._pending = self._pending[consumed:]
+        return events
+
+    def close(self) -> List[Tuple[str, str]]:
+        """流结束时输出暂存的内容"""
+        events: List[Tuple[str, str]] = []
+        self._emit(self._pending, events)
+        self._pending = ''
+        return events
+
+    @property
+    def translation(self) -> str:
+        """已解析的完整翻译结果"""
+        return ''.join(self._parts['translation']).strip()
+
+    @property
+    def analysis(self) -> str:
+        """已解析的完整翻译解析"""
+        return ''.join(self._parts['analysis']).strip()
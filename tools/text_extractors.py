@@ -0,0 +1,333 @@
+import json
+import logging
+import os
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_community.document_loaders import (
+    TextLoader,
+    PDFMinerLoader,
+    UnstructuredWordDocumentLoader
+)
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from docx2python import docx2python
+import pandas as pd
+
+try:
+    import ijson
+except ImportError:  # 可选依赖，未安装时 JSON 整体加载
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# 通用加载器处理的文件类型
+FILE_LOADERS = {
+    '.txt': TextLoader,
+    '.pdf': PDFMinerLoader,
+    '.doc': UnstructuredWordDocumentLoader,
+    '.docx': UnstructuredWordDocumentLoader
+}
+
+# 使用专用读取函数的文件类型及解析器名称（记录到入库清单）
+PARSERS = {
+    '.txt': 'text',
+    '.docx': 'docx2python',
+    '.xlsx': 'openpyxl',
+    '.xls': 'pandas',
+    '.json': 'ijson' if ijson is not None else 'json',
+    '.pdf': 'pdfminer'
+}
+
+# 平行语料（原文/译文成对）支持的文件类型
+PAIR_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.tsv', '.json', '.jsonl')
+
+# 读取 csv/tsv 平行语料时每次读入的行数
+PAIR_READ_ROWS = 10000
+
+# 文本分割的分隔符，按优先级排列
+SEPARATORS = ["\n\n", "\n", "。", ".", "!", "?", "！", "？", " ", ""]
+
+
+def is_supported(file_path: str) -> bool:
+    """判断文件类型是否支持"""
+    ext = os.path.splitext(file_path)[1].lower()
+    return ext in FILE_LOADERS or ext in PARSERS
+
+
+def parser_name(file_path: str) -> str:
+    """文件类型对应的解析器名称"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in PARSERS:
+        return PARSERS[ext]
+    return FILE_LOADERS[ext].__name__ if ext in FILE_LOADERS else 'unknown'
+
+
+def make_text_splitter(chunk_size: int = 500, chunk_overlap: int = 50) -> RecursiveCharacterTextSplitter:
+    """创建文本分割器"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=SEPARATORS
+    )
+
+
+def iter_text(file_path: str) -> Iterator[str]:
+    """
+    按文件类型逐段产出文本（PDF 按页、表格按行、JSON 按字段、文本按行），内存占用与文件大小无关
+
+    Args:
+        file_path: 文件路径，支持 txt/pdf/doc/docx/xlsx/xls/json
+
+    Returns:
+        Iterator[str]: 文本段，段与段之间以换行连接
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.txt':
+        return iter_txt(file_path)
+    if ext == '.docx':
+        return iter(read_docx(file_path).split("\n"))
+    if ext == '.xlsx':
+        return iter_xlsx(file_path)
+    if ext == '.xls':
+        return iter_xls(file_path)
+    if ext == '.json':
+        return iter_json(file_path)
+    if ext == '.pdf':
+        return iter_pdf(file_path)
+    if ext in FILE_LOADERS:
+        # 使用通用加载器处理其他支持的文件类型
+        return (doc.page_content for doc in FILE_LOADERS[ext](file_path).load())
+    raise ValueError(f"不支持的文件类型: {file_path}")
+
+
+def load_text(file_path: str) -> str:
+    """
+    按文件类型提取纯文本
+
+    Args:
+        file_path: 文件路径，支持 txt/pdf/doc/docx/xlsx/xls/json
+
+    Returns:
+        str: 提取出的文本
+    """
+    return "\n".join(iter_text(file_path))
+
+
+def split_stream(segments: Iterable[str],
+                 chunk_size: int = 500,
+                 chunk_overlap: int = 50,
+                 window_size: Optional[int] = None) -> Iterator[str]:
+    """
+    按窗口分割文本段：累积到 window_size 个字符后分割一次，
+    窗口末尾的文本块可能被截断，留到下一个窗口与后续文本一起重新分割
+
+    Args:
+        segments: 文本段
+        chunk_size: 文本分块大小
+        chunk_overlap: 文本分块重叠大小
+        window_size: 每次分割的字符数，默认 chunk_size 的 64 倍
+
+    Returns:
+        Iterator[str]: 文本块
+    """
+    splitter = make_text_splitter(chunk_size, chunk_overlap)
+    window_size = window_size or chunk_size * 64
+    window: List[str] = []
+    length = 0
+    for segment in segments:
+        window.append(segment)
+        length += len(segment) + 1
+        if length >= window_size:
+            chunks = splitter.split_text("\n".join(window))
+            yield from chunks[:-1]
+            window = chunks[-1:]
+            length = sum(len(chunk) for chunk in window)
+    if window:
+        yield from splitter.split_text("\n".join(window))
+
+
+def iter_chunks(file_path: str, chunk_size: int = 500, chunk_overlap: int = 50) -> Iterator[str]:
+    """流式提取并分割单个文件"""
+    return split_stream(iter_text(file_path), chunk_size, chunk_overlap)
+
+
+def split_file(file_path: str, chunk_size: int = 500, chunk_overlap: int = 50) -> List[str]:
+    """
+    提取并分割单个文件，可在子进程中执行
+
+    Args:
+        file_path: 文件路径
+        chunk_size: 文本分块大小
+        chunk_overlap: 文本分块重叠大小
+
+    Returns:
+        List[str]: 文本块列表
+    """
+    return list(iter_chunks(file_path, chunk_size, chunk_overlap))
+
+
+def iter_txt(file_path: str) -> Iterator[str]:
+    """逐行读取文本文件"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def read_docx(file_path: str) -> str:
+    """提取Word文档文本"""
+    # 使用 docx2python 提取文本
+    with docx2python(file_path) as doc:
+        text_content = []
+        # 提取所有文本内容
+        for paragraph in doc.text.split('\n'):
+            if paragraph.strip():
+                text_content.append(paragraph.strip())
+    return "\n".join(text_content)
+
+
+def iter_xlsx(file_path: str) -> Iterator[str]:
+    """以只读模式逐行读取 xlsx，每个 sheet 的首行为表头，与 pandas 读取结果一致"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            next(rows, None)
+            for row in rows:
+                row_text = " ".join(str(cell) for cell in row if cell is not None)
+                if row_text.strip():
+                    yield row_text
+    finally:
+        workbook.close()
+
+
+def iter_xls(file_path: str) -> Iterator[str]:
+    """逐个 sheet 读取旧版 xls（xlrd 不支持流式读取）"""
+    sheet_names = pd.ExcelFile(file_path).sheet_names
+    for sheet_name in sheet_names:
+        sheet_df = pd.read_excel(file_path, sheet_name=sheet_name)
+        for row in sheet_df.itertuples(index=False):
+            row_text = " ".join(str(cell) for cell in row if pd.notna(cell))
+            if row_text.strip():
+                yield row_text
+
+
+def iter_json(file_path: str) -> Iterator[str]:
+    """增量解析JSON，按字段产出 "键: 值"，列表元素直接产出值；未安装 ijson 时整体加载"""
+    if ijson is None:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield from json_to_texts(json.load(f))
+        return
+
+    # 容器栈：True 表示对象，False 表示列表
+    containers: List[bool] = []
+    key = None
+    with open(file_path, 'rb') as f:
+        for _, event, value in ijson.parse(f):
+            if event == 'map_key':
+                key = value
+            elif event in ('start_map', 'start_array'):
+                containers.append(event == 'start_map')
+            elif event in ('end_map', 'end_array'):
+                containers.pop()
+            elif containers and containers[-1]:
+                yield f"{key}: {value}"
+            else:
+                yield str(value)
+
+
+def json_to_texts(data: Any) -> List[str]:
+    """将JSON数据转换为文本列表"""
+    texts = []
+
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(value, (dict, list)):
+                texts.extend(json_to_texts(value))
+            else:
+                texts.append(f"{key}: {value}")
+    elif isinstance(data, list):
+        for item in data:
+            texts.extend(json_to_texts(item))
+    else:
+        texts.append(str(data))
+
+    return texts
+
+
+def iter_pdf(file_path: str) -> Iterator[str]:
+    """逐页提取PDF文本"""
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    empty = True
+    for page in extract_pages(file_path):
+        page_text = "".join(element.get_text() for element in page if isinstance(element, LTTextContainer))
+        if page_text.strip():
+            empty = False
+            yield page_text
+
+    if empty:
+        logger.warning(f"PDF文件没有提取到文本: {file_path}")
+
+
+def _frame_pairs(frame: "pd.DataFrame", source_field: str, target_field: str) -> Iterator[Tuple[str, str]]:
+    """按列向量化清洗一批行，产出原文和译文均非空的语料对"""
+    frame = frame[[source_field, target_field]].dropna()
+    sources = frame[source_field].astype(str).str.strip()
+    targets = frame[target_field].astype(str).str.strip()
+    mask = (sources != '') & (targets != '')
+    return zip(sources[mask].tolist(), targets[mask].tolist())
+
+
+def iter_pairs(file_path: str, source_field: str, target_field: str) -> Iterator[Tuple[str, str]]:
+    """
+    读取平行语料，逐条产出 (原文, 译文)
+
+    表格只读取原文列和译文列；csv/tsv 分块读取，jsonl 逐行读取，
+    JSON 为对象列表，安装 ijson 时增量解析。
+
+    Args:
+        file_path: 文件路径，支持 xlsx/xls/csv/tsv/json/jsonl
+        source_field: 原文所在的列名或字段名
+        target_field: 译文所在的列名或字段名
+
+    Returns:
+        Iterator[Tuple[str, str]]: 语料对
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        sheets = pd.read_excel(file_path, sheet_name=None, usecols=[source_field, target_field], dtype=str)
+        for frame in sheets.values():
+            yield from _frame_pairs(frame, source_field, target_field)
+    elif ext in ('.csv', '.tsv'):
+        reader = pd.read_csv(
+            file_path,
+            sep='\t' if ext == '.tsv' else ',',
+            usecols=[source_field, target_field],
+            dtype=str,
+            chunksize=PAIR_READ_ROWS
+        )
+        for frame in reader:
+            yield from _frame_pairs(frame, source_field, target_field)
+    elif ext in ('.json', '.jsonl'):
+        yield from _iter_json_pairs(file_path, ext, source_field, target_field)
+    else:
+        raise ValueError(f"不支持的平行语料文件类型: {file_path}")
+
+
+def _iter_json_pairs(file_path: str, ext: str, source_field: str, target_field: str) -> Iterator[Tuple[str, str]]:
+    """从 JSON 对象列表或 jsonl 中读取语料对"""
+    with open(file_path, 'rb') as f:
+        if ext == '.jsonl':
+            records = (json.loads(line) for line in f if line.strip())
+        elif ijson is not None:
+            records = ijson.items(f, 'item')
+        else:
+            records = json.load(f)
+        for record in records:
+            source = str(record.get(source_field) or '').strip()
+            target = str(record.get(target_field) or '').strip()
+            if source and target:
+                yield source, target
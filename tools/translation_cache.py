@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from tools.query_cache import normalize_query
+
+
+class TranslationCache:
+    def __init__(self,
+                 db_path: str,
+                 max_entries: Optional[int] = 100000,
+                 max_age_seconds: Optional[float] = None):
+        """
+        初始化翻译记忆缓存（SQLite持久化）
+
+        Args:
+            db_path: SQLite 数据库文件路径
+            max_entries: 最多保留的条目数，超出时淘汰最久未访问的条目，None 表示不限
+            max_age_seconds: 条目最长保留时间（秒），None 表示不过期
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_translations_last_access ON translations(last_access)"
+            )
+
+        self.hits = 0
+        self.misses = 0
+        self.evict_interval = 100
+        self._puts_since_evict = 0
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def make_key(text: str,
+                 source_lang: str,
+                 target_lang: str,
+                 model: str,
+                 temperature: float,
+                 prompt_version: str) -> str:
+        """根据规范化原文、语言对、模型、温度和提示词版本生成缓存键"""
+        payload = json.dumps(
+            [normalize_query(text), source_lang, target_lang, model, float(temperature), prompt_version],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的翻译结果，过期条目视为未命中"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE translations SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """写入翻译结果并执行淘汰"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO translations (key, result, created_at, last_access)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET result = excluded.result,
+                       created_at = excluded.created_at, last_access = excluded.last_access""",
+                (key, json.dumps(result, ensure_ascii=False), now, now)
+            )
+            # 淘汰需要扫描索引，按写入次数摊销执行
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.evict_interval:
+                self._puts_since_evict = 0
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """按时间和容量淘汰条目（需在持有锁时调用）"""
+        if self.max_age_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM translations WHERE created_at < ?", (now - self.max_age_seconds,)
+            )
+        if self.max_entries is not None:
+            self._conn.execute(
+                """DELETE FROM translations WHERE key IN (
+                       SELECT key FROM translations ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """返回缓存命中统计"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
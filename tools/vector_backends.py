@@ -0,0 +1,898 @@
+import bisect
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 上只在进程内加锁
+    fcntl = None
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """
+    把 Chroma 返回的距离换算为 [0, 1] 的相似度（越大越相似）
+
+    Args:
+        distance: Chroma 返回的距离
+        space: 集合的距离度量（hnsw:space）：cosine、ip 或 l2
+
+    Returns:
+        float: 相似度；cosine 为余弦相似度，ip 为内积，
+            l2（平方欧氏距离）按单位向量换算为余弦相似度
+    """
+    if space == 'l2':
+        similarity = 1.0 - distance / 2.0
+    else:
+        similarity = 1.0 - distance
+    return min(1.0, max(0.0, similarity))
+
+
+def cosine_similarities(query: List[float], vectors: List[List[float]]) -> List[float]:
+    """计算查询向量与一组向量的余弦相似度，截断到 [0, 1]"""
+    if len(vectors) == 0:
+        return []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    query_vector = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+    scores = matrix @ query_vector / np.maximum(norms, 1e-12)
+    return np.clip(scores, 0.0, 1.0).tolist()
+
+
+def _normalize_rows(vectors: Any) -> np.ndarray:
+    """转换为 float32 矩阵并按行归一化为单位向量"""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _match_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """按 Chroma 的 where 语法（$and/$or/$eq/$ne/$in/$nin/$gt/$gte/$lt/$lte）过滤元数据"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(_match_where(metadata, item) for item in condition):
+                return False
+        elif key == '$or':
+            if not any(_match_where(metadata, item) for item in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == '$eq':
+                    matched = value == operand
+                elif operator == '$ne':
+                    matched = value != operand
+                elif operator == '$in':
+                    matched = value in operand
+                elif operator == '$nin':
+                    matched = value not in operand
+                elif value is None:
+                    matched = False
+                elif operator == '$gt':
+                    matched = value > operand
+                elif operator == '$gte':
+                    matched = value >= operand
+                elif operator == '$lt':
+                    matched = value < operand
+                elif operator == '$lte':
+                    matched = value <= operand
+                else:
+                    raise ValueError(f"不支持的过滤条件: {operator}")
+                if not matched:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class VectorBackend:
+    """
+    向量存储后端接口
+
+    VectorSearcher 通过后端读写集合；query 返回的相似度统一为 [0, 1]（越大越相似），
+    每个查询的结果按相似度降序排列，阈值过滤和跨集合合并由 VectorSearcher 完成。
+    """
+
+    name = "base"
+
+    def list_collections(self) -> List[str]:
+        """列出所有集合名称"""
+        raise NotImplementedError
+
+    def has_collection(self, collection_name: str) -> bool:
+        """集合是否存在"""
+        return collection_name in self.list_collections()
+
+    def ensure_collection(self, collection_name: str, collection_metadata: Optional[Dict] = None):
+        """确保集合存在，collection_metadata 仅在新建集合时生效"""
+        raise NotImplementedError
+
+    def count(self, collection_name: str) -> int:
+        """集合中的记录数"""
+        raise NotImplementedError
+
+    def distance_space(self, collection_name: str) -> str:
+        """集合的距离度量（hnsw:space）"""
+        raise NotImplementedError
+
+    def query(self,
+              collection_name: str,
+              query_embeddings: List[List[float]],
+              top_k: int,
+              where: Optional[Dict] = None) -> List[List[Dict[str, Any]]]:
+        """
+        用一批查询向量搜索集合
+
+        Returns:
+            List[List[Dict]]: 每个查询的结果，含 content、metadata、similarity、distance
+        """
+        raise NotImplementedError
+
+    def get_existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        """返回 ids 中已存在于集合的ID"""
+        raise NotImplementedError
+
+    def add(self,
+            collection_name: str,
+            ids: List[str],
+            embeddings: List[List[float]],
+            documents: List[str],
+            metadatas: Optional[List[Dict]] = None,
+            upsert: bool = False):
+        """写入记录；upsert 为 False 时已存在的ID被忽略"""
+        raise NotImplementedError
+
+    def delete(self, collection_name: str, ids: List[str]):
+        """按ID删除记录"""
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    """基于 chromadb.PersistentClient 的后端，直接调用 Chroma 集合，不经过 LangChain 封装"""
+
+    name = "chroma"
+
+    def __init__(self, persist_dir: str):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=persist_dir)
+        self._collections: Dict[str, Any] = {}
+        self._spaces: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def list_collections(self) -> List[str]:
+        # 在 v0.6.0 中，list_collections 直接返回集合名称列表
+        return list(self.client.list_collections())
+
+    def has_collection(self, collection_name: str) -> bool:
+        if collection_name in self._collections:
+            return True
+        try:
+            self.client.get_collection(name=collection_name)
+            return True
+        except Exception:
+            return False
+
+    def ensure_collection(self, collection_name: str, collection_metadata: Optional[Dict] = None):
+        """新集合默认使用余弦距离，已有集合的距离度量不能修改"""
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+        with self._lock:
+            if collection_name not in self._collections:
+                try:
+                    collection = self.client.get_collection(name=collection_name)
+                except Exception:
+                    collection = self.client.get_or_create_collection(
+                        name=collection_name,
+                        metadata=collection_metadata or {"hnsw:space": "cosine"}
+                    )
+                self._collections[collection_name] = collection
+        return self._collections[collection_name]
+
+    def count(self, collection_name: str) -> int:
+        return self.ensure_collection(collection_name).count()
+
+    def distance_space(self, collection_name: str) -> str:
+        """未设置时为 Chroma 默认的 l2"""
+        space = self._spaces.get(collection_name)
+        if space is None:
+            metadata = self.ensure_collection(collection_name).metadata or {}
+            space = self._spaces.setdefault(collection_name, metadata.get("hnsw:space", "l2"))
+        return space
+
+    def query(self,
+              collection_name: str,
+              query_embeddings: List[List[float]],
+              top_k: int,
+              where: Optional[Dict] = None) -> List[List[Dict[str, Any]]]:
+        collection = self.ensure_collection(collection_name)
+        # l2 集合中的向量未必是单位向量，取回向量直接计算余弦相似度
+        space = self.distance_space(collection_name)
+        include = ["documents", "metadatas", "distances"]
+        if space == 'l2':
+            include.append("embeddings")
+
+        raw = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=where,
+            include=include
+        )
+
+        batch_results = []
+        for i, (documents, metadatas, distances) in enumerate(zip(raw['documents'], raw['metadatas'], raw['distances'])):
+            if space == 'l2':
+                similarities = cosine_similarities(query_embeddings[i], raw['embeddings'][i])
+            else:
+                similarities = [distance_to_similarity(distance, space) for distance in distances]
+            results = [
+                {
+                    'content': content,
+                    'metadata': metadata or {},
+                    'similarity': similarity,
+                    'distance': float(distance)
+                }
+                for content, metadata, distance, similarity in zip(documents, metadatas, distances, similarities)
+            ]
+            if space == 'l2':
+                results.sort(key=lambda item: item['similarity'], reverse=True)
+            batch_results.append(results)
+        return batch_results
+
+    def get_existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        return set(self.ensure_collection(collection_name).get(ids=ids, include=[])['ids'])
+
+    def add(self,
+            collection_name: str,
+            ids: List[str],
+            embeddings: List[List[float]],
+            documents: List[str],
+            metadatas: Optional[List[Dict]] = None,
+            upsert: bool = False):
+        collection = self.ensure_collection(collection_name)
+        write = collection.upsert if upsert else collection.add
+        write(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, collection_name: str, ids: List[str]):
+        self.ensure_collection(collection_name).delete(ids=ids)
+
+
+class _Segment:
+    """
+    预分配容量的数据段（只追加）
+
+    文件：{name}.npy 向量矩阵，{name}.scales.npy int8 的逐行缩放系数，
+    {name}.offsets.npy 每行记录在 {name}.jsonl 中的 (偏移, 长度)，{name}.ids 每行一个ID。
+    实际行数记录在集合的 meta.json 中，超出部分是尚未使用的容量。
+    """
+
+    def __init__(self, directory: str, info: Dict[str, Any], quantized: bool):
+        self.name = info['name']
+        self.start = info['start']
+        self.capacity = info['capacity']
+        self.rows = info['rows']
+        self.prefix = os.path.join(directory, self.name)
+        # 以只读方式映射，多个进程共享操作系统的页缓存
+        self.vectors = np.load(self.prefix + '.npy', mmap_mode='r')
+        self.scales = np.load(self.prefix + '.scales.npy', mmap_mode='r') if quantized else None
+        self.offsets = np.load(self.prefix + '.offsets.npy', mmap_mode='r')
+        # 记录文件在加载时打开：与内存映射一样，其他进程压缩并删除旧文件后，已打开的句柄仍可读取
+        self._records = open(self.prefix + '.jsonl', 'rb')
+        self._records_lock = threading.Lock()
+        # 未删除的行
+        self.live = np.ones(self.capacity, dtype=bool)
+        # 已读入ID映射的行数和字节数
+        self.ids_rows = 0
+        self.ids_bytes = 0
+
+    @staticmethod
+    def create(directory: str, name: str, start: int, capacity: int, dim: int, quantized: bool) -> Dict[str, Any]:
+        """创建空数据段文件（稀疏文件，未写入的容量不占磁盘空间）"""
+        prefix = os.path.join(directory, name)
+        dtype = np.int8 if quantized else np.float16
+        np.lib.format.open_memmap(prefix + '.npy', mode='w+', dtype=dtype, shape=(capacity, dim)).flush()
+        if quantized:
+            np.lib.format.open_memmap(prefix + '.scales.npy', mode='w+', dtype=np.float32, shape=(capacity,)).flush()
+        np.lib.format.open_memmap(prefix + '.offsets.npy', mode='w+', dtype=np.int64, shape=(capacity, 2)).flush()
+        open(prefix + '.jsonl', 'wb').close()
+        open(prefix + '.ids', 'wb').close()
+        return {'name': name, 'start': start, 'capacity': capacity, 'rows': 0, 'ids_bytes': 0, 'records_bytes': 0}
+
+    def files(self) -> List[str]:
+        suffixes = ['.npy', '.offsets.npy', '.jsonl', '.ids']
+        if self.scales is not None:
+            suffixes.append('.scales.npy')
+        return [self.prefix + suffix for suffix in suffixes]
+
+    def read_records(self, rows: List[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """按段内行号读取 (文档, 元数据)"""
+        records = {}
+        with self._records_lock:
+            for row in sorted(rows):
+                offset, length = self.offsets[row]
+                self._records.seek(int(offset))
+                document, metadata = json.loads(self._records.read(int(length)))
+                records[row] = (document, metadata or {})
+        return records
+
+
+class _NumpyCollection:
+    """单个集合：若干只追加的数据段、删除标记文件和 meta.json"""
+
+    def __init__(self, directory: str, quantized: bool, min_segment_rows: int, block_rows: int, compact_ratio: float):
+        self.directory = directory
+        self.quantized = quantized
+        self.min_segment_rows = min_segment_rows
+        self.block_rows = block_rows
+        self.compact_ratio = compact_ratio
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.state: Optional[Dict[str, Any]] = None
+        self.segments: List[_Segment] = []
+        self.ids: Optional[Dict[str, int]] = None
+        self._stat_key = None
+        self._deleted_read = 0
+        self._lock = threading.RLock()
+        self._writing = False
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+    # ---------- 状态 ----------
+
+    def create(self, collection_metadata: Optional[Dict] = None):
+        """创建空集合（向量维度在首次写入时确定）"""
+        with self._write_lock():
+            if os.path.exists(self.meta_path):
+                return
+            self._save_state({
+                'dim': None,
+                'dtype': 'int8' if self.quantized else 'float16',
+                'metadata': collection_metadata or {"hnsw:space": "cosine"},
+                'generation': 0,
+                'segments': [],
+                'tombstones': 'g0.tombstones',
+                'deleted': 0
+            })
+
+    def _save_state(self, state: Dict[str, Any]):
+        """原子替换 meta.json，其他进程读到的总是完整的状态"""
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+
+    def refresh(self):
+        """meta.json 变化时增量加载其他进程或本进程追加的数据段、行和删除标记"""
+        with self._lock:
+            for attempt in range(3):
+                try:
+                    self._load_state()
+                    return
+                except FileNotFoundError:
+                    # 读取 meta.json 后其他进程完成了压缩并删除了旧文件，按新状态重新加载
+                    if attempt == 2:
+                        raise
+                    self.state = None
+                    self._stat_key = None
+
+    def _load_state(self):
+        stat = os.stat(self.meta_path)
+        stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stat_key:
+            return
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if self.state is None or state['generation'] != self.state['generation']:
+            # 压缩后文件整体替换，重新加载
+            self.segments = []
+            self._deleted_read = 0
+            if self.ids is not None:
+                self.ids = {}
+        self.quantized = state['dtype'] == 'int8'
+        for index, info in enumerate(state['segments']):
+            if index < len(self.segments):
+                self.segments[index].rows = info['rows']
+            else:
+                self.segments.append(_Segment(self.directory, info, self.quantized))
+        self.state = state
+        self._read_tombstones()
+        if self.ids is not None:
+            self._read_ids()
+        self._stat_key = stat_key
+
+    def _locate(self, row: int) -> Tuple[_Segment, int]:
+        """全局行号对应的数据段和段内行号"""
+        index = bisect.bisect_right([segment.start for segment in self.segments], row) - 1
+        segment = self.segments[index]
+        return segment, row - segment.start
+
+    def _read_tombstones(self):
+        deleted = self.state['deleted']
+        if deleted <= self._deleted_read:
+            return
+        rows = np.fromfile(
+            os.path.join(self.directory, self.state['tombstones']),
+            dtype=np.int64,
+            count=deleted - self._deleted_read,
+            offset=self._deleted_read * 8
+        )
+        for row in rows.tolist():
+            segment, local = self._locate(row)
+            segment.live[local] = False
+        self._deleted_read = deleted
+
+    def _read_ids(self):
+        """增量读入ID到行号的映射（只读路径不需要，首次写入或查询ID时才加载）"""
+        for segment, info in zip(self.segments, self.state['segments']):
+            if segment.ids_rows >= info['rows']:
+                continue
+            with open(segment.prefix + '.ids', 'rb') as f:
+                f.seek(segment.ids_bytes)
+                data = f.read(info['ids_bytes'] - segment.ids_bytes)
+            new_ids = data.decode('utf-8').split('\n')[:-1]
+            for offset, chunk_id in enumerate(new_ids):
+                local = segment.ids_rows + offset
+                if segment.live[local]:
+                    self.ids[chunk_id] = segment.start + local
+            segment.ids_rows = info['rows']
+            segment.ids_bytes = info['ids_bytes']
+
+    def lookup(self, ids: List[str]) -> Dict[str, int]:
+        """返回 ids 中未删除的ID及其全局行号"""
+        with self._lock:
+            self.refresh()
+            if self.ids is None:
+                self.ids = {}
+                self._read_ids()
+            found = {}
+            for chunk_id in ids:
+                row = self.ids.get(chunk_id)
+                # 其他进程删除的行只更新了删除标记，映射中可能残留旧条目
+                if row is not None:
+                    segment, local = self._locate(row)
+                    if segment.live[local]:
+                        found[chunk_id] = row
+            return found
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """写入时加进程内锁和文件锁，同一时间只有一个写入者"""
+        with self._lock:
+            if self._writing:
+                # 同一线程内嵌套调用（如写入后触发压缩）不重复加文件锁
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._writing = True
+            try:
+                if fcntl is None:
+                    yield
+                    return
+                with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            finally:
+                self._writing = False
+
+    # ---------- 读取 ----------
+
+    def count(self) -> int:
+        with self._lock:
+            self.refresh()
+            return sum(info['rows'] for info in self.state['segments']) - self.state['deleted']
+
+    def _snapshot(self) -> Tuple[List[Tuple[_Segment, int]], int]:
+        """刷新后固定一次查询使用的 (数据段, 行数) 列表，同时返回未删除的行数"""
+        with self._lock:
+            self.refresh()
+            blocks = [(segment, segment.rows) for segment in self.segments if segment.rows]
+            return blocks, sum(info['rows'] for info in self.state['segments']) - self.state['deleted']
+
+    def _top_candidates(self,
+                        queries: np.ndarray,
+                        limit: int,
+                        blocks: List[Tuple[_Segment, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        精确 top-k：逐段（大段按 block_rows 分块以限制 float32 临时矩阵）做矩阵乘法，
+        用 argpartition 取每块前 limit 个候选，最后合并排序
+
+        Args:
+            queries: 归一化后的查询向量
+            limit: 每个查询的候选数
+            blocks: _snapshot 固定的 (数据段, 行数)
+
+        Returns:
+            (相似度, 全局行号)：形状均为 (查询数, 候选数)，按相似度降序
+        """
+        scores_parts, rows_parts = [], []
+        # float16/int8 没有 BLAS 矩阵乘法，逐块转换到复用的 float32 缓冲区，缓冲区可以留在 CPU 缓存中
+        buffer = np.empty((self.block_rows, queries.shape[1]), dtype=np.float32)
+        for segment, rows in blocks:
+            for start in range(0, rows, self.block_rows):
+                end = min(rows, start + self.block_rows)
+                block = buffer[:end - start]
+                np.copyto(block, segment.vectors[start:end])
+                # (查询数, 行数)，每个查询的得分连续存放，argpartition 沿连续的轴进行
+                scores = queries @ block.T
+                if segment.scales is not None:
+                    scores *= segment.scales[start:end]
+                scores[:, ~segment.live[start:end]] = -np.inf
+                if end - start > limit:
+                    index = np.argpartition(scores, end - start - limit, axis=1)[:, end - start - limit:]
+                    scores = np.take_along_axis(scores, index, axis=1)
+                else:
+                    index = np.broadcast_to(np.arange(end - start), scores.shape)
+                scores_parts.append(scores)
+                rows_parts.append(index + segment.start + start)
+        if not scores_parts:
+            empty = np.empty((len(queries), 0))
+            return empty, empty.astype(np.int64)
+        scores = np.concatenate(scores_parts, axis=1)
+        rows = np.concatenate(rows_parts, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :limit]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+    @staticmethod
+    def _read_records(rows: List[int], blocks: List[Tuple[_Segment, int]]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """按全局行号从 _top_candidates 使用的同一组数据段读取记录，压缩后行号重排也不会读错"""
+        starts = [segment.start for segment, _ in blocks]
+        by_segment: Dict[int, List[int]] = {}
+        for row in rows:
+            index = bisect.bisect_right(starts, row) - 1
+            by_segment.setdefault(index, []).append(row - starts[index])
+        records = {}
+        for index, locals_ in by_segment.items():
+            for local, record in blocks[index][0].read_records(locals_).items():
+                records[starts[index] + local] = record
+        return records
+
+    def query(self, query_embeddings: List[List[float]], top_k: int, where: Optional[Dict]) -> List[List[Dict[str, Any]]]:
+        queries = _normalize_rows(query_embeddings)
+        # 整个查询使用同一组数据段，期间的写入和压缩只在下一次查询时生效
+        blocks, live_count = self._snapshot()
+        results: List[List[Dict[str, Any]]] = [[] for _ in range(len(queries))]
+        if live_count == 0 or top_k <= 0:
+            return results
+
+        # 有过滤条件时先多取候选，过滤后不足 top_k 再扩大候选范围
+        limit = min(live_count, top_k if not where else top_k * 4)
+        pending = list(range(len(queries)))
+        while pending:
+            scores, rows = self._top_candidates(queries[pending], limit, blocks)
+            wanted = {int(row) for row, score in zip(rows.ravel(), scores.ravel()) if np.isfinite(score)}
+            records = self._read_records(sorted(wanted), blocks)
+            unfinished = []
+            for column, query_index in enumerate(pending):
+                hits = []
+                for score, row in zip(scores[column].tolist(), rows[column].tolist()):
+                    if not np.isfinite(score) or len(hits) >= top_k:
+                        break
+                    document, metadata = records[row]
+                    if not _match_where(metadata, where):
+                        continue
+                    similarity = min(1.0, max(0.0, score))
+                    hits.append({
+                        'content': document,
+                        'metadata': metadata,
+                        'similarity': similarity,
+                        'distance': max(0.0, 1.0 - score)
+                    })
+                results[query_index] = hits
+                if len(hits) < top_k and limit < live_count:
+                    unfinished.append(query_index)
+            pending = unfinished
+            limit = min(live_count, limit * 4)
+        return results
+
+    # ---------- 写入 ----------
+
+    def _append_rows(self, state: Dict[str, Any], ids: List[str], vectors: np.ndarray,
+                     documents: List[str], metadatas: List[Optional[Dict]]) -> List[int]:
+        """把行追加到最后一个数据段，容量用完时新建一个容量翻倍的数据段"""
+        rows = []
+        written = 0
+        while written < len(ids):
+            info = state['segments'][-1] if state['segments'] else None
+            if info is None or info['rows'] >= info['capacity']:
+                start = info['start'] + info['rows'] if info else 0
+                name = f"g{state['generation']}-{len(state['segments']):06d}"
+                capacity = max(self.min_segment_rows, start)
+                info = _Segment.create(self.directory, name, start, capacity, state['dim'], self.quantized)
+                state['segments'].append(info)
+            count = min(len(ids) - written, info['capacity'] - info['rows'])
+            batch = slice(written, written + count)
+            self._write_segment(info, ids[batch], vectors[batch], documents[batch], metadatas[batch])
+            rows.extend(range(info['start'] + info['rows'], info['start'] + info['rows'] + count))
+            info['rows'] += count
+            written += count
+        return rows
+
+    def _write_segment(self, info: Dict[str, Any], ids: List[str], vectors: np.ndarray,
+                       documents: List[str], metadatas: List[Optional[Dict]], scales: Optional[np.ndarray] = None):
+        """
+        写入一个数据段的空闲容量；先写数据再更新 meta.json，中途失败时多写的部分被忽略
+
+        scales 不为 None 时 vectors 是已量化的 int8 编码（压缩时从旧数据段复制），原样写入，不再重新量化
+        """
+        prefix = os.path.join(self.directory, info['name'])
+        first, last = info['rows'], info['rows'] + len(ids)
+
+        matrix = np.load(prefix + '.npy', mmap_mode='r+')
+        if self.quantized:
+            if scales is None:
+                scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+                vectors = np.round(vectors / scales[:, None]).astype(np.int8)
+            matrix[first:last] = vectors
+            scale_matrix = np.load(prefix + '.scales.npy', mmap_mode='r+')
+            scale_matrix[first:last] = scales
+            scale_matrix.flush()
+        else:
+            matrix[first:last] = vectors.astype(np.float16)
+        matrix.flush()
+
+        offsets = np.load(prefix + '.offsets.npy', mmap_mode='r+')
+        with open(prefix + '.jsonl', 'r+b') as f:
+            # 截断上次失败写入的残留数据
+            f.truncate(info['records_bytes'])
+            f.seek(info['records_bytes'])
+            position = info['records_bytes']
+            for row, (document, metadata) in enumerate(zip(documents, metadatas), start=first):
+                line = json.dumps([document, metadata], ensure_ascii=False).encode('utf-8') + b"\n"
+                f.write(line)
+                offsets[row] = (position, len(line))
+                position += len(line)
+        offsets.flush()
+        info['records_bytes'] = position
+
+        with open(prefix + '.ids', 'r+b') as f:
+            f.truncate(info['ids_bytes'])
+            f.seek(info['ids_bytes'])
+            data = "".join(f"{chunk_id}\n" for chunk_id in ids).encode('utf-8')
+            f.write(data)
+        info['ids_bytes'] += len(data)
+
+    def _append_tombstones(self, state: Dict[str, Any], rows: List[int]):
+        path = os.path.join(self.directory, state['tombstones'])
+        with open(path, 'ab') as f:
+            f.truncate(state['deleted'] * 8)
+            f.seek(state['deleted'] * 8)
+            f.write(np.asarray(rows, dtype=np.int64).tobytes())
+        state['deleted'] += len(rows)
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+            metadatas: Optional[List[Dict]], upsert: bool):
+        vectors = _normalize_rows(embeddings)
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+        with self._write_lock():
+            if not os.path.exists(self.meta_path):
+                self.create()
+            existing = self.lookup(ids)
+            state = json.loads(json.dumps(self.state))
+            if state['dim'] is None:
+                state['dim'] = int(vectors.shape[1])
+            elif vectors.shape[1] != state['dim']:
+                raise ValueError(f"向量维度 {vectors.shape[1]} 与集合维度 {state['dim']} 不一致")
+
+            # 同一批中重复的ID以最后一条为准；非 upsert 时已存在的ID被忽略
+            positions: Dict[str, int] = {}
+            for position, chunk_id in enumerate(ids):
+                if upsert or chunk_id not in existing:
+                    positions[chunk_id] = position
+            if not positions:
+                return
+            keep = sorted(positions.values())
+            replaced = [existing[chunk_id] for chunk_id in positions if chunk_id in existing]
+
+            self._append_rows(
+                state,
+                [ids[i] for i in keep],
+                vectors[keep],
+                [documents[i] for i in keep],
+                [metadatas[i] for i in keep]
+            )
+            if replaced:
+                self._append_tombstones(state, replaced)
+            self._save_state(state)
+            self.refresh()
+            self._maybe_compact()
+
+    def delete(self, ids: List[str]):
+        with self._write_lock():
+            if not os.path.exists(self.meta_path):
+                return
+            rows = list(self.lookup(ids).values())
+            if not rows:
+                return
+            state = json.loads(json.dumps(self.state))
+            self._append_tombstones(state, rows)
+            self._save_state(state)
+            self.refresh()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        total = sum(info['rows'] for info in self.state['segments'])
+        if self.state['deleted'] >= self.min_segment_rows and self.state['deleted'] > total * self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """把未删除的行重写为新一代的单个数据段，删除旧文件（已映射旧文件的进程在下次刷新时切换）"""
+        with self._write_lock():
+            self.refresh()
+            old_segments = list(self.segments)
+            old_tombstones = os.path.join(self.directory, self.state['tombstones'])
+            generation = self.state['generation'] + 1
+            live_rows = sum(int(segment.live[:segment.rows].sum()) for segment in old_segments)
+            state = {
+                **self.state,
+                'generation': generation,
+                'segments': [],
+                'tombstones': f"g{generation}.tombstones",
+                'deleted': 0
+            }
+            if live_rows:
+                info = _Segment.create(
+                    self.directory, f"g{generation}-000000", 0,
+                    max(self.min_segment_rows, live_rows), state['dim'], self.quantized
+                )
+                state['segments'].append(info)
+                for segment in old_segments:
+                    with open(segment.prefix + '.ids', 'rb') as f:
+                        segment_ids = f.read().decode('utf-8').split('\n')[:segment.rows]
+                    for start in range(0, segment.rows, self.block_rows):
+                        end = min(segment.rows, start + self.block_rows)
+                        locals_ = [i for i in range(start, end) if segment.live[i]]
+                        if not locals_:
+                            continue
+                        records = segment.read_records(locals_)
+                        # 向量（int8 编码及其缩放系数）原样复制，避免反量化后再量化带来的精度损失
+                        self._write_segment(
+                            info,
+                            [segment_ids[i] for i in locals_],
+                            segment.vectors[locals_],
+                            [records[i][0] for i in locals_],
+                            [records[i][1] for i in locals_],
+                            scales=segment.scales[locals_] if segment.scales is not None else None
+                        )
+                        info['rows'] += len(locals_)
+            self._save_state(state)
+            self.refresh()
+            for path in [old_tombstones] + [path for segment in old_segments for path in segment.files()]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.logger.info(f"已压缩集合 {os.path.basename(self.directory)}: 保留 {live_rows} 行")
+
+
+class NumpyBackend(VectorBackend):
+    """
+    纯 NumPy 的向量后端，适合以读为主的翻译记忆
+
+    每个集合的向量归一化后以 float16（可选 int8 加逐行缩放系数）存放在内存映射的 .npy 矩阵中，
+    文档和元数据存放在按偏移随机读取的 jsonl 旁路文件中。查询是一次矩阵乘法加 argpartition 的精确 top-k，
+    多个工作进程映射同一批文件，通过操作系统页缓存共享索引。数据段只追加、容量翻倍，删除写入删除标记，
+    删除比例超过 compact_ratio 时重写为一个新数据段。
+    """
+
+    name = "numpy"
+
+    def __init__(self,
+                 root_dir: str,
+                 dtype: str = "float16",
+                 min_segment_rows: int = 4096,
+                 block_rows: int = 8192,
+                 compact_ratio: float = 0.25):
+        """
+        Args:
+            root_dir: 存储目录，每个集合一个子目录
+            dtype: 向量存储精度，float16 或 int8（新建集合时生效）
+            min_segment_rows: 数据段的最小容量（行）
+            block_rows: 查询时每次参与矩阵乘法的最大行数，限制 float32 临时矩阵的大小
+            compact_ratio: 删除的行超过总行数的此比例时压缩集合
+        """
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"不支持的向量精度: {dtype}")
+        self.root_dir = root_dir
+        self.dtype = dtype
+        self.min_segment_rows = min_segment_rows
+        self.block_rows = block_rows
+        self.compact_ratio = compact_ratio
+        self._collections: Dict[str, _NumpyCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _collection(self, collection_name: str) -> _NumpyCollection:
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.get(collection_name)
+                if collection is None:
+                    collection = _NumpyCollection(
+                        os.path.join(self.root_dir, collection_name),
+                        self.dtype == "int8",
+                        self.min_segment_rows,
+                        self.block_rows,
+                        self.compact_ratio
+                    )
+                    self._collections[collection_name] = collection
+        return collection
+
+    def list_collections(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.root_dir)
+            if os.path.exists(os.path.join(self.root_dir, name, 'meta.json'))
+        )
+
+    def has_collection(self, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(self.root_dir, collection_name, 'meta.json'))
+
+    def ensure_collection(self, collection_name: str, collection_metadata: Optional[Dict] = None):
+        collection = self._collection(collection_name)
+        if not os.path.exists(collection.meta_path):
+            collection.create(collection_metadata)
+        return collection
+
+    def count(self, collection_name: str) -> int:
+        return self.ensure_collection(collection_name).count()
+
+    def distance_space(self, collection_name: str) -> str:
+        """向量写入时已归一化，始终按余弦相似度计算"""
+        return "cosine"
+
+    def query(self,
+              collection_name: str,
+              query_embeddings: List[List[float]],
+              top_k: int,
+              where: Optional[Dict] = None) -> List[List[Dict[str, Any]]]:
+        return self.ensure_collection(collection_name).query(query_embeddings, top_k, where)
+
+    def get_existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        return set(self.ensure_collection(collection_name).lookup(ids))
+
+    def add(self,
+            collection_name: str,
+            ids: List[str],
+            embeddings: List[List[float]],
+            documents: List[str],
+            metadatas: Optional[List[Dict]] = None,
+            upsert: bool = False):
+        self.ensure_collection(collection_name).add(ids, embeddings, documents, metadatas, upsert)
+
+    def delete(self, collection_name: str, ids: List[str]):
+        self.ensure_collection(collection_name).delete(ids)
+
+    def compact(self, collection_name: str):
+        """手动压缩集合，去掉已删除的行"""
+        self.ensure_collection(collection_name).compact()
+
+
+def create_backend(backend: str, persist_dir: str, **options) -> VectorBackend:
+    """
+    按名称创建向量后端
+
+    Args:
+        backend: chroma 或 numpy
+        persist_dir: 向量存储目录；numpy 后端使用其中的 numpy 子目录
+        options: 传给后端构造函数的参数（如 numpy 后端的 dtype）
+
+    Returns:
+        VectorBackend: 向量后端
+    """
+    if backend == "chroma":
+        return ChromaBackend(persist_dir, **options)
+    if backend == "numpy":
+        return NumpyBackend(os.path.join(persist_dir, "numpy"), **options)
+    raise ValueError(f"不支持的向量后端: {backend}")
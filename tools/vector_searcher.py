@@ -1,67 +1,271 @@
-from langchain_community.embeddings import ModelScopeEmbeddings
-
-import chromadb
+import hashlib
+import heapq
 import logging
-from typing import List, Union, Dict, Optional
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Set, Tuple, Union, Dict, Optional
 import os
-import torch
-from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+from tools.embedding_engine import get_embedding_engine
+from tools.query_cache import QueryEmbeddingCache
+from tools.vector_backends import VectorBackend, create_backend
 
 
 class VectorSearcher:
-    def __init__(self, persist_dir: str):
+    def __init__(self,
+                 persist_dir: str,
+                 embeddings: Optional[Embeddings] = None,
+                 query_cache_size: int = 4096,
+                 query_cache_ttl: Optional[float] = None,
+                 search_workers: int = 8,
+                 backend: Union[str, VectorBackend] = "chroma",
+                 vector_dtype: str = "float16",
+                 count_cache_ttl: float = 30.0):
         """
         初始化向量查询器
         
         Args:
             persist_dir: 向量存储目录，需要与FileProcessor使用相同的目录
+            embeddings: 嵌入模型，默认使用进程内共享的 ModelScope 中文嵌入引擎
+            query_cache_size: 查询向量LRU缓存容量
+            query_cache_ttl: 查询向量缓存有效期（秒），None 表示永不过期
+            search_workers: 多集合并发搜索的线程数
+            backend: 向量存储后端：chroma、numpy（内存映射的 NumPy 矩阵）或 VectorBackend 实例
+            vector_dtype: numpy 后端新建集合时的向量精度，float16 或 int8
+            count_cache_ttl: 集合记录数缓存的有效期（秒），其他进程写入的数据最迟在此时间后可见
         """
         self.persist_dir = persist_dir
         
-        # 使用 ModelScope 中文嵌入模型
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.embeddings = ModelScopeEmbeddings(
-            model_id="damo/nlp_corom_sentence-embedding_chinese-base",
-        )
+        # 使用进程内共享的 ModelScope 中文嵌入引擎（延迟加载）
+        self.embeddings = embeddings or get_embedding_engine()
+        self.model_id = getattr(self.embeddings, 'model_id', type(self.embeddings).__name__)
+        
+        # 查询向量缓存，相同查询只计算一次嵌入
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size, ttl=query_cache_ttl)
         
         # 确保存储目录存在
         os.makedirs(persist_dir, exist_ok=True)
         
-        # 初始化 ChromaDB 客户端
-        self.client = chromadb.PersistentClient(path=persist_dir)
+        # 初始化向量存储后端
+        if isinstance(backend, VectorBackend):
+            self.backend = backend
+        elif backend == "numpy":
+            self.backend = create_backend(backend, persist_dir, dtype=vector_dtype)
+        else:
+            self.backend = create_backend(backend, persist_dir)
         
         # 设置日志
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         
-        # 存储已加载的集合
-        self.collections: Dict[str, Chroma] = {}
+        # 已加载的集合
+        self._loaded_collections: Set[str] = set()
+        
+        # 集合统计缓存（基于 count()，本进程写入时失效，其他进程的写入靠有效期感知）
+        self.count_cache_ttl = count_cache_ttl
+        self._collection_counts: Dict[str, Tuple[int, float]] = {}
+        
+        # 集合的距离度量（hnsw:space），创建后不会改变
+        self._collection_spaces: Dict[str, str] = {}
+        self._stats_lock = threading.Lock()
+        
+        # 多集合并发搜索线程池与集合加载锁
+        self._search_pool = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="vector-search")
+        self._collections_lock = threading.RLock()
+        # 超时搜索统计：运行中的搜索无法取消，仍占用线程池直到结束
+        self._search_stats = {'cancelled': 0, 'abandoned': 0, 'abandoned_running': 0}
         
-    def _ensure_collection(self, collection_name: str) -> Chroma:
-        """确保集合存在并返回集合对象"""
-        if collection_name not in self.collections:
+    def _ensure_collection(self, collection_name: str, collection_metadata: Optional[Dict] = None):
+        """确保集合存在，collection_metadata 仅在新建集合时生效，新集合默认使用余弦距离"""
+        if collection_name in self._loaded_collections:
+            return
+        with self._collections_lock:
+            if collection_name in self._loaded_collections:
+                return
             try:
-                # 尝试获取现有集合
-                chroma_collection = self.client.get_or_create_collection(name=collection_name)
-                
-                # 创建或加载 Langchain Chroma 集合
-                self.collections[collection_name] = Chroma(
-                    client=self.client,
-                    collection_name=collection_name,
-                    embedding_function=self.embeddings,
-                )
+                self.backend.ensure_collection(collection_name, collection_metadata)
+                self._loaded_collections.add(collection_name)
                 self.logger.info(f"已加载/创建集合: {collection_name}")
             except Exception as e:
                 self.logger.error(f"创建/加载集合失败 {collection_name}: {str(e)}")
                 raise
+    
+    def get_collection_count(self, collection_name: str) -> int:
+        """
+        获取集合记录数，优先读取缓存，未命中或过期时调用 count()
+
+        记录数为 0 时不缓存：空集合可能随时被其他进程（如批量入库）写入，
+        缓存 0 会让搜索一直直接返回空结果。
+        """
+        now = time.monotonic()
+        with self._stats_lock:
+            cached = self._collection_counts.get(collection_name)
+        if cached is not None and now - cached[1] < self.count_cache_ttl:
+            return cached[0]
+        self._ensure_collection(collection_name)
+        count = self.backend.count(collection_name)
+        with self._stats_lock:
+            if count > 0:
+                self._collection_counts[collection_name] = (count, now)
+            else:
+                self._collection_counts.pop(collection_name, None)
+        return count
+    
+    def get_distance_space(self, collection_name: str) -> str:
+        """获取集合的距离度量（hnsw:space），Chroma 集合未设置时为默认的 l2"""
+        space = self._collection_spaces.get(collection_name)
+        if space is None:
+            self._ensure_collection(collection_name)
+            space = self.backend.distance_space(collection_name)
+            self._collection_spaces[collection_name] = space
+        return space
+    
+    def invalidate_collection_stats(self, collection_name: Optional[str] = None):
+        """使集合统计缓存失效，None 表示全部失效"""
+        with self._stats_lock:
+            if collection_name is None:
+                self._collection_counts.clear()
+            else:
+                self._collection_counts.pop(collection_name, None)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """计算查询向量，优先从LRU缓存读取"""
+        key = QueryEmbeddingCache.make_key(self.model_id, query)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+            self.query_cache.put(key, vector)
+        return vector
+    
+    def get_cache_stats(self) -> Dict[str, float]:
+        """获取查询向量缓存的命中统计"""
+        return self.query_cache.stats()
+    
+    def _query_collection(self,
+                          name: str,
+                          query_embeddings: List[List[float]],
+                          top_k: int,
+                          threshold: float,
+                          where: Optional[Dict] = None) -> List[List[Dict]]:
+        """用一批查询向量搜索单个集合，一次后端调用返回每个查询的结果"""
+        # 确保集合已加载
+        self._ensure_collection(name)
+        
+        # 检查集合是否为空
+        if self.get_collection_count(name) == 0:
+            self.logger.warning(f"集合 {name} 为空")
+            return [[] for _ in query_embeddings]
+        
+        # 执行搜索，后端返回按 [0, 1] 相似度降序排列的结果
+        raw = self.backend.query(name, query_embeddings, top_k, where)
+        
+        # 过滤低于阈值的结果并标记来源集合
+        batch_results = []
+        for results in raw:
+            collection_results = []
+            for result in results:
+                if result['similarity'] < threshold:
+                    break
+                result['collection'] = name
+                collection_results.append(result)
+            batch_results.append(collection_results)
+        return batch_results
+    
+    def _search_collection(self,
+                           name: str,
+                           query_embedding: List[float],
+                           top_k: int,
+                           threshold: float,
+                           where: Optional[Dict] = None) -> List[Dict]:
+        """用查询向量搜索单个集合"""
+        return self._query_collection(name, [query_embedding], top_k, threshold, where)[0]
+    
+    def _fan_out(self,
+                 query_embedding: List[float],
+                 collection_names: List[str],
+                 top_k: int,
+                 threshold: float,
+                 timeout: Optional[float],
+                 where: Optional[Dict] = None) -> Dict[str, List[Dict]]:
+        """
+        在线程池中并发搜索多个集合，超时的集合被跳过
+
+        timeout 是每个集合的时限：从该集合开始搜索时计时，尚在排队的集合从请求开始时计时，
+        排队超时的搜索被取消；已在运行的搜索无法中断，计入 abandoned 统计直到结束
+        """
+        if len(collection_names) == 1 and timeout is None:
+            name = collection_names[0]
+            collection_results = self._search_collection(name, query_embedding, top_k, threshold, where)
+            return {name: collection_results} if collection_results else {}
+        
+        request_start = time.monotonic()
+        started: Dict[str, float] = {}
         
-        return self.collections[collection_name]
+        def search_one(name: str) -> List[Dict]:
+            started[name] = time.monotonic()
+            return self._search_collection(name, query_embedding, top_k, threshold, where)
+        
+        futures = {self._search_pool.submit(search_one, name): name for name in collection_names}
+        pending = set(futures)
+        results = {}
+        while pending:
+            wait_timeout = None
+            if timeout is not None:
+                now = time.monotonic()
+                deadlines = {future: started.get(futures[future], request_start) + timeout for future in pending}
+                for future, deadline in deadlines.items():
+                    if deadline <= now:
+                        pending.discard(future)
+                        self._abandon_search(future, futures[future])
+                if not pending:
+                    break
+                wait_timeout = min(deadlines[future] for future in pending) - now
+            done, pending = wait(pending, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                collection_results = future.result()
+                if collection_results:
+                    results[futures[future]] = collection_results
+        return results
+    
+    def _abandon_search(self, future: Future, name: str):
+        """跳过超时的集合：排队中的搜索直接取消，已在运行的搜索计数直到其结束"""
+        if future.cancel():
+            with self._stats_lock:
+                self._search_stats['cancelled'] += 1
+            self.logger.warning(f"集合 {name} 搜索排队超时，已取消")
+            return
+        with self._stats_lock:
+            self._search_stats['abandoned'] += 1
+            self._search_stats['abandoned_running'] += 1
+            running = self._search_stats['abandoned_running']
+        self.logger.warning(f"集合 {name} 搜索超时，已跳过；仍在后台运行的超时搜索 {running} 个")
+        future.add_done_callback(self._abandoned_search_done)
+    
+    def _abandoned_search_done(self, future: Future):
+        with self._stats_lock:
+            self._search_stats['abandoned_running'] -= 1
+    
+    def get_search_stats(self) -> Dict[str, int]:
+        """获取超时搜索统计：cancelled（排队时取消）、abandoned（运行中被跳过）、abandoned_running（其中仍在运行的）"""
+        with self._stats_lock:
+            return dict(self._search_stats)
+    
+    def _resolve_collection_names(self, collection_names: Union[str, List[str], None]) -> List[str]:
+        """处理集合名称参数"""
+        if isinstance(collection_names, str):
+            return [collection_names]
+        if collection_names is None:
+            return self.list_collections()
+        return list(collection_names)
     
     def search(self, 
               query: str, 
               collection_names: Union[str, List[str]] = None,
               top_k: int = 5,
-              threshold: float = 0.0) -> Dict[str, List[Dict]]:
+              threshold: float = 0.0,
+              timeout: Optional[float] = None,
+              where: Optional[Dict] = None) -> Dict[str, List[Dict]]:
         """
         在指定集合中搜索相似内容
         
@@ -69,58 +273,131 @@ class VectorSearcher:
             query: 查询文本
             collection_names: 要搜索的集合名称，可以是单个名称或列表。None表示搜索所有已加载的集合
             top_k: 每个集合返回的最相似结果数量
-            threshold: 相似度阈值，只返回相似度高于此值的结果
+            threshold: 相似度阈值（0-1），只返回相似度不低于此值的结果
+            timeout: 每个集合的搜索时限（秒），超时的集合被跳过，None 表示不限
+            where: 元数据过滤条件（Chroma 的 where 语法）
             
         Returns:
             Dict[str, List[Dict]]: 按集合名称组织的搜索结果
         """
         try:
-            results = {}
+            collection_names = self._resolve_collection_names(collection_names)
             
-            # 处理集合名称参数
-            if isinstance(collection_names, str):
-                collection_names = [collection_names]
-            elif collection_names is None:
-                collection_names = self.list_collections()
+            # 查询向量只计算一次，所有集合复用
+            query_embedding = self.embed_query(query)
+            
+            return self._fan_out(query_embedding, collection_names, top_k, threshold, timeout, where)
+            
+        except Exception as e:
+            self.logger.error(f"搜索失败: {str(e)}")
+            raise
+    
+    def search_merged(self,
+                      query: str,
+                      collection_names: Union[str, List[str]] = None,
+                      top_k: int = 5,
+                      threshold: float = 0.0,
+                      timeout: Optional[float] = None) -> List[Dict]:
+        """
+        并发搜索多个集合并合并为全局 top_k
+        
+        Args:
+            query: 查询文本
+            collection_names: 要搜索的集合名称，None表示搜索所有集合
+            top_k: 全局返回的最相似结果数量
+            threshold: 相似度阈值（0-1）
+            timeout: 每个集合的搜索时限（秒），超时的集合被跳过，None 表示不限
+            
+        Returns:
+            List[Dict]: 按相似度排序的结果，每条结果带有 collection 字段
+        """
+        results = self.search(
+            query=query,
+            collection_names=collection_names,
+            top_k=top_k,
+            threshold=threshold,
+            timeout=timeout
+        )
+        return self.merge_top_k(results, top_k)
+    
+    @staticmethod
+    def merge_top_k(results: Dict[str, List[Dict]], top_k: int) -> List[Dict]:
+        """用堆把按集合组织的搜索结果合并为全局 top_k"""
+        return heapq.nlargest(
+            top_k,
+            (item for collection_results in results.values() for item in collection_results),
+            key=lambda item: item['similarity']
+        )
+    
+    def embed_queries(self, queries: List[str], batch_size: int = 256) -> List[List[float]]:
+        """批量计算查询向量，缓存命中的直接复用，其余按批计算"""
+        keys = [QueryEmbeddingCache.make_key(self.model_id, query) for query in queries]
+        vectors: List[Optional[List[float]]] = [self.query_cache.get(key) for key in keys]
+        
+        # 相同查询只计算一次
+        pending: Dict[tuple, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                pending.setdefault(keys[i], []).append(i)
+        
+        pending_keys = list(pending)
+        for start in range(0, len(pending_keys), batch_size):
+            batch_keys = pending_keys[start:start + batch_size]
+            batch_vectors = self.embeddings.embed_documents(
+                [queries[pending[key][0]] for key in batch_keys]
+            )
+            for key, vector in zip(batch_keys, batch_vectors):
+                self.query_cache.put(key, vector)
+                for i in pending[key]:
+                    vectors[i] = vector
+        return vectors
+    
+    def search_many(self,
+                    queries: List[str],
+                    collection_names: Union[str, List[str]] = None,
+                    top_k: int = 5,
+                    threshold: float = 0.0,
+                    batch_size: int = 256) -> List[Dict[str, List[Dict]]]:
+        """
+        批量搜索：按批计算查询向量，并以批量 query_embeddings 调用向量存储后端
+        
+        Args:
+            queries: 查询文本列表
+            collection_names: 要搜索的集合名称，None表示搜索所有集合
+            top_k: 每个集合返回的最相似结果数量
+            threshold: 相似度阈值（0-1）
+            batch_size: 每批的查询数量
+            
+        Returns:
+            List[Dict[str, List[Dict]]]: 与输入顺序一致的每个查询的搜索结果
+        """
+        try:
+            collection_names = self._resolve_collection_names(collection_names)
+            results: List[Dict[str, List[Dict]]] = [{} for _ in queries]
+            if not queries:
+                return results
+            
+            query_embeddings = self.embed_queries(queries, batch_size=batch_size)
             
             for name in collection_names:
-                # 确保集合已加载
-                collection = self._ensure_collection(name)
-                
-                # 检查集合是否为空
-                if not collection.get()['ids']:
-                    self.logger.warning(f"集合 {name} 为空")
-                    continue
-                
-                # 执行搜索
-                docs_and_scores = collection.similarity_search_with_score(
-                    query, k=top_k
-                )
-                
-                # 处理结果
-                collection_results = []
-                for doc, score in docs_and_scores:
-                    if score >= threshold:
-                        collection_results.append({
-                            'content': doc.page_content,
-                            'metadata': doc.metadata,
-                            'similarity': float(score)
-                        })
-                
-                if collection_results:
-                    results[name] = collection_results
-                    
+                for start in range(0, len(queries), batch_size):
+                    batch_results = self._query_collection(
+                        name, query_embeddings[start:start + batch_size], top_k, threshold
+                    )
+                    for offset, collection_results in enumerate(batch_results):
+                        if collection_results:
+                            results[start + offset][name] = collection_results
+            
             return results
             
         except Exception as e:
-            self.logger.error(f"搜索失败: {str(e)}")
+            self.logger.error(f"批量搜索失败: {str(e)}")
             raise
     
     def list_collections(self) -> List[str]:
         """列出所有可用集合"""
         try:
-            # 在 v0.6.0 中，list_collections 直接返回集合名称列表
-            collection_names = self.client.list_collections()
+            collection_names = self.backend.list_collections()
             self.logger.info(f"找到 {len(collection_names)} 个集合: {collection_names}")
             return collection_names
         except Exception as e:
@@ -130,23 +407,88 @@ class VectorSearcher:
     def get_collection_info(self, collection_name: str) -> Dict:
         """获取集合详细信息"""
         try:
-            collection = self.client.get_collection(name=collection_name)
+            if not self.backend.has_collection(collection_name):
+                raise ValueError(f"集合不存在: {collection_name}")
             return {
                 'name': collection_name,
-                'count': collection.count()
+                'count': self.get_collection_count(collection_name)
             }
         except Exception as e:
             self.logger.error(f"获取集合信息失败 {collection_name}: {str(e)}")
             return {}
     
+    @staticmethod
+    def make_chunk_ids(source: str, texts: List[str], occurrences: Optional[Dict[bytes, int]] = None) -> List[str]:
+        """
+        根据来源和文本内容生成确定性的文本块ID
+        
+        同一来源中内容相同的文本块按出现次序区分，因此文件其他位置的增删不会改变未修改文本块的ID。
+        
+        Args:
+            source: 文本来源（如文件路径）
+            texts: 文本块列表
+            occurrences: 出现次数计数表；分批生成同一来源的ID时传入同一个字典
+            
+        Returns:
+            List[str]: 与输入顺序一致的ID列表
+        """
+        if occurrences is None:
+            occurrences = {}
+        ids = []
+        for text in texts:
+            # 以文本摘要计数，避免保存整段文本
+            text_key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+            ordinal = occurrences.get(text_key, 0)
+            occurrences[text_key] = ordinal + 1
+            digest = hashlib.sha256(f"{source}\x00{ordinal}\x00{text}".encode('utf-8')).hexdigest()
+            ids.append(digest[:32])
+        return ids
+    
+    def get_existing_ids(self, collection_name: str, ids: List[str]) -> Set[str]:
+        """返回 ids 中已存在于集合的ID（不读取向量和文档）"""
+        if not ids:
+            return set()
+        self._ensure_collection(collection_name)
+        return self.backend.get_existing_ids(collection_name, ids)
+    
+    def delete_texts(self, collection_name: str, ids: List[str]):
+        """按ID删除集合中的文本"""
+        if not ids:
+            return
+        try:
+            self._ensure_collection(collection_name)
+            self.backend.delete(collection_name, ids)
+            self.invalidate_collection_stats(collection_name)
+            self.logger.info(f"已从集合 {collection_name} 删除 {len(ids)} 条文本")
+        except Exception as e:
+            self.logger.error(f"从集合 {collection_name} 删除文本失败: {str(e)}")
+            raise
+    
     def add_texts(
         self,
         collection_name: str,
         texts: List[str],
         metadatas: Optional[List[Dict]] = None,
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        collection_metadata: Optional[Dict] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        upsert: bool = False
     ) -> List[str]:
-        """向指定集合添加文本"""
+        """
+        向指定集合添加文本
+        
+        Args:
+            collection_name: 集合名称
+            texts: 文本或 Document 列表
+            metadatas: 每条文本的元数据
+            ids: 每条文本的ID，默认随机生成
+            collection_metadata: 仅在新建集合时生效的集合元数据
+            embeddings: 预先计算好的嵌入向量，提供时不再重复计算
+            upsert: 为 True 时已存在的ID被覆盖而不是忽略，配合 make_chunk_ids 生成的确定性ID使用
+            
+        Returns:
+            List[str]: 写入的ID列表
+        """
         try:
             if not texts:
                 self.logger.warning("没有要添加的文本")
@@ -165,20 +507,26 @@ class VectorSearcher:
                 import uuid
                 ids = [str(uuid.uuid4()) for _ in processed_texts]
             
-            # 确保集合存在并获取
-            collection = self._ensure_collection(collection_name)
+            # 确保集合存在
+            self._ensure_collection(collection_name, collection_metadata)
+            
+            # 未提供嵌入向量时在此计算
+            if embeddings is None:
+                embeddings = self.embeddings.embed_documents(processed_texts)
             
             # 添加文本到集合
-            collection.add_texts(
-                texts=processed_texts,
+            self.backend.add(
+                collection_name,
+                ids=ids,
+                embeddings=embeddings,
+                documents=processed_texts,
                 metadatas=metadatas,
-                ids=ids
+                upsert=upsert
             )
             
-            # 验证添加是否成功
-            count = len(collection.get()['ids']) if collection.get() else 0
+            # 写入后统计失效，下次读取时通过 count() 重新获取
+            self.invalidate_collection_stats(collection_name)
             self.logger.info(f"成功添加 {len(texts)} 条文本到集合 {collection_name}")
-            self.logger.info(f"集合 {collection_name} 现有 {count} 条记录")
             
             return ids
             